@@ -0,0 +1,105 @@
+from __future__ import annotations
+
+from collections.abc import Callable
+import fcntl
+import logging
+import os
+from pathlib import Path
+import tempfile
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class GPULeaseManager:
+    def __init__(self, lease_dir: str | Path | None = None):
+        if lease_dir is None:
+            lease_dir = os.getenv("GPU_LEASE_DIR") or Path(tempfile.gettempdir()) / "sns-agent-gpu-leases"
+        self._lease_dir = Path(lease_dir)
+        self._lock = threading.Lock()
+        self._held: dict[int, int] = {}
+        self._watchers: set[int] = set()
+
+    @property
+    def lease_dir(self) -> Path:
+        return self._lease_dir
+
+    def is_held(self, gpu_index: int) -> bool:
+        with self._lock:
+            return gpu_index in self._held
+
+    def held(self) -> set[int]:
+        with self._lock:
+            return set(self._held)
+
+    def try_acquire(self, gpu_index: int, owner: str = "") -> bool:
+        with self._lock:
+            if gpu_index in self._held:
+                return False
+            fd = self._open(gpu_index)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                os.close(fd)
+                return False
+            except BaseException:
+                os.close(fd)
+                raise
+            os.ftruncate(fd, 0)
+            os.pwrite(fd, f"{os.getpid()} {owner} {time.time():.0f}\n".encode("utf-8"), 0)
+            self._held[gpu_index] = fd
+            return True
+
+    def release(self, gpu_index: int) -> None:
+        with self._lock:
+            fd = self._held.pop(gpu_index, None)
+        if fd is None:
+            return
+        try:
+            os.ftruncate(fd, 0)
+            fcntl.flock(fd, fcntl.LOCK_UN)
+        finally:
+            os.close(fd)
+
+    def holder(self, gpu_index: int) -> str | None:
+        try:
+            text = (self._lease_dir / f"gpu{gpu_index}.lock").read_text(encoding="utf-8").strip()
+        except FileNotFoundError:
+            return None
+        return text or None
+
+    def watch(self, gpu_index: int, on_release: Callable[[], None]) -> None:
+        with self._lock:
+            if gpu_index in self._watchers or gpu_index in self._held:
+                return
+            self._watchers.add(gpu_index)
+        threading.Thread(
+            target=self._wait_for_release,
+            args=(gpu_index, on_release),
+            name=f"gpu-lease-watch-{gpu_index}",
+            daemon=True,
+        ).start()
+
+    def close(self) -> None:
+        for gpu_index in self.held():
+            self.release(gpu_index)
+
+    def _open(self, gpu_index: int) -> int:
+        self._lease_dir.mkdir(parents=True, exist_ok=True)
+        return os.open(self._lease_dir / f"gpu{gpu_index}.lock", os.O_RDWR | os.O_CREAT, 0o666)
+
+    def _wait_for_release(self, gpu_index: int, on_release: Callable[[], None]) -> None:
+        try:
+            fd = self._open(gpu_index)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_SH)
+                fcntl.flock(fd, fcntl.LOCK_UN)
+            finally:
+                os.close(fd)
+        except OSError as exc:
+            logger.warning("gpu lease watch failed gpu=%d error=%s", gpu_index, exc)
+        finally:
+            with self._lock:
+                self._watchers.discard(gpu_index)
+        on_release()
@@ -0,0 +1,206 @@
+from __future__ import annotations
+
+from collections.abc import Callable, Iterable
+from dataclasses import dataclass, replace
+import logging
+import os
+import threading
+from typing import Any, Protocol
+
+logger = logging.getLogger(__name__)
+
+_DEFAULT_SAMPLE_INTERVAL_SECONDS = 1.0
+
+
+@dataclass(slots=True)
+class GPUCandidate:
+    index: int
+    name: str
+    memory_total_mb: float | None
+    memory_free_mb: float | None
+    memory_used_mb: float | None
+    gpu_utilization_percent: float | None
+    memory_utilization_percent: float | None
+
+
+class GPUDeviceProvider(Protocol):
+    def open(self) -> None: ...
+
+    def sample(self) -> list[GPUCandidate]: ...
+
+    def close(self) -> None: ...
+
+
+class NVMLDeviceProvider:
+    def __init__(self):
+        self._pynvml: Any = None
+        self._handles: list[Any] = []
+
+    def open(self) -> None:
+        try:
+            import pynvml  # type: ignore
+        except ImportError as exc:
+            raise RuntimeError("pynvml is required for stable-diffusion.cpp GPU selection") from exc
+
+        try:
+            pynvml.nvmlInit()
+        except pynvml.NVMLError as exc:  # type: ignore[attr-defined]
+            raise RuntimeError(f"failed to initialize NVML: {exc}") from exc
+        try:
+            count = pynvml.nvmlDeviceGetCount()
+            self._handles = [pynvml.nvmlDeviceGetHandleByIndex(index) for index in range(count)]
+        except pynvml.NVMLError as exc:  # type: ignore[attr-defined]
+            pynvml.nvmlShutdown()
+            raise RuntimeError(f"failed to query GPU state via NVML: {exc}") from exc
+        self._pynvml = pynvml
+
+    def sample(self) -> list[GPUCandidate]:
+        pynvml = self._pynvml
+        if pynvml is None:
+            raise RuntimeError("NVML device provider is not open")
+        try:
+            candidates: list[GPUCandidate] = []
+            for index, handle in enumerate(self._handles):
+                name = pynvml.nvmlDeviceGetName(handle)
+                memory = pynvml.nvmlDeviceGetMemoryInfo(handle)
+                utilization = pynvml.nvmlDeviceGetUtilizationRates(handle)
+                mib = 1024 * 1024
+                candidates.append(
+                    GPUCandidate(
+                        index=index,
+                        name=name.decode("utf-8", errors="replace") if isinstance(name, bytes) else str(name),
+                        memory_total_mb=memory.total / mib,
+                        memory_free_mb=memory.free / mib,
+                        memory_used_mb=memory.used / mib,
+                        gpu_utilization_percent=float(utilization.gpu),
+                        memory_utilization_percent=float(utilization.memory),
+                    )
+                )
+            return candidates
+        except pynvml.NVMLError as exc:  # type: ignore[attr-defined]
+            raise RuntimeError(f"failed to query GPU state via NVML: {exc}") from exc
+
+    def close(self) -> None:
+        pynvml, self._pynvml = self._pynvml, None
+        self._handles = []
+        if pynvml is not None:
+            try:
+                pynvml.nvmlShutdown()
+            except pynvml.NVMLError:  # type: ignore[attr-defined]
+                pass
+
+
+class FakeGPUDeviceProvider:
+    def __init__(self, candidates: Iterable[GPUCandidate]):
+        self._lock = threading.Lock()
+        self._candidates = {candidate.index: replace(candidate) for candidate in candidates}
+        self.opened = False
+        self.samples = 0
+
+    @classmethod
+    def idle(cls, count: int, memory_total_mb: float = 24 * 1024) -> FakeGPUDeviceProvider:
+        return cls(
+            GPUCandidate(
+                index=index,
+                name=f"Fake GPU {index}",
+                memory_total_mb=memory_total_mb,
+                memory_free_mb=memory_total_mb,
+                memory_used_mb=0.0,
+                gpu_utilization_percent=0.0,
+                memory_utilization_percent=0.0,
+            )
+            for index in range(count)
+        )
+
+    def set_usage(self, index: int, *, gpu_utilization_percent: float, memory_used_mb: float) -> None:
+        with self._lock:
+            candidate = self._candidates[index]
+            candidate.gpu_utilization_percent = gpu_utilization_percent
+            candidate.memory_used_mb = memory_used_mb
+            if candidate.memory_total_mb is not None:
+                candidate.memory_free_mb = candidate.memory_total_mb - memory_used_mb
+
+    def open(self) -> None:
+        self.opened = True
+
+    def sample(self) -> list[GPUCandidate]:
+        with self._lock:
+            self.samples += 1
+            return [replace(candidate) for candidate in self._candidates.values()]
+
+    def close(self) -> None:
+        self.opened = False
+
+
+class GPUMonitor:
+    def __init__(
+        self,
+        provider_factory: Callable[[], GPUDeviceProvider] = NVMLDeviceProvider,
+        *,
+        interval_seconds: float | None = None,
+    ):
+        if interval_seconds is None:
+            interval_seconds = float(
+                os.getenv("GPU_MONITOR_INTERVAL_SECONDS", str(_DEFAULT_SAMPLE_INTERVAL_SECONDS))
+            )
+        self._provider_factory = provider_factory
+        self._interval_seconds = max(0.05, interval_seconds)
+        self._lock = threading.Lock()
+        self._provider: GPUDeviceProvider | None = None
+        self._snapshot: list[GPUCandidate] = []
+        self._listeners: list[Callable[[], None]] = []
+        self._sampler: threading.Thread | None = None
+        self._closed = threading.Event()
+
+    def add_listener(self, listener: Callable[[], None]) -> None:
+        with self._lock:
+            self._listeners.append(listener)
+
+    def snapshot(self) -> list[GPUCandidate]:
+        with self._lock:
+            if self._provider is None:
+                provider = self._provider_factory()
+                provider.open()
+                try:
+                    self._snapshot = provider.sample()
+                except BaseException:
+                    provider.close()
+                    raise
+                self._provider = provider
+                self._closed.clear()
+                self._sampler = threading.Thread(target=self._sample_forever, name="gpu-monitor", daemon=True)
+                self._sampler.start()
+            return [replace(candidate) for candidate in self._snapshot]
+
+    def refresh(self) -> bool:
+        with self._lock:
+            provider = self._provider
+            if provider is None:
+                return False
+            try:
+                sample = provider.sample()
+            except RuntimeError as exc:
+                logger.warning("gpu monitor sample failed: %s", exc)
+                return False
+            changed = sample != self._snapshot
+            self._snapshot = sample
+            listeners = list(self._listeners) if changed else []
+        for listener in listeners:
+            listener()
+        return changed
+
+    def close(self) -> None:
+        self._closed.set()
+        sampler = self._sampler
+        if sampler is not None and sampler is not threading.current_thread():
+            sampler.join(timeout=self._interval_seconds * 2)
+        with self._lock:
+            provider, self._provider = self._provider, None
+            self._sampler = None
+            self._snapshot = []
+        if provider is not None:
+            provider.close()
+
+    def _sample_forever(self) -> None:
+        while not self._closed.wait(self._interval_seconds):
+            self.refresh()
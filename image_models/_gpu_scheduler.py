@@ -0,0 +1,283 @@
+from __future__ import annotations
+
+import asyncio
+from collections.abc import Callable, Iterable
+from dataclasses import dataclass, replace
+import logging
+import os
+import threading
+import time
+from typing import Protocol
+
+from image_models._gpu_leases import GPULeaseManager
+
+logger = logging.getLogger(__name__)
+
+_DEFAULT_FAIRNESS_BOUND = 3
+
+
+class GPUDevice(Protocol):
+    index: int
+
+
+@dataclass(slots=True)
+class ModelQueueStats:
+    requests: int = 0
+    swaps: int = 0
+    total_wait_seconds: float = 0.0
+    max_wait_seconds: float = 0.0
+
+    @property
+    def average_wait_seconds(self) -> float:
+        return self.total_wait_seconds / self.requests if self.requests else 0.0
+
+
+@dataclass(slots=True, eq=False)
+class GPUWaiter:
+    model_name: str
+    enqueued_at: float
+    skipped: int = 0
+    gpu_index: int | None = None
+    wake: Callable[[], None] | None = None
+
+
+class GPUScheduler:
+    def __init__(
+        self,
+        condition: threading.Condition,
+        leases: GPULeaseManager,
+        *,
+        fairness_bound: int | None = None,
+        poll_interval_seconds: float = 1.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        if fairness_bound is None:
+            fairness_bound = int(os.getenv("GPU_SCHEDULER_FAIRNESS_BOUND", str(_DEFAULT_FAIRNESS_BOUND)))
+        self._condition = condition
+        self._leases = leases
+        self._fairness_bound = max(0, fairness_bound)
+        self._poll_interval_seconds = poll_interval_seconds
+        self._clock = clock
+        self._waiters: list[GPUWaiter] = []
+        self._stats: dict[str, ModelQueueStats] = {}
+
+    def acquire(
+        self,
+        model_name: str,
+        *,
+        discover: Callable[[], Iterable[GPUDevice]],
+        is_available: Callable[[GPUDevice], bool],
+        resident_models: Callable[[], dict[int, str]],
+        timeout: float,
+    ) -> int:
+        deadline = self._clock() + timeout
+        waiter = GPUWaiter(model_name=model_name, enqueued_at=self._clock())
+        with self._condition:
+            self._waiters.append(waiter)
+            try:
+                while True:
+                    if waiter.gpu_index is None:
+                        self._assign(discover(), is_available, resident_models())
+                    if waiter.gpu_index is not None:
+                        self._record_wait(waiter)
+                        return waiter.gpu_index
+                    remaining = deadline - self._clock()
+                    if remaining <= 0:
+                        raise RuntimeError("no GPU available before timeout")
+                    self._condition.wait(timeout=min(self._poll_interval_seconds, remaining))
+            except BaseException:
+                if waiter.gpu_index is not None:
+                    self._leases.release(waiter.gpu_index)
+                    self._wake_all()
+                raise
+            finally:
+                self._waiters.remove(waiter)
+
+    async def acquire_async(
+        self,
+        model_name: str,
+        *,
+        discover: Callable[[], Iterable[GPUDevice]],
+        is_available: Callable[[GPUDevice], bool],
+        resident_models: Callable[[], dict[int, str]],
+        timeout: float,
+    ) -> int:
+        loop = asyncio.get_running_loop()
+        woken = asyncio.Event()
+        deadline = self._clock() + timeout
+        waiter = GPUWaiter(
+            model_name=model_name,
+            enqueued_at=self._clock(),
+            wake=lambda: loop.call_soon_threadsafe(woken.set),
+        )
+        with self._condition:
+            self._waiters.append(waiter)
+        try:
+            while True:
+                with self._condition:
+                    woken.clear()
+                    if waiter.gpu_index is None:
+                        self._assign(discover(), is_available, resident_models())
+                    if waiter.gpu_index is not None:
+                        self._record_wait(waiter)
+                        return waiter.gpu_index
+                remaining = deadline - self._clock()
+                if remaining <= 0:
+                    raise RuntimeError("no GPU available before timeout")
+                try:
+                    await asyncio.wait_for(woken.wait(), timeout=min(self._poll_interval_seconds, remaining))
+                except asyncio.TimeoutError:
+                    pass
+        except BaseException:
+            with self._condition:
+                if waiter.gpu_index is not None:
+                    self._leases.release(waiter.gpu_index)
+                    self._wake_all()
+            raise
+        finally:
+            with self._condition:
+                self._waiters.remove(waiter)
+
+    def release(self, gpu_index: int) -> None:
+        with self._condition:
+            self._leases.release(gpu_index)
+            self._wake_all()
+
+    def notify(self) -> None:
+        with self._condition:
+            self._wake_all()
+
+    def queue_depth(self) -> dict[str, int]:
+        with self._condition:
+            depth: dict[str, int] = {}
+            for waiter in self._waiters:
+                if waiter.gpu_index is None:
+                    depth[waiter.model_name] = depth.get(waiter.model_name, 0) + 1
+            return depth
+
+    def stats(self) -> dict[str, ModelQueueStats]:
+        with self._condition:
+            return {model_name: replace(stats) for model_name, stats in self._stats.items()}
+
+    def idle_gpu_count(
+        self,
+        candidates: Iterable[GPUDevice],
+        is_available: Callable[[GPUDevice], bool],
+        resident_models: dict[int, str],
+    ) -> int:
+        with self._condition:
+            queued = sum(1 for waiter in self._waiters if waiter.gpu_index is None)
+            return max(0, len(self._free(candidates, is_available, resident_models)) - queued)
+
+    def _free(
+        self,
+        candidates: Iterable[GPUDevice],
+        is_available: Callable[[GPUDevice], bool],
+        resident_models: dict[int, str],
+    ) -> list[int]:
+        return [
+            candidate.index
+            for candidate in candidates
+            if not self._leases.is_held(candidate.index)
+            and (candidate.index in resident_models or is_available(candidate))
+        ]
+
+    def _assign(
+        self,
+        candidates: Iterable[GPUDevice],
+        is_available: Callable[[GPUDevice], bool],
+        resident_models: dict[int, str],
+    ) -> None:
+        resident = dict(resident_models)
+        free = self._free(candidates, is_available, resident)
+        queue = [waiter for waiter in self._waiters if waiter.gpu_index is None]
+        if not free or not queue:
+            return
+
+        assigned: list[GPUWaiter] = []
+        head = queue[0]
+        if head.skipped >= self._fairness_bound and self._place(head, free, resident, queue, forced=True):
+            assigned.append(head)
+        for waiter in queue:
+            if not free:
+                break
+            if waiter.gpu_index is None and self._place(waiter, free, resident, queue, forced=False):
+                assigned.append(waiter)
+
+        if not assigned:
+            return
+        for position, waiter in enumerate(queue):
+            if waiter.gpu_index is None:
+                waiter.skipped += sum(1 for later in queue[position + 1:] if later in assigned)
+        self._wake_all()
+
+    def _place(
+        self,
+        waiter: GPUWaiter,
+        free: list[int],
+        resident: dict[int, str],
+        queue: list[GPUWaiter],
+        *,
+        forced: bool,
+    ) -> bool:
+        while free:
+            gpu_index = self._pick_gpu(waiter, free, resident, queue, forced=forced)
+            if gpu_index is None:
+                return False
+            free.remove(gpu_index)
+            if self._leases.try_acquire(gpu_index, owner=waiter.model_name):
+                self._grant(waiter, gpu_index, resident)
+                return True
+            self._leases.watch(gpu_index, self.notify)
+        return False
+
+    @staticmethod
+    def _pick_gpu(
+        waiter: GPUWaiter,
+        free: list[int],
+        resident: dict[int, str],
+        queue: list[GPUWaiter],
+        *,
+        forced: bool,
+    ) -> int | None:
+        for gpu_index in free:
+            if resident.get(gpu_index) == waiter.model_name:
+                return gpu_index
+        for gpu_index in free:
+            if gpu_index not in resident:
+                return gpu_index
+        demanded = {other.model_name for other in queue if other.gpu_index is None and other is not waiter}
+        for gpu_index in free:
+            if resident[gpu_index] not in demanded:
+                return gpu_index
+        return free[0] if forced else None
+
+    def _grant(self, waiter: GPUWaiter, gpu_index: int, resident: dict[int, str]) -> None:
+        previous = resident.get(gpu_index)
+        if previous is not None and previous != waiter.model_name:
+            self._stats_for(waiter.model_name).swaps += 1
+            logger.info("gpu %d swapping model %s -> %s", gpu_index, previous, waiter.model_name)
+        resident[gpu_index] = waiter.model_name
+        waiter.gpu_index = gpu_index
+
+    def _wake_all(self) -> None:
+        self._condition.notify_all()
+        for waiter in self._waiters:
+            if waiter.wake is not None:
+                try:
+                    waiter.wake()
+                except RuntimeError:
+                    pass
+
+    def _record_wait(self, waiter: GPUWaiter) -> None:
+        waited = max(0.0, self._clock() - waiter.enqueued_at)
+        stats = self._stats_for(waiter.model_name)
+        stats.requests += 1
+        stats.total_wait_seconds += waited
+        stats.max_wait_seconds = max(stats.max_wait_seconds, waited)
+
+    def _stats_for(self, model_name: str) -> ModelQueueStats:
+        stats = self._stats.get(model_name)
+        if stats is None:
+            stats = self._stats[model_name] = ModelQueueStats()
+        return stats
@@ -1,26 +1,34 @@
 from __future__ import annotations
 
+import asyncio
+import atexit
 import base64
-from collections.abc import Callable, Iterable
-from dataclasses import dataclass
+from collections.abc import Awaitable, Callable, Iterable
+from dataclasses import dataclass, replace
 import json
+import logging
 import mimetypes
 import os
 from pathlib import Path
 import shutil
+import signal
 import socket
-import subprocess
 import threading
 import time
 
 import httpx
 
+from image_models._gpu_leases import GPULeaseManager
+from image_models._gpu_monitor import GPUCandidate, GPUMonitor
+from image_models._gpu_scheduler import GPUScheduler, ModelQueueStats
 from image_models._model_env import load_model_env, optional_path
 from sns_agent.schemas import GeneratedImage, ImageGenerationRequest
 
 
+logger = logging.getLogger(__name__)
+
 _GPU_CONDITION = threading.Condition()
-_LEASED_GPUS: set[int] = set()
+_GPU_LEASES = GPULeaseManager()
 
 _HOST = "127.0.0.1"
 _STARTUP_TIMEOUT_SECONDS = 120.0
@@ -35,17 +43,13 @@ _DEFAULT_OUTPUT_FORMAT = "png"
 _SD_CPP_PROMPT_ARGS_OPEN = "<sd_cpp_extra_args>"
 _SD_CPP_PROMPT_ARGS_CLOSE = "</sd_cpp_extra_args>"
 _READINESS_POLL_SECONDS = 0.5
-
-
-@dataclass(slots=True)
-class GPUCandidate:
-    index: int
-    name: str
-    memory_total_mb: float | None
-    memory_free_mb: float | None
-    memory_used_mb: float | None
-    gpu_utilization_percent: float | None
-    memory_utilization_percent: float | None
+_HEALTH_CHECK_TIMEOUT_SECONDS = 2.0
+_DEFAULT_IDLE_TTL_SECONDS = 600.0
+_REAPER_INTERVAL_SECONDS = 30.0
+_STOP_TIMEOUT_SECONDS = 10.0
+_KILL_TIMEOUT_SECONDS = 5.0
+_EXIT_GRACE_SECONDS = 0.1
+_DEFAULT_HTTP_MAX_CONNECTIONS = 32
 
 
 @dataclass(slots=True)
@@ -58,79 +62,395 @@ class SDServerModelConfig:
 @dataclass(slots=True)
 class SDServerReservation:
     port: int
-    process: subprocess.Popen[str]
+    process: asyncio.subprocess.Process
+
+
+@dataclass(slots=True)
+class WarmSDServer:
+    model_name: str
+    gpu_index: int
+    arguments: tuple[str, ...]
+    reservation: SDServerReservation
+    last_used: float
+    in_use: bool = False
+
+
+class SDServerPool:
+    def __init__(self, idle_ttl_seconds: float | None = None):
+        if idle_ttl_seconds is None:
+            idle_ttl_seconds = float(os.getenv("SD_SERVER_IDLE_TTL_SECONDS", str(_DEFAULT_IDLE_TTL_SECONDS)))
+        self._idle_ttl_seconds = max(0.0, idle_ttl_seconds)
+        self._http_max_connections = max(
+            1, int(os.getenv("SD_SERVER_HTTP_MAX_CONNECTIONS", str(_DEFAULT_HTTP_MAX_CONNECTIONS)))
+        )
+        self._lock = threading.Lock()
+        self._servers: dict[tuple[str, int], WarmSDServer] = {}
+        self._reaper: asyncio.Task[None] | None = None
+        self._client: httpx.AsyncClient | None = None
+        self._client_loop: asyncio.AbstractEventLoop | None = None
+        self._client_closer: asyncio.Task[None] | None = None
+
+    @property
+    def idle_ttl_seconds(self) -> float:
+        return self._idle_ttl_seconds
+
+    def http_client(self) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._client.is_closed or self._client_loop is not loop:
+            client = httpx.AsyncClient(
+                timeout=_REQUEST_TIMEOUT_SECONDS,
+                limits=httpx.Limits(
+                    max_connections=self._http_max_connections,
+                    max_keepalive_connections=self._http_max_connections,
+                ),
+            )
+            self._client = client
+            self._client_loop = loop
+            self._client_closer = loop.create_task(self._close_with_loop(client), name="sd-server-http-client")
+        return self._client
+
+    @staticmethod
+    async def _close_with_loop(client: httpx.AsyncClient) -> None:
+        # Pooled connections belong to the loop that opened them and cannot be closed once it is gone.
+        # asyncio.run() cancels pending tasks before closing its loop, so release them from here.
+        try:
+            await asyncio.get_running_loop().create_future()
+        finally:
+            await client.aclose()
+
+    def resident_models(self) -> dict[int, str]:
+        with self._lock:
+            return {gpu_index: model_name for model_name, gpu_index in self._servers}
+
+    async def checkout(
+        self,
+        model_config: SDServerModelConfig,
+        gpu_index: int,
+        start_server: Callable[[int], Awaitable[SDServerReservation]],
+    ) -> SDServerReservation:
+        key = (model_config.model_name, gpu_index)
+        arguments = tuple(model_config.arguments)
+        stale: list[WarmSDServer] = []
+        with self._lock:
+            for other_key in [other for other in self._servers if other[1] == gpu_index and other != key]:
+                stale.append(self._servers.pop(other_key))
+            server = self._servers.get(key)
+            if server is not None and (server.in_use or server.arguments != arguments):
+                stale.append(self._servers.pop(key))
+                server = None
+            if server is not None:
+                server.in_use = True
+        for entry in stale:
+            await SDServerImageGenerator._stop_server(entry.reservation)
+        if server is not None:
+            if await self._is_healthy(server.reservation):
+                return server.reservation
+            await self.discard(model_config.model_name, gpu_index)
+        reservation = await start_server(gpu_index)
+        with self._lock:
+            self._servers[key] = WarmSDServer(
+                model_name=model_config.model_name,
+                gpu_index=gpu_index,
+                arguments=arguments,
+                reservation=reservation,
+                last_used=time.monotonic(),
+                in_use=True,
+            )
+        return reservation
+
+    async def checkin(self, model_name: str, gpu_index: int) -> None:
+        if self._idle_ttl_seconds <= 0:
+            await self.discard(model_name, gpu_index)
+            return
+        with self._lock:
+            server = self._servers.get((model_name, gpu_index))
+            if server is None:
+                return
+            server.in_use = False
+            server.last_used = time.monotonic()
+        self._ensure_reaper()
+
+    async def discard(self, model_name: str, gpu_index: int) -> None:
+        with self._lock:
+            server = self._servers.pop((model_name, gpu_index), None)
+        if server is not None:
+            await SDServerImageGenerator._stop_server(server.reservation)
+
+    async def discard_model(self, model_name: str) -> int:
+        with self._lock:
+            keys = [key for key, server in self._servers.items() if key[0] == model_name and not server.in_use]
+            evicted = [self._servers.pop(key) for key in keys]
+        for server in evicted:
+            await SDServerImageGenerator._stop_server(server.reservation)
+        return len(evicted)
+
+    def vram_bytes(self, model_name: str) -> int:
+        with self._lock:
+            servers = {
+                server.gpu_index: server.reservation.process.pid
+                for server in self._servers.values()
+                if server.model_name == model_name
+            }
+        if not servers:
+            return 0
+        try:
+            import pynvml  # type: ignore
+        except ImportError:
+            return 0
+        try:
+            pynvml.nvmlInit()
+        except pynvml.NVMLError:  # type: ignore[attr-defined]
+            return 0
+        try:
+            total = 0
+            for gpu_index, pid in servers.items():
+                handle = pynvml.nvmlDeviceGetHandleByIndex(gpu_index)
+                for process in pynvml.nvmlDeviceGetComputeRunningProcesses(handle):
+                    if process.pid == pid and process.usedGpuMemory:
+                        total += int(process.usedGpuMemory)
+            return total
+        except pynvml.NVMLError:  # type: ignore[attr-defined]
+            return 0
+        finally:
+            pynvml.nvmlShutdown()
+
+    async def evict_idle(self, now: float | None = None) -> int:
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            expired = [
+                key
+                for key, server in self._servers.items()
+                if not server.in_use and now - server.last_used >= self._idle_ttl_seconds
+            ]
+            evicted = [self._servers.pop(key) for key in expired]
+        for server in evicted:
+            await SDServerImageGenerator._stop_server(server.reservation)
+        return len(evicted)
+
+    async def aclose(self) -> None:
+        reaper, self._reaper = self._reaper, None
+        if reaper is not None and not reaper.done():
+            reaper.cancel()
+            await asyncio.gather(reaper, return_exceptions=True)
+        with self._lock:
+            servers = list(self._servers.values())
+            self._servers.clear()
+        for server in servers:
+            await SDServerImageGenerator._stop_server(server.reservation)
+        client, self._client = self._client, None
+        closer, self._client_closer = self._client_closer, None
+        self._client_loop = None
+        if closer is not None and closer.get_loop() is asyncio.get_running_loop():
+            closer.cancel()
+            await asyncio.gather(closer, return_exceptions=True)
+        if client is not None and not client.is_closed:
+            await client.aclose()
+
+    def shutdown(self) -> None:
+        with self._lock:
+            servers = list(self._servers.values())
+            self._servers.clear()
+        for server in servers:
+            if server.reservation.process.returncode is None:
+                try:
+                    os.kill(server.reservation.process.pid, signal.SIGTERM)
+                except ProcessLookupError:
+                    pass
+
+    def _ensure_reaper(self) -> None:
+        if self._reaper is not None and not self._reaper.done():
+            return
+        self._reaper = asyncio.get_running_loop().create_task(self._reap_forever(), name="sd-server-reaper")
+
+    async def _reap_forever(self) -> None:
+        interval = min(_REAPER_INTERVAL_SECONDS, self._idle_ttl_seconds)
+        while self._servers:
+            await asyncio.sleep(interval)
+            await self.evict_idle()
+
+    async def _is_healthy(self, reservation: SDServerReservation) -> bool:
+        if reservation.process.returncode is not None:
+            return False
+        try:
+            response = await self.http_client().get(
+                f"http://{_HOST}:{reservation.port}/v1/models",
+                timeout=_HEALTH_CHECK_TIMEOUT_SECONDS,
+            )
+        except httpx.HTTPError:
+            return False
+        return response.status_code == 200
+
+
+_SERVER_POOL = SDServerPool()
+atexit.register(_SERVER_POOL.shutdown)
+_GPU_SCHEDULER = GPUScheduler(_GPU_CONDITION, _GPU_LEASES, poll_interval_seconds=_GPU_POLL_INTERVAL_SECONDS)
+_GPU_MONITOR = GPUMonitor()
+_GPU_MONITOR.add_listener(_GPU_SCHEDULER.notify)
+atexit.register(_GPU_MONITOR.close)
+
+
+def gpu_scheduler_stats() -> dict[str, ModelQueueStats]:
+    return _GPU_SCHEDULER.stats()
+
+
+class SDServerModelModule:
+    def __init__(
+        self,
+        build_config: Callable[[], SDServerModelConfig],
+        server_pool: SDServerPool | None = None,
+    ):
+        self._build_config = build_config
+        self._server_pool = server_pool
+        self._lock = threading.Lock()
+        self._generator: SDServerImageGenerator | None = None
+
+    async def generate(self, request: ImageGenerationRequest) -> list[GeneratedImage]:
+        return await self._get_generator().generate(request)
+
+    async def generate_batch(self, requests: list[ImageGenerationRequest]) -> list[list[GeneratedImage] | Exception]:
+        return await self._get_generator().generate_batch(requests)
+
+    def _get_generator(self) -> SDServerImageGenerator:
+        with self._lock:
+            if self._generator is None:
+                self._generator = SDServerImageGenerator(self._build_config(), self._server_pool)
+            return self._generator
+
+    def vram_bytes(self) -> int:
+        generator = self._generator
+        if generator is None:
+            return 0
+        return generator.server_pool.vram_bytes(generator.model_name)
+
+    def idle_gpu_count(self) -> int:
+        return _GPU_SCHEDULER.idle_gpu_count(
+            SDServerImageGenerator._discover_gpus(),
+            SDServerImageGenerator._is_gpu_available,
+            (self._server_pool or _SERVER_POOL).resident_models(),
+        )
+
+    async def cleanup(self) -> None:
+        with self._lock:
+            generator, self._generator = self._generator, None
+        if generator is not None:
+            await generator.server_pool.discard_model(generator.model_name)
 
 
 class SDServerImageGenerator:
-    def __init__(self, model_config: SDServerModelConfig):
+    def __init__(self, model_config: SDServerModelConfig, server_pool: SDServerPool | None = None):
         self._model_config = model_config
+        self._server_pool = server_pool or _SERVER_POOL
+
+    @property
+    def model_name(self) -> str:
+        return self._model_config.model_name
+
+    @property
+    def server_pool(self) -> SDServerPool:
+        return self._server_pool
 
-    def generate(self, request: ImageGenerationRequest) -> list[GeneratedImage]:
+    async def generate(self, request: ImageGenerationRequest) -> list[GeneratedImage]:
         if self._model_config.requires_reference_images and not request.reference_images:
             raise RuntimeError(f"local image model '{self._model_config.model_name}' requires reference images")
-        gpu_index = self._acquire_gpu()
-        reservation: SDServerReservation | None = None
+        gpu_index = await self._acquire_gpu()
         try:
-            reservation = self._start_server(gpu_index)
-            return self._request_images(reservation.port, request)
+            return await self._generate_on_gpu(gpu_index, request)
         finally:
-            if reservation is not None:
-                self._stop_server(reservation)
             self._release_gpu(gpu_index)
 
-    def _acquire_gpu(self) -> int:
-        deadline = time.monotonic() + _GPU_WAIT_TIMEOUT_SECONDS
-        with _GPU_CONDITION:
-            while True:
-                for candidate in self._discover_gpus():
-                    if candidate.index in _LEASED_GPUS:
-                        continue
-                    if not self._is_gpu_available(candidate):
-                        continue
-                    _LEASED_GPUS.add(candidate.index)
-                    return candidate.index
-                remaining = deadline - time.monotonic()
-                if remaining <= 0:
-                    raise RuntimeError("no GPU available before timeout")
-                _GPU_CONDITION.wait(timeout=min(_GPU_POLL_INTERVAL_SECONDS, remaining))
+    async def generate_batch(self, requests: list[ImageGenerationRequest]) -> list[list[GeneratedImage] | Exception]:
+        results: list[list[GeneratedImage] | Exception] = [
+            RuntimeError(f"local image model '{self._model_config.model_name}' requires reference images")
+            if self._model_config.requires_reference_images and not request.reference_images
+            else []
+            for request in requests
+        ]
+        groups = self._group_identical_requests(
+            [index for index, result in enumerate(results) if not isinstance(result, Exception)],
+            requests,
+        )
+        if not groups:
+            return results
+        # Only identical prompts merge; every group leases its own GPU so distinct prompts spread across free cards.
+        outcomes = await asyncio.gather(
+            *(
+                self.generate(replace(requests[indices[0]], count=sum(requests[index].count for index in indices)))
+                for indices in groups
+            ),
+            return_exceptions=True,
+        )
+        for indices, images in zip(groups, outcomes):
+            if isinstance(images, BaseException):
+                if not isinstance(images, Exception):
+                    raise images
+                for index in indices:
+                    results[index] = images
+                continue
+            offset = 0
+            for index in indices:
+                count = requests[index].count
+                results[index] = images[offset:offset + count]
+                offset += count
+        return results
 
     @staticmethod
-    def _discover_gpus() -> list[GPUCandidate]:
-        try:
-            import pynvml  # type: ignore
-        except ImportError as exc:
-            raise RuntimeError("pynvml is required for stable-diffusion.cpp GPU selection") from exc
-
-        try:
-            pynvml.nvmlInit()
-        except pynvml.NVMLError as exc:  # type: ignore[attr-defined]
-            raise RuntimeError(f"failed to initialize NVML: {exc}") from exc
+    def _group_identical_requests(indices: list[int], requests: list[ImageGenerationRequest]) -> list[list[int]]:
+        groups: dict[tuple[object, ...], list[int]] = {}
+        for index in indices:
+            request = requests[index]
+            if request.reference_images or request.seed is not None:
+                groups[("single", index)] = [index]
+                continue
+            key = (
+                request.prompt,
+                request.negative,
+                request.size,
+                request.steps,
+                request.cfg_scale,
+                request.flow_shift,
+                request.sampler,
+            )
+            groups.setdefault(key, []).append(index)
+        return list(groups.values())
+
+    async def _generate_on_gpu(self, gpu_index: int, request: ImageGenerationRequest) -> list[GeneratedImage]:
+        model_name = self._model_config.model_name
+        for attempt in range(2):
+            reservation = await self._server_pool.checkout(self._model_config, gpu_index, self._start_server)
+            try:
+                images = await self._request_images(reservation.port, request)
+            except httpx.TransportError as exc:
+                crashed = await self._has_exited(reservation)
+                await self._server_pool.discard(model_name, gpu_index)
+                if crashed and attempt == 0:
+                    logger.warning("sd-server for model '%s' on gpu %d crashed; restarting", model_name, gpu_index)
+                    continue
+                raise RuntimeError(f"local image model '{model_name}' request failed: {exc}") from exc
+            except Exception:
+                if reservation.process.returncode is None:
+                    await self._server_pool.checkin(model_name, gpu_index)
+                else:
+                    await self._server_pool.discard(model_name, gpu_index)
+                raise
+            except BaseException:
+                await self._server_pool.discard(model_name, gpu_index)
+                raise
+            await self._server_pool.checkin(model_name, gpu_index)
+            return images
+        raise RuntimeError(f"local image model '{model_name}' could not be served")
+
+    async def _acquire_gpu(self) -> int:
+        return await _GPU_SCHEDULER.acquire_async(
+            self._model_config.model_name,
+            discover=self._discover_gpus,
+            is_available=self._is_gpu_available,
+            resident_models=self._server_pool.resident_models,
+            timeout=_GPU_WAIT_TIMEOUT_SECONDS,
+        )
 
-        try:
-            count = pynvml.nvmlDeviceGetCount()
-            candidates: list[GPUCandidate] = []
-            for index in range(count):
-                handle = pynvml.nvmlDeviceGetHandleByIndex(index)
-                name = pynvml.nvmlDeviceGetName(handle)
-                memory = pynvml.nvmlDeviceGetMemoryInfo(handle)
-                utilization = pynvml.nvmlDeviceGetUtilizationRates(handle)
-                mib = 1024 * 1024
-                candidates.append(
-                    GPUCandidate(
-                        index=index,
-                        name=name.decode("utf-8", errors="replace") if isinstance(name, bytes) else str(name),
-                        memory_total_mb=memory.total / mib,
-                        memory_free_mb=memory.free / mib,
-                        memory_used_mb=memory.used / mib,
-                        gpu_utilization_percent=float(utilization.gpu),
-                        memory_utilization_percent=float(utilization.memory),
-                    )
-                )
-            return candidates
-        except pynvml.NVMLError as exc:  # type: ignore[attr-defined]
-            raise RuntimeError(f"failed to query GPU state via NVML: {exc}") from exc
-        finally:
-            pynvml.nvmlShutdown()
+    @staticmethod
+    def _discover_gpus() -> list[GPUCandidate]:
+        return _GPU_MONITOR.snapshot()
 
     @staticmethod
     def _is_gpu_available(candidate: GPUCandidate) -> bool:
@@ -147,11 +467,9 @@ class SDServerImageGenerator:
 
     @staticmethod
     def _release_gpu(gpu_index: int) -> None:
-        with _GPU_CONDITION:
-            _LEASED_GPUS.discard(gpu_index)
-            _GPU_CONDITION.notify_all()
+        _GPU_SCHEDULER.release(gpu_index)
 
-    def _start_server(self, gpu_index: int) -> SDServerReservation:
+    async def _start_server(self, gpu_index: int) -> SDServerReservation:
         binary = self._find_sd_server_binary()
         port = self._find_free_port()
         command = [
@@ -164,18 +482,17 @@ class SDServerImageGenerator:
         ]
         env = os.environ.copy()
         env["CUDA_VISIBLE_DEVICES"] = str(gpu_index)
-        process = subprocess.Popen(
-            command,
-            stdin=subprocess.DEVNULL,
-            text=True,
+        process = await asyncio.create_subprocess_exec(
+            *command,
+            stdin=asyncio.subprocess.DEVNULL,
             env=env,
         )
         reservation = SDServerReservation(port=port, process=process)
         try:
-            self._wait_until_ready(reservation)
+            await self._wait_until_ready(reservation)
             return reservation
-        except Exception:
-            self._stop_server(reservation)
+        except BaseException:
+            await self._stop_server(reservation)
             raise
 
     @staticmethod
@@ -199,32 +516,42 @@ class SDServerImageGenerator:
             sock.bind((_HOST, 0))
             return int(sock.getsockname()[1])
 
-    @staticmethod
-    def _wait_until_ready(reservation: SDServerReservation) -> None:
+    async def _wait_until_ready(self, reservation: SDServerReservation) -> None:
         deadline = time.monotonic() + _STARTUP_TIMEOUT_SECONDS
         url = f"http://{_HOST}:{reservation.port}/v1/models"
-        with httpx.Client(timeout=5.0) as client:
-            while True:
-                if reservation.process.poll() is not None:
-                    raise RuntimeError("sd-server exited before it became ready")
-                if time.monotonic() >= deadline:
-                    raise RuntimeError("sd-server startup timed out")
-                try:
-                    response = client.get(url)
-                except httpx.ConnectError:
-                    time.sleep(_READINESS_POLL_SECONDS)
-                    continue
-                except httpx.TimeoutException as exc:
-                    raise RuntimeError(f"sd-server readiness probe timed out: {exc}") from exc
-                except httpx.HTTPError as exc:
-                    raise RuntimeError(f"sd-server readiness probe failed: {exc}") from exc
-                if response.status_code == 200:
-                    return
-                raise RuntimeError(
-                    f"sd-server readiness probe returned {response.status_code}: {response.text.strip()}"
-                )
+        client = self._server_pool.http_client()
+        while True:
+            if reservation.process.returncode is not None:
+                raise RuntimeError("sd-server exited before it became ready")
+            if time.monotonic() >= deadline:
+                raise RuntimeError("sd-server startup timed out")
+            try:
+                response = await client.get(url, timeout=5.0)
+            except httpx.ConnectError:
+                if await self._has_exited(reservation, wait_seconds=_READINESS_POLL_SECONDS):
+                    raise RuntimeError("sd-server exited before it became ready") from None
+                continue
+            except httpx.TimeoutException as exc:
+                raise RuntimeError(f"sd-server readiness probe timed out: {exc}") from exc
+            except httpx.HTTPError as exc:
+                raise RuntimeError(f"sd-server readiness probe failed: {exc}") from exc
+            if response.status_code == 200:
+                return
+            raise RuntimeError(
+                f"sd-server readiness probe returned {response.status_code}: {response.text.strip()}"
+            )
 
-    def _request_images(self, port: int, request: ImageGenerationRequest) -> list[GeneratedImage]:
+    @staticmethod
+    async def _has_exited(reservation: SDServerReservation, wait_seconds: float = _EXIT_GRACE_SECONDS) -> bool:
+        if reservation.process.returncode is not None:
+            return True
+        try:
+            await asyncio.wait_for(reservation.process.wait(), timeout=wait_seconds)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+    async def _request_images(self, port: int, request: ImageGenerationRequest) -> list[GeneratedImage]:
         is_edit = bool(request.reference_images)
         route = "edits" if is_edit else "generations"
         error_label = "edit" if is_edit else "generation"
@@ -237,15 +564,14 @@ class SDServerImageGenerator:
         else:
             request_kwargs = {"json": self._build_openai_image_payload(request)}
         url = f"http://{_HOST}:{port}/v1/images/{route}"
-        with httpx.Client(timeout=_REQUEST_TIMEOUT_SECONDS) as client:
-            response = client.post(url, **request_kwargs)
-            if response.status_code >= 400:
-                detail = self._response_detail(response)
-                raise RuntimeError(
-                    f"local image {error_label} failed for model '{self._model_config.model_name}': "
-                    f"{response.status_code} {detail}"
-                )
-            return self._decode_generated_images(response.json())
+        response = await self._server_pool.http_client().post(url, **request_kwargs)
+        if response.status_code >= 400:
+            detail = self._response_detail(response)
+            raise RuntimeError(
+                f"local image {error_label} failed for model '{self._model_config.model_name}': "
+                f"{response.status_code} {detail}"
+            )
+        return self._decode_generated_images(response.json())
 
     @staticmethod
     def _response_detail(response: httpx.Response) -> str:
@@ -266,16 +592,19 @@ class SDServerImageGenerator:
         return json.dumps(data, ensure_ascii=True)
 
     @staticmethod
-    def _stop_server(reservation: SDServerReservation) -> None:
+    async def _stop_server(reservation: SDServerReservation) -> None:
         process = reservation.process
-        if process.poll() is not None:
+        if process.returncode is not None:
             return
-        process.terminate()
         try:
-            process.wait(timeout=10)
-        except subprocess.TimeoutExpired:
-            process.kill()
-            process.wait(timeout=5)
+            process.terminate()
+            try:
+                await asyncio.wait_for(process.wait(), timeout=_STOP_TIMEOUT_SECONDS)
+            except asyncio.TimeoutError:
+                process.kill()
+                await asyncio.wait_for(process.wait(), timeout=_KILL_TIMEOUT_SECONDS)
+        except ProcessLookupError:
+            pass
 
     def _build_openai_image_payload(self, request: ImageGenerationRequest) -> dict[str, object]:
         payload = self._build_openai_payload(request, count=request.count)
@@ -1,6 +1,6 @@
 from __future__ import annotations
 
-from image_models._sd_server import SDServerImageGenerator, SDServerModelConfig, load_sd_server_model_config
+from image_models._sd_server import SDServerModelConfig, SDServerModelModule, load_sd_server_model_config
 from sns_agent.schemas import GeneratedImage, ImageGenerationRequest
 
 
@@ -17,6 +17,24 @@ def _build_model_config() -> SDServerModelConfig:
     )
 
 
-def generate(request: ImageGenerationRequest) -> list[GeneratedImage]:
-    generator = SDServerImageGenerator(_build_model_config())
-    return generator.generate(request)
+_MODEL = SDServerModelModule(_build_model_config)
+
+
+async def generate(request: ImageGenerationRequest) -> list[GeneratedImage]:
+    return await _MODEL.generate(request)
+
+
+async def generate_batch(requests: list[ImageGenerationRequest]) -> list[list[GeneratedImage] | Exception]:
+    return await _MODEL.generate_batch(requests)
+
+
+def vram_bytes() -> int:
+    return _MODEL.vram_bytes()
+
+
+def idle_gpu_count() -> int:
+    return _MODEL.idle_gpu_count()
+
+
+async def cleanup() -> None:
+    await _MODEL.cleanup()
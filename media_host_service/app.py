@@ -1,19 +1,261 @@
 from __future__ import annotations
 
+import asyncio
+from collections import OrderedDict
+from collections.abc import Callable, Iterable
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import asynccontextmanager
+from dataclasses import asdict, dataclass
+import hashlib
 import html
 from io import BytesIO
 import json
+import logging
 import mimetypes
+import multiprocessing
 import os
+import re
 import secrets
 import shutil
+import sqlite3
+import tempfile
+import threading
+import time
 from pathlib import Path
+from typing import Any, BinaryIO, TypeVar
 
 import av
 from fastapi import Depends, FastAPI, File, HTTPException, Request, UploadFile
-from fastapi.responses import FileResponse, HTMLResponse, Response
+from fastapi.responses import FileResponse, HTMLResponse, JSONResponse, Response
 from fastapi.security import HTTPBasic, HTTPBasicCredentials
 from PIL import Image, ImageOps, UnidentifiedImageError
+from pydantic import BaseModel, Field
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+UPLOAD_CHUNK_BYTES = 1024 * 1024
+OG_IMAGE_FILENAME = "og.png"
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+PAGE_ID_RE = re.compile(r"^[A-Za-z0-9_-]+$")
+MAX_BATCH_PAGE_IDS = 100
+
+logger = logging.getLogger(__name__)
+T = TypeVar("T")
+
+
+class MediaProcessingError(Exception):
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(status_code, detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+@dataclass(slots=True)
+class MediaWorkStats:
+    workers: int
+    max_pending: int
+    waiting: int = 0
+    running: int = 0
+    max_running: int = 0
+    submitted: int = 0
+    completed: int = 0
+    failed: int = 0
+    max_queue_depth: int = 0
+    total_wait_seconds: float = 0.0
+
+    @property
+    def queue_depth(self) -> int:
+        backlog = max(0, self.running - self.workers) if self.workers else 0
+        return self.waiting + backlog
+
+
+class MediaWorkPool:
+    def __init__(self, workers: int | None = None, max_pending: int | None = None):
+        if workers is None:
+            workers = int(os.getenv("MEDIA_HOST_PROCESS_WORKERS", str(min(4, os.cpu_count() or 1))))
+        workers = max(0, workers)
+        if max_pending is None:
+            max_pending = int(os.getenv("MEDIA_HOST_PROCESS_MAX_PENDING", str(max(1, workers) * 2)))
+        self._stats = MediaWorkStats(workers=workers, max_pending=max(1, max_pending))
+        self._executor: ProcessPoolExecutor | None = None
+        self._slots: asyncio.Semaphore | None = None
+        self._slots_loop: asyncio.AbstractEventLoop | None = None
+
+    def stats(self) -> dict[str, Any]:
+        return {**asdict(self._stats), "queue_depth": self._stats.queue_depth}
+
+    async def run(self, func: Callable[..., T], *args: Any) -> T:
+        stats = self._stats
+        stats.waiting += 1
+        stats.submitted += 1
+        stats.max_queue_depth = max(stats.max_queue_depth, stats.queue_depth)
+        enqueued_at = time.monotonic()
+        try:
+            await self._acquire_slot()
+        finally:
+            stats.waiting -= 1
+        stats.total_wait_seconds += time.monotonic() - enqueued_at
+        stats.running += 1
+        stats.max_running = max(stats.max_running, stats.running)
+        stats.max_queue_depth = max(stats.max_queue_depth, stats.queue_depth)
+        try:
+            if stats.workers == 0:
+                result = await asyncio.to_thread(func, *args)
+            else:
+                result = await asyncio.wrap_future(self._pool().submit(func, *args))
+        except MediaProcessingError as exc:
+            stats.failed += 1
+            raise HTTPException(status_code=exc.status_code, detail=exc.detail) from None
+        except BaseException:
+            stats.failed += 1
+            raise
+        else:
+            stats.completed += 1
+            return result
+        finally:
+            stats.running -= 1
+            self._slots.release()
+
+    def shutdown(self) -> None:
+        executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    async def _acquire_slot(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._slots is None or self._slots_loop is not loop:
+            self._slots = asyncio.Semaphore(self._stats.max_pending)
+            self._slots_loop = loop
+        await self._slots.acquire()
+
+    def _pool(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self._stats.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return self._executor
+
+
+_media_pool: MediaWorkPool | None = None
+
+
+def media_pool() -> MediaWorkPool:
+    global _media_pool
+    if _media_pool is None:
+        _media_pool = MediaWorkPool()
+    return _media_pool
+
+
+class PageIndex:
+    _PRAGMAS = (
+        "PRAGMA journal_mode=WAL",
+        "PRAGMA synchronous=NORMAL",
+        "PRAGMA busy_timeout=5000",
+    )
+
+    def __init__(self, root: Path, db_path: Path | None = None, cache_entries: int | None = None):
+        if db_path is None:
+            db_path = Path(os.getenv("MEDIA_HOST_INDEX_PATH") or root / "index.sqlite3")
+        if cache_entries is None:
+            cache_entries = int(os.getenv("MEDIA_HOST_METADATA_CACHE_ENTRIES", "4096"))
+        self._root = root
+        self._cache_entries = max(0, cache_entries)
+        self._cache: OrderedDict[str, dict] = OrderedDict()
+        self._lock = threading.RLock()
+        db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        for pragma in self._PRAGMAS:
+            self._conn.execute(pragma)
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS pages (
+                page_id TEXT PRIMARY KEY,
+                metadata TEXT NOT NULL,
+                created_at REAL NOT NULL
+            )
+            """
+        )
+        self._conn.commit()
+
+    def cached(self, page_id: str) -> dict | None:
+        with self._lock:
+            metadata = self._cache.get(page_id)
+            if metadata is not None:
+                self._cache.move_to_end(page_id)
+            return metadata
+
+    def get(self, page_id: str) -> dict | None:
+        return self.get_many([page_id]).get(page_id)
+
+    def get_many(self, page_ids: Iterable[str]) -> dict[str, dict]:
+        found: dict[str, dict] = {}
+        missing: list[str] = []
+        for page_id in dict.fromkeys(page_ids):
+            metadata = self.cached(page_id)
+            if metadata is None:
+                missing.append(page_id)
+            else:
+                found[page_id] = metadata
+        if not missing:
+            return found
+
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT page_id, metadata FROM pages WHERE page_id IN ({','.join('?' * len(missing))})",
+                missing,
+            ).fetchall()
+            for page_id, text in rows:
+                found[page_id] = self._remember(page_id, json.loads(text))
+        for page_id in missing:
+            if page_id not in found:
+                metadata = self._backfill(page_id)
+                if metadata is not None:
+                    found[page_id] = metadata
+        return found
+
+    def put(self, page_id: str, metadata: dict) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO pages (page_id, metadata, created_at) VALUES (?, ?, ?)",
+                (page_id, json.dumps(metadata, ensure_ascii=False), time.time()),
+            )
+            self._conn.commit()
+            self._remember(page_id, metadata)
+
+    def close(self) -> None:
+        with self._lock:
+            self._cache.clear()
+            self._conn.close()
+
+    def _backfill(self, page_id: str) -> dict | None:
+        # Pages uploaded before the index existed only have metadata.json.
+        try:
+            metadata = json.loads((self._root / page_id / "metadata.json").read_text())
+        except FileNotFoundError:
+            return None
+        self.put(page_id, metadata)
+        return metadata
+
+    def _remember(self, page_id: str, metadata: dict) -> dict:
+        if self._cache_entries:
+            self._cache[page_id] = metadata
+            self._cache.move_to_end(page_id)
+            while len(self._cache) > self._cache_entries:
+                self._cache.popitem(last=False)
+        return metadata
+
+
+_page_indexes: dict[Path, PageIndex] = {}
+_page_indexes_lock = threading.Lock()
+
+
+def page_index() -> PageIndex:
+    root = ensure_storage_dir().resolve()
+    with _page_indexes_lock:
+        index = _page_indexes.get(root)
+        if index is None:
+            index = _page_indexes[root] = PageIndex(root)
+        return index
 
 
 def storage_dir() -> Path:
@@ -39,10 +281,22 @@ def build_og_image_url(request: Request, page_id: str) -> str:
     return str(request.url_for("og_image", page_id=page_id))
 
 
+def page_cache_control() -> str:
+    return f"public, max-age={int(os.getenv('MEDIA_HOST_PAGE_MAX_AGE_SECONDS', '300'))}"
+
+
 def upload_password() -> str:
     return os.getenv("MEDIA_HOST_UPLOAD_PASSWORD", "")
 
 
+def max_upload_file_bytes() -> int:
+    return int(float(os.getenv("MEDIA_HOST_MAX_FILE_MB", "200")) * 1024 * 1024)
+
+
+def max_upload_request_bytes() -> int:
+    return int(float(os.getenv("MEDIA_HOST_MAX_REQUEST_MB", "820")) * 1024 * 1024)
+
+
 def is_supported_mime_type(mime_type: str) -> bool:
     return mime_type.startswith("image/") or mime_type.startswith("video/")
 
@@ -55,23 +309,84 @@ def media_kind(mime_type: str) -> str:
     raise HTTPException(status_code=400, detail="only image and video files are supported")
 
 
-def load_metadata(page_id: str) -> dict:
-    metadata_path = ensure_storage_dir() / page_id / "metadata.json"
-    if not metadata_path.exists():
+def page_directory(page_id: str) -> Path:
+    if not PAGE_ID_RE.match(page_id):
+        raise HTTPException(status_code=404, detail="page not found")
+    return ensure_storage_dir() / page_id
+
+
+async def load_metadata(page_id: str) -> dict:
+    if not PAGE_ID_RE.match(page_id):
         raise HTTPException(status_code=404, detail="page not found")
-    return json.loads(metadata_path.read_text())
+    index = page_index()
+    metadata = index.cached(page_id)
+    if metadata is None:
+        metadata = await asyncio.to_thread(index.get, page_id)
+    if metadata is None:
+        raise HTTPException(status_code=404, detail="page not found")
+    return metadata
+
+
+def page_payload(request: Request, page_id: str, metadata: dict) -> dict[str, Any]:
+    return {
+        "page_id": page_id,
+        "public_url": build_public_url(request, page_id),
+        "og_image_url": build_og_image_url(request, page_id),
+        "items": metadata.get("items") or [],
+    }
+
+
+def write_upload(source: BinaryIO, target_path: Path, max_bytes: int) -> int:
+    source.seek(0)
+    fd, temp_name = tempfile.mkstemp(dir=target_path.parent, prefix=f".{target_path.name}.", suffix=".part")
+    size = 0
+    try:
+        with os.fdopen(fd, "wb") as target:
+            while chunk := source.read(UPLOAD_CHUNK_BYTES):
+                size += len(chunk)
+                if size > max_bytes:
+                    raise HTTPException(status_code=413, detail="uploaded file is too large")
+                target.write(chunk)
+            target.flush()
+            os.fsync(target.fileno())
+        os.replace(temp_name, target_path)
+    except BaseException:
+        Path(temp_name).unlink(missing_ok=True)
+        raise
+    return size
+
+
+def write_text_atomic(target_path: Path, text: str) -> None:
+    fd, temp_name = tempfile.mkstemp(dir=target_path.parent, prefix=f".{target_path.name}.", suffix=".part")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as target:
+            target.write(text)
+            target.flush()
+            os.fsync(target.fileno())
+        os.replace(temp_name, target_path)
+    except BaseException:
+        Path(temp_name).unlink(missing_ok=True)
+        raise
+
+
+def fsync_directory(path: Path) -> None:
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
 
 
 def extract_video_poster(video_path: Path) -> Image.Image:
     try:
         with av.open(str(video_path)) as container:
             if not container.streams.video:
-                raise HTTPException(status_code=400, detail="video stream not found")
+                raise MediaProcessingError(400, "video stream not found")
             for frame in container.decode(video=0):
                 return frame.to_image().convert("RGB")
     except av.FFmpegError as exc:
-        raise HTTPException(status_code=400, detail="invalid video file") from exc
-    raise HTTPException(status_code=400, detail="video contains no decodable frames")
+        raise MediaProcessingError(400, "invalid video file") from exc
+    raise MediaProcessingError(400, "video contains no decodable frames")
 
 
 def save_video_poster(page_dir: Path, filename: str, video_path: Path) -> tuple[str, str]:
@@ -85,8 +400,7 @@ def save_video_poster(page_dir: Path, filename: str, video_path: Path) -> tuple[
     return poster_name, "image/png"
 
 
-def open_page_preview_images(page_id: str, items: list[dict[str, str]]) -> list[Image.Image]:
-    page_dir = ensure_storage_dir() / page_id
+def open_page_preview_images(page_dir: Path, items: list[dict[str, str]]) -> list[Image.Image]:
     images: list[Image.Image] = []
     try:
         for item in items:
@@ -98,11 +412,11 @@ def open_page_preview_images(page_id: str, items: list[dict[str, str]]) -> list[
     except FileNotFoundError as exc:
         for image in images:
             image.close()
-        raise HTTPException(status_code=404, detail="file not found") from exc
+        raise MediaProcessingError(404, "file not found") from exc
     except UnidentifiedImageError as exc:
         for image in images:
             image.close()
-        raise HTTPException(status_code=500, detail="invalid stored image") from exc
+        raise MediaProcessingError(500, "invalid stored image") from exc
     return images
 
 
@@ -142,7 +456,109 @@ def render_og_image(images: list[Image.Image]) -> bytes:
     return output.getvalue()
 
 
-app = FastAPI()
+def write_og_image(page_dir: Path, items: list[dict[str, str]]) -> Path:
+    images = open_page_preview_images(page_dir, items)
+    try:
+        content = render_og_image(images)
+    finally:
+        for image in images:
+            image.close()
+    og_path = page_dir / OG_IMAGE_FILENAME
+    write_upload(BytesIO(content), og_path, len(content))
+    return og_path
+
+
+_og_renders: dict[Path, asyncio.Future[Path]] = {}
+
+
+async def ensure_og_image(page_dir: Path, items: list[dict[str, str]]) -> Path:
+    og_path = page_dir / OG_IMAGE_FILENAME
+    if og_path.exists():
+        return og_path
+    pending = _og_renders.get(page_dir)
+    if pending is None:
+        pending = asyncio.ensure_future(media_pool().run(write_og_image, page_dir, items))
+        _og_renders[page_dir] = pending
+        pending.add_done_callback(lambda _: _og_renders.pop(page_dir, None))
+    return await asyncio.shield(pending)
+
+
+def file_etag(path: Path) -> str:
+    stat = path.stat()
+    return f'"{stat.st_size:x}-{stat.st_mtime_ns:x}"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    candidates = {candidate.strip().removeprefix("W/") for candidate in if_none_match.split(",")}
+    return "*" in candidates or etag in candidates
+
+
+def immutable_file_response(request: Request, path: Path, media_type: str | None = None) -> Response:
+    etag = file_etag(path)
+    headers = {"ETag": etag, "Cache-Control": IMMUTABLE_CACHE_CONTROL}
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    return FileResponse(path, media_type=media_type, headers=headers)
+
+
+def revalidated_response(request: Request, response: Response) -> Response:
+    etag = f'"{hashlib.sha256(response.body).hexdigest()[:32]}"'
+    headers = {"ETag": etag, "Cache-Control": page_cache_control()}
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return response
+
+
+class UploadSizeLimitMiddleware:
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["method"] != "POST" or scope["path"] != "/media":
+            await self.app(scope, receive, send)
+            return
+
+        limit = max_upload_request_bytes()
+        content_length = dict(scope["headers"]).get(b"content-length", b"")
+        if content_length.isdigit() and int(content_length) > limit:
+            response = JSONResponse({"detail": "upload request is too large"}, status_code=413)
+            await response(scope, receive, send)
+            return
+
+        received = 0
+
+        async def limited_receive() -> Message:
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    raise HTTPException(status_code=413, detail="upload request is too large")
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    try:
+        yield
+    finally:
+        if _media_pool is not None:
+            await asyncio.to_thread(_media_pool.shutdown)
+        with _page_indexes_lock:
+            indexes = list(_page_indexes.values())
+            _page_indexes.clear()
+        for index in indexes:
+            index.close()
+
+
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(UploadSizeLimitMiddleware)
 basic_auth = HTTPBasic(auto_error=False)
 
 
@@ -195,30 +611,56 @@ async def create_media_page(
             suffix = Path(upload.filename or "").suffix or mimetypes.guess_extension(mime_type) or ".bin"
             filename = f"{index}-{sanitize_filename(Path(upload.filename or default_name).stem)}{suffix}"
             target_path = page_dir / filename
-            target_path.write_bytes(await upload.read())
-
-            item = {
-                "filename": filename,
-                "mime_type": mime_type,
-                "kind": kind,
-                "url": str(request.url_for("media_file", page_id=page_id, filename=filename)),
-            }
-            if kind == "video":
-                poster_filename, poster_mime_type = save_video_poster(page_dir, filename, target_path)
-                item["poster_filename"] = poster_filename
-                item["poster_mime_type"] = poster_mime_type
-                item["poster_url"] = str(request.url_for("media_file", page_id=page_id, filename=poster_filename))
-
-            items.append(item)
+            await asyncio.to_thread(write_upload, upload.file, target_path, max_upload_file_bytes())
+
+            items.append(
+                {
+                    "filename": filename,
+                    "mime_type": mime_type,
+                    "kind": kind,
+                    "url": str(request.url_for("media_file", page_id=page_id, filename=filename)),
+                }
+            )
+
+        videos = [item for item in items if item["kind"] == "video"]
+        posters = await asyncio.gather(
+            *(
+                media_pool().run(save_video_poster, page_dir, item["filename"], page_dir / item["filename"])
+                for item in videos
+            ),
+            return_exceptions=True,
+        )
+        for item, poster in zip(videos, posters, strict=True):
+            if isinstance(poster, BaseException):
+                raise poster
+            poster_filename, poster_mime_type = poster
+            item["poster_filename"] = poster_filename
+            item["poster_mime_type"] = poster_mime_type
+            item["poster_url"] = str(request.url_for("media_file", page_id=page_id, filename=poster_filename))
     except Exception:
         shutil.rmtree(page_dir, ignore_errors=True)
         raise
 
+    try:
+        await media_pool().run(write_og_image, page_dir, items)
+    except Exception as exc:
+        logger.warning("could not pre-render og image page_id=%s: %s", page_id, exc)
+
     metadata = {
         "page_id": page_id,
         "items": items,
     }
-    (page_dir / "metadata.json").write_text(json.dumps(metadata, ensure_ascii=False, indent=2))
+    try:
+        await asyncio.to_thread(
+            write_text_atomic,
+            page_dir / "metadata.json",
+            json.dumps(metadata, ensure_ascii=False, indent=2),
+        )
+        await asyncio.to_thread(fsync_directory, page_dir)
+        await asyncio.to_thread(page_index().put, page_id, metadata)
+    except Exception:
+        shutil.rmtree(page_dir, ignore_errors=True)
+        raise
 
     return {
         "page_id": page_id,
@@ -226,20 +668,34 @@ async def create_media_page(
     }
 
 
-@app.get("/api/pages/{page_id}")
-async def media_page_json(request: Request, page_id: str):
-    metadata = load_metadata(page_id)
+@app.get("/api/stats/media-workers")
+async def media_worker_stats():
+    return media_pool().stats()
+
+
+class PageBatchRequest(BaseModel):
+    page_ids: list[str] = Field(max_length=MAX_BATCH_PAGE_IDS)
+
+
+@app.post("/api/pages/batch")
+async def media_pages_batch(request: Request, body: PageBatchRequest):
+    page_ids = [page_id for page_id in dict.fromkeys(body.page_ids) if PAGE_ID_RE.match(page_id)]
+    found = await asyncio.to_thread(page_index().get_many, page_ids) if page_ids else {}
     return {
-        "page_id": page_id,
-        "public_url": build_public_url(request, page_id),
-        "og_image_url": build_og_image_url(request, page_id),
-        "items": metadata.get("items") or [],
+        "pages": {page_id: page_payload(request, page_id, metadata) for page_id, metadata in found.items()},
+        "missing": [page_id for page_id in dict.fromkeys(body.page_ids) if page_id not in found],
     }
 
 
+@app.get("/api/pages/{page_id}")
+async def media_page_json(request: Request, page_id: str):
+    payload = page_payload(request, page_id, await load_metadata(page_id))
+    return revalidated_response(request, JSONResponse(payload))
+
+
 @app.get("/m/{page_id}", name="media_page")
 async def media_page(request: Request, page_id: str):
-    metadata = load_metadata(page_id)
+    metadata = await load_metadata(page_id)
     items = metadata.get("items") or []
     if not items:
         raise HTTPException(status_code=404, detail="page is empty")
@@ -294,7 +750,7 @@ async def media_page(request: Request, page_id: str):
   </body>
 </html>
 """
-    return HTMLResponse(content)
+    return revalidated_response(request, HTMLResponse(content))
 
 
 def render_media_item(item: dict[str, str]) -> str:
@@ -311,23 +767,20 @@ def render_media_item(item: dict[str, str]) -> str:
 
 
 @app.get("/og/{page_id}.png", name="og_image")
-async def og_image(page_id: str):
-    metadata = load_metadata(page_id)
-    items = metadata.get("items") or []
-    if not items:
-        raise HTTPException(status_code=404, detail="page is empty")
-    images = open_page_preview_images(page_id, items)
-    try:
-        return Response(content=render_og_image(images), media_type="image/png")
-    finally:
-        for image in images:
-            image.close()
+async def og_image(request: Request, page_id: str):
+    og_path = page_directory(page_id) / OG_IMAGE_FILENAME
+    if not og_path.exists():
+        metadata = await load_metadata(page_id)
+        items = metadata.get("items") or []
+        if not items:
+            raise HTTPException(status_code=404, detail="page is empty")
+        og_path = await ensure_og_image(og_path.parent, items)
+    return immutable_file_response(request, og_path, "image/png")
 
 
 @app.get("/media/{page_id}/{filename}", name="media_file")
-async def media_file(page_id: str, filename: str):
-    safe_name = Path(filename).name
-    target_path = ensure_storage_dir() / page_id / safe_name
-    if not target_path.exists():
+async def media_file(request: Request, page_id: str, filename: str):
+    target_path = page_directory(page_id) / Path(filename).name
+    if not target_path.is_file():
         raise HTTPException(status_code=404, detail="file not found")
-    return FileResponse(target_path)
+    return immutable_file_response(request, target_path)
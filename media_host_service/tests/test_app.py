@@ -1,4 +1,6 @@
+import asyncio
 import tempfile
+import threading
 import unittest
 from io import BytesIO
 from pathlib import Path
@@ -8,6 +10,7 @@ import av
 from fastapi.testclient import TestClient
 from PIL import Image
 
+import app as media_host
 from app import app
 
 
@@ -186,6 +189,321 @@ class MediaHostServiceTests(unittest.TestCase):
             self.assertEqual(payload["items"][0]["kind"], "video")
             self.assertIn("poster_url", payload["items"][0])
 
+    def test_page_metadata_is_served_from_index_without_reading_files(self):
+        with tempfile.TemporaryDirectory() as temp_dir, patch.dict(
+            "os.environ",
+            {"MEDIA_HOST_STORAGE_DIR": temp_dir},
+            clear=False,
+        ):
+            client = TestClient(app)
+            response = client.post(
+                "/media",
+                files=[("files", ("cat.png", self._png_bytes((255, 0, 0)), "image/png"))],
+            )
+            page_id = response.json()["page_id"]
+            (Path(temp_dir) / page_id / "metadata.json").unlink()
+
+            self.assertEqual(client.get(f"/api/pages/{page_id}").status_code, 200)
+            self.assertEqual(client.get(f"/m/{page_id}").status_code, 200)
+
+            reopened = media_host.PageIndex(Path(temp_dir).resolve())
+            self.addCleanup(reopened.close)
+            self.assertEqual(reopened.get(page_id)["page_id"], page_id)
+
+    def test_pages_without_index_entry_are_backfilled_from_metadata_file(self):
+        with tempfile.TemporaryDirectory() as temp_dir, patch.dict(
+            "os.environ",
+            {"MEDIA_HOST_STORAGE_DIR": temp_dir},
+            clear=False,
+        ):
+            page_dir = Path(temp_dir) / "legacy"
+            page_dir.mkdir()
+            (page_dir / "metadata.json").write_text(
+                '{"page_id": "legacy", "items": [{"filename": "1-a.png", "kind": "image", '
+                '"mime_type": "image/png", "url": "http://testserver/media/legacy/1-a.png"}]}'
+            )
+            client = TestClient(app)
+
+            self.assertEqual(client.get("/api/pages/legacy").json()["items"][0]["filename"], "1-a.png")
+            (page_dir / "metadata.json").unlink()
+            self.assertEqual(client.get("/api/pages/legacy").status_code, 200)
+            self.assertEqual(client.get("/api/pages/unknown").status_code, 404)
+
+    def test_media_files_are_immutable_and_support_byte_ranges(self):
+        video = self._mp4_bytes((0, 255, 0))
+        with tempfile.TemporaryDirectory() as temp_dir, patch.dict(
+            "os.environ",
+            {"MEDIA_HOST_STORAGE_DIR": temp_dir},
+            clear=False,
+        ):
+            client = TestClient(app)
+            response = client.post("/media", files=[("files", ("clip.mp4", video, "video/mp4"))])
+            file_url = client.get(f"/api/pages/{response.json()['page_id']}").json()["items"][0]["url"]
+
+            full = client.get(file_url)
+            self.assertEqual(full.status_code, 200)
+            self.assertEqual(full.content, video)
+            self.assertEqual(full.headers["cache-control"], media_host.IMMUTABLE_CACHE_CONTROL)
+            self.assertEqual(full.headers["accept-ranges"], "bytes")
+            self.assertIn("last-modified", full.headers)
+
+            partial = client.get(file_url, headers={"Range": "bytes=10-19"})
+            self.assertEqual(partial.status_code, 206)
+            self.assertEqual(partial.content, video[10:20])
+            self.assertEqual(partial.headers["content-range"], f"bytes 10-19/{len(video)}")
+
+            stale = client.get(file_url, headers={"Range": "bytes=10-19", "If-Range": '"stale"'})
+            self.assertEqual(stale.status_code, 200)
+            resumed = client.get(file_url, headers={"Range": "bytes=10-19", "If-Range": full.headers["etag"]})
+            self.assertEqual(resumed.status_code, 206)
+
+            revalidated = client.get(file_url, headers={"If-None-Match": full.headers["etag"]})
+            self.assertEqual(revalidated.status_code, 304)
+            self.assertEqual(revalidated.content, b"")
+            self.assertEqual(client.get(file_url, headers={"Range": f"bytes={len(video)}-"}).status_code, 416)
+            self.assertEqual(client.get("/media/..%2F/x.mp4").status_code, 404)
+
+    def test_pages_and_page_json_are_revalidated_with_etags(self):
+        with tempfile.TemporaryDirectory() as temp_dir, patch.dict(
+            "os.environ",
+            {"MEDIA_HOST_STORAGE_DIR": temp_dir, "MEDIA_HOST_PAGE_MAX_AGE_SECONDS": "60"},
+            clear=False,
+        ):
+            client = TestClient(app)
+            page_id = client.post(
+                "/media",
+                files=[("files", ("cat.png", self._png_bytes((255, 0, 0)), "image/png"))],
+            ).json()["page_id"]
+
+            for path in (f"/m/{page_id}", f"/api/pages/{page_id}"):
+                first = client.get(path)
+                self.assertEqual(first.status_code, 200)
+                self.assertEqual(first.headers["cache-control"], "public, max-age=60")
+                self.assertEqual(client.get(path).headers["etag"], first.headers["etag"])
+
+                revalidated = client.get(path, headers={"If-None-Match": f'W/{first.headers["etag"]}'})
+                self.assertEqual(revalidated.status_code, 304)
+                self.assertEqual(revalidated.content, b"")
+                self.assertEqual(revalidated.headers["etag"], first.headers["etag"])
+                self.assertEqual(client.get(path, headers={"If-None-Match": '"other"'}).status_code, 200)
+
+    def test_batch_endpoint_resolves_many_pages_in_one_request(self):
+        with tempfile.TemporaryDirectory() as temp_dir, patch.dict(
+            "os.environ",
+            {"MEDIA_HOST_STORAGE_DIR": temp_dir},
+            clear=False,
+        ):
+            client = TestClient(app)
+            page_ids = [
+                client.post(
+                    "/media",
+                    files=[("files", (f"{index}.png", self._png_bytes((index, 0, 0)), "image/png"))],
+                ).json()["page_id"]
+                for index in range(3)
+            ]
+
+            response = client.post("/api/pages/batch", json={"page_ids": [*page_ids, "missing", "../x"]})
+
+            self.assertEqual(response.status_code, 200)
+            payload = response.json()
+            self.assertEqual(sorted(payload["pages"]), sorted(page_ids))
+            self.assertEqual(payload["pages"][page_ids[0]], client.get(f"/api/pages/{page_ids[0]}").json())
+            self.assertEqual(payload["missing"], ["missing", "../x"])
+
+            too_many = client.post(
+                "/api/pages/batch",
+                json={"page_ids": [f"p{index}" for index in range(media_host.MAX_BATCH_PAGE_IDS + 1)]},
+            )
+            self.assertEqual(too_many.status_code, 422)
+
+    def test_upload_is_stored_without_leaving_partial_files(self):
+        payload = bytes(range(256)) * 12288
+        with tempfile.TemporaryDirectory() as temp_dir, patch.dict(
+            "os.environ",
+            {"MEDIA_HOST_STORAGE_DIR": temp_dir},
+            clear=False,
+        ):
+            client = TestClient(app)
+            response = client.post("/media", files=[("files", ("big.png", payload, "image/png"))])
+
+            self.assertEqual(response.status_code, 200)
+            page_dir = Path(temp_dir) / response.json()["page_id"]
+            self.assertEqual((page_dir / "1-big.png").read_bytes(), payload)
+            self.assertEqual(sorted(path.name for path in page_dir.iterdir()), ["1-big.png", "metadata.json"])
+
+    def test_rejects_file_over_size_limit_and_cleans_up(self):
+        with tempfile.TemporaryDirectory() as temp_dir, patch.dict(
+            "os.environ",
+            {"MEDIA_HOST_STORAGE_DIR": temp_dir, "MEDIA_HOST_MAX_FILE_MB": "0.01"},
+            clear=False,
+        ):
+            client = TestClient(app)
+            response = client.post(
+                "/media",
+                files=[
+                    ("files", ("small.png", self._png_bytes((255, 0, 0)), "image/png")),
+                    ("files", ("big.png", b"\0" * 20000, "image/png")),
+                ],
+            )
+
+            self.assertEqual(response.status_code, 413)
+            self.assertEqual(list(Path(temp_dir).iterdir()), [])
+
+    def test_rejects_request_over_size_limit(self):
+        body = b"\0" * 40000
+        with tempfile.TemporaryDirectory() as temp_dir, patch.dict(
+            "os.environ",
+            {"MEDIA_HOST_STORAGE_DIR": temp_dir, "MEDIA_HOST_MAX_REQUEST_MB": "0.02"},
+            clear=False,
+        ):
+            client = TestClient(app)
+            declared = client.post("/media", files=[("files", ("big.png", body, "image/png"))])
+            self.assertEqual(declared.status_code, 413)
+
+            boundary = "limit-boundary"
+            multipart = (
+                f"--{boundary}\r\n"
+                'Content-Disposition: form-data; name="files"; filename="big.png"\r\n'
+                "Content-Type: image/png\r\n\r\n"
+            ).encode() + body + f"\r\n--{boundary}--\r\n".encode()
+            chunked = client.post(
+                "/media",
+                content=iter([multipart[index:index + 4096] for index in range(0, len(multipart), 4096)]),
+                headers={"Content-Type": f"multipart/form-data; boundary={boundary}"},
+            )
+            self.assertEqual(chunked.status_code, 413)
+            self.assertEqual(list(Path(temp_dir).iterdir()), [])
+
+
+    def test_og_image_is_prerendered_and_served_with_validators(self):
+        with tempfile.TemporaryDirectory() as temp_dir, patch.dict(
+            "os.environ",
+            {"MEDIA_HOST_STORAGE_DIR": temp_dir},
+            clear=False,
+        ):
+            client = TestClient(app)
+            response = client.post(
+                "/media",
+                files=[("files", ("cat.png", self._png_bytes((255, 0, 0)), "image/png"))],
+            )
+            page_id = response.json()["page_id"]
+            og_path = Path(temp_dir) / page_id / "og.png"
+            self.assertTrue(og_path.exists())
+
+            with patch.object(media_host, "render_og_image", wraps=media_host.render_og_image) as render:
+                first = client.get(f"/og/{page_id}.png")
+                revalidated = client.get(f"/og/{page_id}.png", headers={"If-None-Match": first.headers["etag"]})
+
+            render.assert_not_called()
+            self.assertEqual(first.status_code, 200)
+            self.assertEqual(first.content, og_path.read_bytes())
+            self.assertEqual(first.headers["cache-control"], "public, max-age=31536000, immutable")
+            self.assertFalse(first.headers["etag"].startswith("W/"))
+            self.assertEqual(revalidated.status_code, 304)
+            self.assertEqual(revalidated.content, b"")
+
+    def test_missing_og_image_is_rendered_once_on_first_request(self):
+        with tempfile.TemporaryDirectory() as temp_dir, patch.dict(
+            "os.environ",
+            {"MEDIA_HOST_STORAGE_DIR": temp_dir},
+            clear=False,
+        ):
+            client = TestClient(app)
+            response = client.post(
+                "/media",
+                files=[("files", ("cat.png", self._png_bytes((255, 0, 0)), "image/png"))],
+            )
+            page_id = response.json()["page_id"]
+            og_path = Path(temp_dir) / page_id / "og.png"
+            og_path.unlink()
+
+            with (
+                patch.object(media_host, "_media_pool", media_host.MediaWorkPool(workers=0)),
+                patch.object(media_host, "render_og_image", wraps=media_host.render_og_image) as render,
+            ):
+                first = client.get(f"/og/{page_id}.png")
+                second = client.get(f"/og/{page_id}.png")
+
+            self.assertEqual(render.call_count, 1)
+            self.assertTrue(og_path.exists())
+            self.assertEqual(first.content, second.content)
+            self.assertEqual(first.headers["etag"], second.headers["etag"])
+
+    def test_og_image_rejects_page_ids_outside_storage(self):
+        with tempfile.TemporaryDirectory() as temp_dir, patch.dict(
+            "os.environ",
+            {"MEDIA_HOST_STORAGE_DIR": temp_dir},
+            clear=False,
+        ):
+            client = TestClient(app)
+
+            self.assertEqual(client.get("/og/...png").status_code, 404)
+
+
+    def test_video_posters_are_decoded_in_parallel_worker_processes(self):
+        pool = media_host.MediaWorkPool(workers=2, max_pending=4)
+        self.addCleanup(pool.shutdown)
+        with tempfile.TemporaryDirectory() as temp_dir, patch.dict(
+            "os.environ",
+            {"MEDIA_HOST_STORAGE_DIR": temp_dir},
+            clear=False,
+        ), patch.object(media_host, "_media_pool", pool):
+            client = TestClient(app)
+            response = client.post(
+                "/media",
+                files=[
+                    ("files", ("one.mp4", self._mp4_bytes((255, 0, 0)), "video/mp4")),
+                    ("files", ("two.mp4", self._mp4_bytes((0, 0, 255)), "video/mp4")),
+                ],
+            )
+
+            self.assertEqual(response.status_code, 200)
+            page_dir = Path(temp_dir) / response.json()["page_id"]
+            self.assertTrue((page_dir / "1-one.poster.png").exists())
+            self.assertTrue((page_dir / "2-two.poster.png").exists())
+            stats = client.get("/api/stats/media-workers").json()
+            self.assertEqual(stats["workers"], 2)
+            self.assertEqual(stats["max_running"], 2)
+            self.assertEqual(stats["submitted"], 3)
+            self.assertEqual(stats["completed"], 3)
+            self.assertEqual(stats["queue_depth"], 0)
+
+    def test_worker_pool_bounds_pending_jobs_and_reports_queue_depth(self):
+        pool = media_host.MediaWorkPool(workers=0, max_pending=1)
+        release = threading.Event()
+        observed = []
+
+        async def scenario():
+            first = asyncio.create_task(pool.run(release.wait, 5))
+            second = asyncio.create_task(pool.run(release.wait, 5))
+            await asyncio.sleep(0.05)
+            observed.append(pool.stats())
+            release.set()
+            await asyncio.gather(first, second)
+
+        asyncio.run(scenario())
+
+        self.assertEqual(observed[0]["running"], 1)
+        self.assertEqual(observed[0]["waiting"], 1)
+        self.assertEqual(observed[0]["queue_depth"], 1)
+        self.assertEqual(pool.stats()["completed"], 2)
+        self.assertEqual(pool.stats()["max_running"], 1)
+
+    def test_invalid_video_error_crosses_process_boundary(self):
+        pool = media_host.MediaWorkPool(workers=1)
+        self.addCleanup(pool.shutdown)
+        with tempfile.TemporaryDirectory() as temp_dir, patch.dict(
+            "os.environ",
+            {"MEDIA_HOST_STORAGE_DIR": temp_dir},
+            clear=False,
+        ), patch.object(media_host, "_media_pool", pool):
+            client = TestClient(app)
+            response = client.post("/media", files=[("files", ("bad.mp4", b"not a video", "video/mp4"))])
+
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(response.json()["detail"], "invalid video file")
+            self.assertEqual(list(Path(temp_dir).iterdir()), [])
+
 
 if __name__ == "__main__":
     unittest.main()
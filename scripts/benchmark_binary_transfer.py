@@ -0,0 +1,213 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import base64
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+from pathlib import Path
+import sys
+import threading
+import time
+import tracemalloc
+from typing import Any
+import urllib.request
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from ts_hook_server import _COLLECT_JOBS_SCRIPT, _START_JOB_SCRIPT, BrowserProxy, WorkerPage
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Compare base64 and binary media transfer through BrowserProxy.")
+    parser.add_argument("--sizes-mb", default="1,10,50", help="Comma-separated payload sizes in MB.")
+    parser.add_argument("--repeat", type=int, default=3, help="Round trips per size and mode.")
+    parser.add_argument(
+        "--browser-executable",
+        default=None,
+        help="Run against a real Chromium via Playwright instead of the in-process stand-in page.",
+    )
+    return parser.parse_args()
+
+
+class EchoHandler(BaseHTTPRequestHandler):
+    def do_POST(self):  # noqa: N802
+        body = self.rfile.read(int(self.headers.get("Content-Length", "0")))
+        self.send_response(200)
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):  # noqa: N802
+        body = b"<html></html>"
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args: Any) -> None:
+        return None
+
+
+class StandInRoute:
+    def __init__(self):
+        self.post_data: bytes | None = None
+
+    def continue_(self, headers: dict[str, str] | None = None, post_data: bytes | None = None) -> None:
+        self.post_data = post_data
+
+
+class StandInResponse:
+    def __init__(self, body: bytes):
+        self._body = body
+
+    def body(self) -> bytes:
+        return self._body
+
+
+class StandInRequest:
+    def __init__(self, headers: dict[str, str]):
+        self.headers = headers
+        self._response: StandInResponse | None = None
+
+    def response(self) -> StandInResponse | None:
+        return self._response
+
+
+class StandInPage:
+    def __init__(self, proxy: BrowserProxy):
+        self._proxy = proxy
+        self._lock = threading.Lock()
+        self._jobs: dict[str, dict[str, Any] | None] = {}
+
+    def evaluate(self, script: str, arg: Any) -> Any:
+        if script == _START_JOB_SCRIPT:
+            request = arg["request"]
+            # Playwright serializes evaluate arguments as JSON on the way to the page.
+            request = json.loads(json.dumps(request))
+            body = None
+            browser_request = None
+            if request["jobId"]:
+                browser_request = StandInRequest({"x-ts-proxy-job": request["jobId"]})
+                route = StandInRoute()
+                self._proxy._route_job_request(route, browser_request)
+                body = route.post_data
+            elif request["bodyBase64"] is not None:
+                body = base64.b64decode(request["bodyBase64"])
+            with self._lock:
+                self._jobs[arg["jobId"]] = None
+            threading.Thread(
+                target=self._run,
+                args=(arg["jobId"], request["url"], body, browser_request),
+                daemon=True,
+            ).start()
+            return True
+        if script == _COLLECT_JOBS_SCRIPT:
+            with self._lock:
+                finished = {job_id: self._jobs.pop(job_id) for job_id in arg if self._jobs.get(job_id) is not None}
+            return json.loads(json.dumps(finished))
+        raise RuntimeError("unsupported script")
+
+    def _run(self, job_id: str, url: str, body: bytes | None, browser_request: StandInRequest | None) -> None:
+        with urllib.request.urlopen(urllib.request.Request(url, data=body, method="POST")) as response:
+            content = response.read()
+            result: dict[str, Any] = {"status": response.status, "headers": {}}
+        if browser_request is not None:
+            browser_request._response = StandInResponse(content)
+            result["bodyFromNetwork"] = True
+        else:
+            result["bodyBase64"] = base64.b64encode(content).decode("ascii")
+        with self._lock:
+            self._jobs[job_id] = {"result": result}
+
+    def wait_for_load_state(self, state: str) -> None:
+        return None
+
+    def close(self) -> None:
+        return None
+
+
+class BenchmarkProxy(BrowserProxy):
+    def __init__(self, origin: str, binary_transfer: bool, browser_executable: str | None):
+        super().__init__(headless=True, page_pool_size=1)
+        self._origin = origin
+        self._binary_transfer = binary_transfer
+        self._browser_executable = browser_executable
+        self._playwright = None
+        self._browser = None
+
+    def _start(self):
+        if self._browser_executable:
+            from playwright.sync_api import sync_playwright
+
+            self._playwright = sync_playwright().start()
+            self._browser = self._playwright.chromium.launch(
+                executable_path=self._browser_executable,
+                args=["--no-sandbox"],
+            )
+            self._context = self._browser.new_context()
+            if self._binary_transfer:
+                self._context.route(f"{self._origin}/**", self._route_job_request)
+        self._worker_pages = [WorkerPage(page=self._new_worker_page())]
+
+    def _new_worker_page(self):
+        if self._browser is None:
+            return StandInPage(self)
+        page = self._context.new_page()
+        page.goto(f"{self._origin}/")
+        return page
+
+    def _prepare_fetch(self):
+        return None
+
+    def _close(self):
+        self._close_worker_pages("benchmark finished")
+        if self._browser is not None:
+            self._browser.close()
+            self._playwright.stop()
+
+
+async def run_once(proxy: BrowserProxy, url: str, payload: bytes, repeat: int) -> tuple[float, float]:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        response = await proxy.fetch_url("POST", url, payload, {"Content-Type": "application/octet-stream"})
+        if response["body"] != payload:
+            raise RuntimeError("echoed payload does not match")
+    elapsed = (time.perf_counter() - started) / repeat
+
+    tracemalloc.start()
+    await proxy.fetch_url("POST", url, payload, {"Content-Type": "application/octet-stream"})
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak / len(payload)
+
+
+async def main() -> None:
+    args = parse_args()
+    server = ThreadingHTTPServer(("127.0.0.1", 0), EchoHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    origin = f"http://127.0.0.1:{server.server_address[1]}"
+    mode = "chromium" if args.browser_executable else "stand-in page"
+    print(f"mode={mode} repeat={args.repeat}", flush=True)
+    try:
+        for size_mb in [int(size) for size in args.sizes_mb.split(",") if size.strip()]:
+            payload = bytes(range(256)) * (size_mb * 1024 * 1024 // 256)
+            for label, binary_transfer in (("base64", False), ("binary", True)):
+                proxy = await BenchmarkProxy(origin, binary_transfer, args.browser_executable).start()
+                try:
+                    elapsed, peak_ratio = await run_once(proxy, f"{origin}/upload", payload, args.repeat)
+                finally:
+                    await proxy.close()
+                print(
+                    f"size={size_mb:>3}MB transfer={label:<6} round_trip={elapsed * 1000:8.1f}ms "
+                    f"python_peak={peak_ratio:.2f}x payload",
+                    flush=True,
+                )
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,151 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+import sys
+import threading
+import time
+from types import SimpleNamespace
+from typing import Any
+from urllib.parse import parse_qs, urlsplit
+import urllib.request
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from ts_hook_server import _COLLECT_JOBS_SCRIPT, _START_JOB_SCRIPT, BrowserProxy
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Measure BrowserProxy throughput against a local stand-in server.")
+    parser.add_argument("--pool-sizes", default="1,2,4,8", help="Comma-separated page pool sizes to compare.")
+    parser.add_argument("--requests", type=int, default=64, help="Concurrent requests per run.")
+    parser.add_argument("--latency-ms", type=int, default=100, help="Stand-in server latency per request.")
+    parser.add_argument(
+        "--browser-executable",
+        default=None,
+        help="Run against a real Chromium via Playwright instead of the in-process stand-in page.",
+    )
+    return parser.parse_args()
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    def do_GET(self):  # noqa: N802
+        query = parse_qs(urlsplit(self.path).query)
+        time.sleep(int(query.get("latency_ms", ["0"])[0]) / 1000)
+        body = b'{"ok": true}'
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args: Any) -> None:
+        return None
+
+
+class StandInPage:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._jobs: dict[str, dict[str, Any] | None] = {}
+
+    def evaluate(self, script: str, arg: Any) -> Any:
+        if script == _START_JOB_SCRIPT:
+            with self._lock:
+                self._jobs[arg["jobId"]] = None
+            threading.Thread(target=self._run, args=(arg["jobId"], arg["request"]), daemon=True).start()
+            return True
+        if script == _COLLECT_JOBS_SCRIPT:
+            with self._lock:
+                finished = {job_id: self._jobs.pop(job_id) for job_id in arg if self._jobs.get(job_id) is not None}
+            return finished
+        raise RuntimeError("unsupported script")
+
+    def _run(self, job_id: str, request: dict[str, Any]) -> None:
+        with urllib.request.urlopen(request["url"]) as response:
+            outcome = {"result": {"status": response.status, "headers": {}, "bodyBase64": ""}}
+            response.read()
+        with self._lock:
+            self._jobs[job_id] = outcome
+
+    def wait_for_load_state(self, state: str) -> None:
+        return None
+
+    def close(self) -> None:
+        return None
+
+
+class BenchmarkProxy(BrowserProxy):
+    def __init__(self, pool_size: int, origin: str, browser_executable: str | None):
+        super().__init__(headless=True, page_pool_size=pool_size)
+        self._origin = origin
+        self._browser_executable = browser_executable
+        self._session_check_seconds = 0
+        self._stream_enabled = False
+        # The stand-in page runs fetches itself, so there is no browser request to route bytes through.
+        self._binary_transfer = self._binary_transfer and browser_executable is not None
+        self._playwright = None
+        self._browser = None
+
+    def _start(self):
+        if self._browser_executable:
+            from playwright.sync_api import sync_playwright
+
+            self._playwright = sync_playwright().start()
+            self._browser = self._playwright.chromium.launch(
+                executable_path=self._browser_executable,
+                args=["--no-sandbox"],
+            )
+            self._context = self._browser.new_context()
+            self._session = SimpleNamespace(context=self._context)
+        self._open_worker_pages()
+
+    def _new_worker_page(self):
+        if self._browser is None:
+            return StandInPage()
+        page = self._context.new_page()
+        page.goto(f"{self._origin}/")
+        return page
+
+    def _prepare_fetch(self):
+        return None
+
+    def _close(self):
+        self._close_worker_pages("benchmark finished")
+        if self._browser is not None:
+            self._browser.close()
+            self._playwright.stop()
+
+
+async def run_once(pool_size: int, origin: str, args: argparse.Namespace) -> float:
+    proxy = await BenchmarkProxy(pool_size, origin, args.browser_executable).start()
+    try:
+        url = f"{origin}/api/v1/alerts?latency_ms={args.latency_ms}"
+        started = time.perf_counter()
+        await asyncio.gather(*(proxy.fetch_url("GET", url) for _ in range(args.requests)))
+        return time.perf_counter() - started
+    finally:
+        await proxy.close()
+
+
+async def main() -> None:
+    args = parse_args()
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StandInHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    origin = f"http://127.0.0.1:{server.server_address[1]}"
+    mode = "chromium" if args.browser_executable else "stand-in page"
+    print(f"mode={mode} requests={args.requests} latency={args.latency_ms}ms", flush=True)
+    try:
+        for pool_size in [int(size) for size in args.pool_sizes.split(",") if size.strip()]:
+            elapsed = await run_once(pool_size, origin, args)
+            print(
+                f"pool_size={pool_size:<3} elapsed={elapsed:.3f}s throughput={args.requests / elapsed:.1f} req/s",
+                flush=True,
+            )
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,102 @@
+from __future__ import annotations
+
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+import statistics
+import sys
+from tempfile import TemporaryDirectory
+import threading
+import time
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from image_models._gpu_leases import GPULeaseManager
+from image_models._gpu_monitor import FakeGPUDeviceProvider, GPUMonitor
+from image_models._gpu_scheduler import GPUScheduler
+from image_models._sd_server import SDServerImageGenerator
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Measure GPU scheduling overhead against fake GPUs.")
+    parser.add_argument("--gpus", type=int, default=2, help="Number of fake GPUs.")
+    parser.add_argument("--workers", type=int, default=16, help="Concurrent requests competing for GPUs.")
+    parser.add_argument("--jobs", type=int, default=200, help="Total jobs to run.")
+    parser.add_argument("--hold-ms", type=float, default=20.0, help="How long each job holds its GPU.")
+    parser.add_argument("--models", default="sdxl,zimage_turbo,qwen_image_edit", help="Comma-separated models.")
+    return parser.parse_args()
+
+
+class ReopeningProvider:
+    def __init__(self, provider: FakeGPUDeviceProvider):
+        self._provider = provider
+        self.opens = 0
+
+    def __call__(self):
+        self.opens += 1
+        self._provider.open()
+        try:
+            return self._provider.sample()
+        finally:
+            self._provider.close()
+
+
+def run(mode: str, args: argparse.Namespace) -> None:
+    provider = FakeGPUDeviceProvider.idle(args.gpus)
+    models = [model for model in args.models.split(",") if model]
+    resident: dict[int, str] = {}
+    resident_lock = threading.Lock()
+    waits: list[float] = []
+    with TemporaryDirectory() as lease_dir:
+        leases = GPULeaseManager(lease_dir)
+        scheduler = GPUScheduler(threading.Condition(), leases, fairness_bound=3, poll_interval_seconds=1.0)
+        monitor = GPUMonitor(lambda: provider, interval_seconds=1.0)
+        monitor.add_listener(scheduler.notify)
+        reopening = ReopeningProvider(provider)
+        discover = monitor.snapshot if mode == "monitor" else reopening
+
+        def job(index: int) -> None:
+            model_name = models[index % len(models)]
+            started = time.perf_counter()
+            gpu_index = scheduler.acquire(
+                model_name,
+                discover=discover,
+                is_available=SDServerImageGenerator._is_gpu_available,
+                resident_models=lambda: dict(resident),
+                timeout=600.0,
+            )
+            waits.append(time.perf_counter() - started)
+            try:
+                with resident_lock:
+                    resident[gpu_index] = model_name
+                time.sleep(args.hold_ms / 1000)
+            finally:
+                scheduler.release(gpu_index)
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.workers) as executor:
+            list(executor.map(job, range(args.jobs)))
+        elapsed = time.perf_counter() - started
+        monitor.close()
+        leases.close()
+
+    swaps = sum(stats.swaps for stats in scheduler.stats().values())
+    ideal = args.jobs * args.hold_ms / 1000 / args.gpus
+    print(
+        f"mode={mode:<8} elapsed={elapsed:.2f}s ideal={ideal:.2f}s "
+        f"jobs/s={args.jobs / elapsed:.1f} median_wait={statistics.median(waits) * 1000:.1f}ms "
+        f"device_samples={provider.samples} device_opens={reopening.opens if mode != 'monitor' else 1} "
+        f"swaps={swaps}",
+        flush=True,
+    )
+
+
+def main() -> None:
+    args = parse_args()
+    print(f"gpus={args.gpus} workers={args.workers} jobs={args.jobs} hold={args.hold_ms}ms", flush=True)
+    for mode in ("per-call", "monitor"):
+        run(mode, args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+from pathlib import Path
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import httpx
+from PIL import Image
+
+SERVICE_DIR = Path(__file__).resolve().parents[1] / "media_host_service"
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Measure media host RSS while concurrent large uploads stream to disk.")
+    parser.add_argument("--upload-mb", type=int, default=50, help="Approximate size of each uploaded PNG in MB.")
+    parser.add_argument("--concurrency", type=int, default=8, help="Uploads in flight at once.")
+    parser.add_argument("--rounds", type=int, default=2, help="Number of concurrent upload waves.")
+    parser.add_argument("--sample-ms", type=int, default=20, help="RSS sampling interval.")
+    return parser.parse_args()
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def rss_mb(pid: int) -> float:
+    try:
+        with open(f"/proc/{pid}/status", encoding="ascii") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except FileNotFoundError:
+        pass
+    return 0.0
+
+
+def child_pids(pid: int) -> list[int]:
+    children: list[int] = []
+    for task in Path(f"/proc/{pid}/task").glob("*"):
+        try:
+            children.extend(int(child) for child in (task / "children").read_text().split())
+        except FileNotFoundError:
+            continue
+    return children
+
+
+class RSSSampler:
+    def __init__(self, pid: int, interval_seconds: float):
+        self._pid = pid
+        self._interval_seconds = interval_seconds
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self.peak_mb = 0.0
+        self.peak_workers_mb = 0.0
+
+    def __enter__(self) -> RSSSampler:
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self.peak_mb = max(self.peak_mb, rss_mb(self._pid))
+            self.peak_workers_mb = max(self.peak_workers_mb, sum(rss_mb(child) for child in child_pids(self._pid)))
+            self._stop.wait(self._interval_seconds)
+
+
+def write_payload(path: Path, size_mb: int) -> None:
+    side = int((size_mb * 1024 * 1024 / 3) ** 0.5)
+    noise = Image.frombytes("RGB", (side, side), os.urandom(side * side * 3))
+    noise.save(path, format="PNG", compress_level=0)
+
+
+async def wait_until_ready(client: httpx.AsyncClient) -> None:
+    for _ in range(200):
+        try:
+            await client.get("/api/pages/missing")
+            return
+        except httpx.TransportError:
+            await asyncio.sleep(0.05)
+    raise RuntimeError("media host did not start")
+
+
+async def upload(client: httpx.AsyncClient, payload_path: Path) -> None:
+    with payload_path.open("rb") as payload:
+        response = await client.post("/media", files=[("files", ("clip.png", payload, "image/png"))])
+    response.raise_for_status()
+
+
+async def run(args: argparse.Namespace, base_url: str, pid: int, payload_path: Path) -> None:
+    async with httpx.AsyncClient(base_url=base_url, timeout=300.0) as client:
+        await wait_until_ready(client)
+        baseline_mb = rss_mb(pid)
+        started = time.perf_counter()
+        with RSSSampler(pid, args.sample_ms / 1000) as sampler:
+            for _ in range(args.rounds):
+                await asyncio.gather(*(upload(client, payload_path) for _ in range(args.concurrency)))
+        elapsed = time.perf_counter() - started
+
+    payload_mb = payload_path.stat().st_size / (1024 * 1024)
+    uploaded_mb = payload_mb * args.concurrency * args.rounds
+    in_flight_mb = payload_mb * args.concurrency
+    print(f"uploads={args.concurrency * args.rounds} size={payload_mb:.1f}MB concurrency={args.concurrency}")
+    print(f"uploaded={uploaded_mb:.0f}MB elapsed={elapsed:.2f}s throughput={uploaded_mb / elapsed:.1f}MB/s")
+    print(
+        f"server rss baseline={baseline_mb:.1f}MB peak={sampler.peak_mb:.1f}MB "
+        f"growth={sampler.peak_mb - baseline_mb:.1f}MB (bytes in flight={in_flight_mb:.0f}MB)"
+    )
+    print(f"media worker processes peak rss={sampler.peak_workers_mb:.1f}MB")
+
+
+def main() -> None:
+    args = parse_args()
+    port = free_port()
+    with tempfile.TemporaryDirectory() as storage_dir, tempfile.TemporaryDirectory() as payload_dir:
+        payload_path = Path(payload_dir) / "payload.bin"
+        write_payload(payload_path, args.upload_mb)
+        server = subprocess.Popen(
+            [
+                sys.executable,
+                "-m",
+                "uvicorn",
+                "app:app",
+                "--app-dir",
+                str(SERVICE_DIR),
+                "--port",
+                str(port),
+                "--log-level",
+                "warning",
+            ],
+            env={**os.environ, "MEDIA_HOST_STORAGE_DIR": storage_dir},
+        )
+        try:
+            asyncio.run(run(args, f"http://127.0.0.1:{port}", server.pid, payload_path))
+        finally:
+            server.terminate()
+            server.wait(timeout=10)
+
+
+if __name__ == "__main__":
+    main()
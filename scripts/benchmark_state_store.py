@@ -0,0 +1,93 @@
+from __future__ import annotations
+
+import argparse
+from contextlib import contextmanager
+from pathlib import Path
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from typing import Iterator
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from sns_agent.state_store import StateStore
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Compare per-poll StateStore latency before and after batching.")
+    parser.add_argument("--stored", type=int, default=20000, help="Number of processed notification ids to preload.")
+    parser.add_argument("--batch", type=int, default=20, help="Notification ids checked per poll.")
+    parser.add_argument("--polls", type=int, default=200, help="Number of simulated polls.")
+    return parser.parse_args()
+
+
+class LegacyStateStore:
+    def __init__(self, db_path: Path):
+        self._db_path = db_path
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        conn = sqlite3.connect(self._db_path)
+        try:
+            yield conn
+            conn.commit()
+        finally:
+            conn.close()
+
+    def is_processed(self, notification_id: str) -> bool:
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT 1 FROM processed_notifications WHERE notification_id = ?",
+                (notification_id,),
+            ).fetchone()
+        return row is not None
+
+
+def _poll_ids(poll: int, stored: int, batch: int) -> list[str]:
+    newest = stored + poll
+    return [str(newest - offset) for offset in range(batch)]
+
+
+def _measure(label: str, poll_fn, polls: int) -> None:
+    samples: list[float] = []
+    for poll in range(polls):
+        started = time.perf_counter()
+        poll_fn(poll)
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    print(
+        f"{label:<28} median={statistics.median(samples):.3f}ms "
+        f"p95={samples[int(len(samples) * 0.95) - 1]:.3f}ms mean={statistics.fmean(samples):.3f}ms",
+        flush=True,
+    )
+
+
+def main() -> None:
+    args = parse_args()
+    with tempfile.TemporaryDirectory() as temp_dir:
+        db_path = Path(temp_dir) / "state.db"
+        store = StateStore(db_path)
+        with store._connect() as conn:
+            conn.executemany(
+                "INSERT INTO processed_notifications(notification_id) VALUES (?)",
+                ((str(index),) for index in range(args.stored)),
+            )
+        legacy = LegacyStateStore(db_path)
+        print(f"stored_ids={args.stored} batch={args.batch} polls={args.polls}", flush=True)
+        _measure(
+            "before: is_processed x N",
+            lambda poll: [legacy.is_processed(item) for item in _poll_ids(poll, args.stored, args.batch)],
+            args.polls,
+        )
+        _measure(
+            "after: filter_unprocessed",
+            lambda poll: store.filter_unprocessed(_poll_ids(poll, args.stored, args.batch)),
+            args.polls,
+        )
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -13,7 +13,7 @@ from dotenv import find_dotenv, load_dotenv
 
 sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
 
-from image_models._sd_server import SDServerImageGenerator
+from image_models._sd_server import SDServerImageGenerator, gpu_scheduler_stats
 from sns_agent.gpu_tasks import GPUTaskLimiter
 from sns_agent.media import ImageGenerator
 from sns_agent.schemas import ImageGenerationRequest
@@ -76,14 +76,14 @@ def _patch_sd_server_logging() -> tuple[Any, Any]:
     original_acquire = SDServerImageGenerator._acquire_gpu
     original_release = SDServerImageGenerator._release_gpu
 
-    def wrapped_acquire(self):
+    async def wrapped_acquire(self):
         request_id = REQUEST_ID.get()
         queued_at = time.monotonic()
         print(
             f"[{queued_at:.3f}] request={request_id} waiting_for_physical_gpu",
             flush=True,
         )
-        gpu_index = original_acquire(self)
+        gpu_index = await original_acquire(self)
         acquired_at = time.monotonic()
         print(
             f"[{acquired_at:.3f}] request={request_id} reserved_gpu={gpu_index} "
@@ -193,6 +193,12 @@ async def main() -> None:
                 f"filename={images[0].filename if images else 'n/a'}",
                 flush=True,
             )
+        for model_name, stats in gpu_scheduler_stats().items():
+            print(
+                f"  scheduler model={model_name} requests={stats.requests} swaps={stats.swaps} "
+                f"avg_wait={stats.average_wait_seconds:.3f}s max_wait={stats.max_wait_seconds:.3f}s",
+                flush=True,
+            )
     finally:
         await generator.aclose()
         _restore_sd_server_logging(original_acquire, original_release)
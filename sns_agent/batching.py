@@ -0,0 +1,93 @@
+from __future__ import annotations
+
+import asyncio
+from collections.abc import Awaitable, Callable, Hashable
+from dataclasses import dataclass, field
+from typing import Generic, TypeVar
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+@dataclass(slots=True)
+class PendingBatch(Generic[T, R]):
+    items: list[T] = field(default_factory=list)
+    futures: list[asyncio.Future[R]] = field(default_factory=list)
+    timer: asyncio.TimerHandle | None = None
+
+
+class MicroBatcher(Generic[T, R]):
+    def __init__(
+        self,
+        run_batch: Callable[[list[T]], Awaitable[list[R | BaseException]]],
+        *,
+        window_seconds: float,
+        max_batch_size: int,
+    ):
+        self._run_batch = run_batch
+        self._window_seconds = max(0.0, window_seconds)
+        self._max_batch_size = max(1, max_batch_size)
+        self._pending: dict[Hashable, PendingBatch[T, R]] = {}
+        self._running: set[asyncio.Task[None]] = set()
+
+    @property
+    def enabled(self) -> bool:
+        return self._window_seconds > 0 and self._max_batch_size > 1
+
+    async def submit(self, key: Hashable, item: T) -> R:
+        if not self.enabled:
+            result = (await self._run_batch([item]))[0]
+            if isinstance(result, BaseException):
+                raise result
+            return result
+
+        loop = asyncio.get_running_loop()
+        batch = self._pending.get(key)
+        if batch is None:
+            batch = PendingBatch()
+            batch.timer = loop.call_later(self._window_seconds, self._flush, key)
+            self._pending[key] = batch
+        future: asyncio.Future[R] = loop.create_future()
+        batch.items.append(item)
+        batch.futures.append(future)
+        if len(batch.items) >= self._max_batch_size:
+            self._flush(key)
+        return await future
+
+    async def aclose(self) -> None:
+        for key in list(self._pending):
+            self._flush(key)
+        if self._running:
+            await asyncio.gather(*self._running, return_exceptions=True)
+
+    def _flush(self, key: Hashable) -> None:
+        batch = self._pending.pop(key, None)
+        if batch is None:
+            return
+        if batch.timer is not None:
+            batch.timer.cancel()
+        task = asyncio.get_running_loop().create_task(self._dispatch(batch))
+        self._running.add(task)
+        task.add_done_callback(self._running.discard)
+
+    async def _dispatch(self, batch: PendingBatch[T, R]) -> None:
+        try:
+            results = await self._run_batch(batch.items)
+        except asyncio.CancelledError as exc:
+            self._resolve(batch, [exc] * len(batch.items))
+            raise
+        except Exception as exc:
+            results = [exc] * len(batch.items)
+        self._resolve(batch, results)
+
+    @staticmethod
+    def _resolve(batch: PendingBatch[T, R], results: list[R | BaseException]) -> None:
+        for future, result in zip(batch.futures, results):
+            if future.done():
+                continue
+            if isinstance(result, asyncio.CancelledError):
+                future.cancel()
+            elif isinstance(result, BaseException):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
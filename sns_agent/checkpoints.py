@@ -0,0 +1,208 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+import json
+import logging
+import os
+from pathlib import Path
+import re
+import shutil
+import tempfile
+import time
+from typing import Any
+
+from .schemas import AgentResponse, GeneratedImage, GeneratedVideo, UploadedMedia
+
+logger = logging.getLogger(__name__)
+
+_CHECKPOINT_FILENAME = "checkpoint.json"
+_UNSAFE_ID_RE = re.compile(r"[^A-Za-z0-9_-]")
+_SAFE_SUFFIX_RE = re.compile(r"\.[A-Za-z0-9]{1,8}")
+_DEFAULT_MAX_AGE_SECONDS = 7 * 24 * 60 * 60
+
+
+@dataclass(slots=True)
+class ResponseCheckpoint:
+    notification_id: str
+    response: AgentResponse
+    uploaded: UploadedMedia | None = None
+    status_id: str | None = None
+    created_at: float = 0.0
+
+    @property
+    def stage(self) -> str:
+        if self.status_id is not None:
+            return "published"
+        if self.uploaded is not None:
+            return "uploaded"
+        return "generated"
+
+
+class ResponseCheckpointStore:
+    def __init__(self, root: str | Path | None = None, *, max_age_seconds: float | None = None):
+        if root is None:
+            root = os.getenv("RESPONSE_CHECKPOINT_DIR", "response_checkpoints")
+        if max_age_seconds is None:
+            max_age_seconds = float(os.getenv("RESPONSE_CHECKPOINT_MAX_AGE_SECONDS", str(_DEFAULT_MAX_AGE_SECONDS)))
+        self._root = Path(root)
+        self._max_age_seconds = max(0.0, max_age_seconds)
+
+    @property
+    def root(self) -> Path:
+        return self._root
+
+    def load(self, notification_id: str) -> ResponseCheckpoint | None:
+        directory = self._directory(notification_id)
+        try:
+            payload = json.loads((directory / _CHECKPOINT_FILENAME).read_text(encoding="utf-8"))
+            return self._decode(notification_id, directory, payload)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError, TypeError) as exc:
+            logger.warning("discarding unreadable checkpoint notification_id=%s error=%s", notification_id, exc)
+            self.discard(notification_id)
+            return None
+
+    def save_response(self, notification_id: str, response: AgentResponse) -> ResponseCheckpoint:
+        directory = self._directory(notification_id)
+        if directory.exists():
+            shutil.rmtree(directory)
+        directory.mkdir(parents=True)
+        for index, image in enumerate(response.images, start=1):
+            self._write_atomic(directory / self._image_path(index, image), image.content)
+        if response.video is not None:
+            self._write_atomic(directory / self._video_path(response.video), response.video.content)
+        checkpoint = ResponseCheckpoint(notification_id=notification_id, response=response, created_at=time.time())
+        self._write_manifest(checkpoint)
+        return checkpoint
+
+    def save_uploaded(self, checkpoint: ResponseCheckpoint, uploaded: UploadedMedia) -> ResponseCheckpoint:
+        checkpoint.uploaded = uploaded
+        self._write_manifest(checkpoint)
+        return checkpoint
+
+    def save_published(self, checkpoint: ResponseCheckpoint, status_id: str) -> ResponseCheckpoint:
+        checkpoint.status_id = status_id
+        self._write_manifest(checkpoint)
+        return checkpoint
+
+    def discard(self, notification_id: str) -> None:
+        shutil.rmtree(self._directory(notification_id), ignore_errors=True)
+
+    def prune(self, now: float | None = None) -> int:
+        if not self._max_age_seconds or not self._root.is_dir():
+            return 0
+        now = time.time() if now is None else now
+        removed = 0
+        for directory in self._root.iterdir():
+            manifest = directory / _CHECKPOINT_FILENAME
+            try:
+                modified = manifest.stat().st_mtime if manifest.exists() else directory.stat().st_mtime
+            except OSError:
+                continue
+            if now - modified >= self._max_age_seconds:
+                shutil.rmtree(directory, ignore_errors=True)
+                removed += 1
+        return removed
+
+    def _directory(self, notification_id: str) -> Path:
+        return self._root / _UNSAFE_ID_RE.sub("_", notification_id)
+
+    def _write_manifest(self, checkpoint: ResponseCheckpoint) -> None:
+        response = checkpoint.response
+        payload: dict[str, Any] = {
+            "created_at": checkpoint.created_at,
+            "text": response.text,
+            "mentions": response.mentions,
+            "images": [
+                {
+                    "path": self._image_path(index, image),
+                    "mime_type": image.mime_type,
+                    "filename": image.filename,
+                    "source": image.source,
+                }
+                for index, image in enumerate(response.images, start=1)
+            ],
+            "video": None,
+            "uploaded": None,
+            "status_id": checkpoint.status_id,
+        }
+        if response.video is not None:
+            payload["video"] = {
+                "path": self._video_path(response.video),
+                "mime_type": response.video.mime_type,
+                "filename": response.video.filename,
+                "source": response.video.source,
+            }
+        if checkpoint.uploaded is not None:
+            payload["uploaded"] = {
+                "media_ids": checkpoint.uploaded.media_ids,
+                "hosted_media_url": checkpoint.uploaded.hosted_media_url,
+            }
+        encoded = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self._write_atomic(self._directory(checkpoint.notification_id) / _CHECKPOINT_FILENAME, encoded)
+
+    @staticmethod
+    def _decode(notification_id: str, directory: Path, payload: dict[str, Any]) -> ResponseCheckpoint:
+        images = [
+            GeneratedImage(
+                content=(directory / item["path"]).read_bytes(),
+                mime_type=item["mime_type"],
+                filename=item["filename"],
+                source=item["source"],
+            )
+            for item in payload["images"]
+        ]
+        video = None
+        if payload.get("video"):
+            item = payload["video"]
+            video = GeneratedVideo(
+                content=(directory / item["path"]).read_bytes(),
+                mime_type=item["mime_type"],
+                filename=item["filename"],
+                source=item["source"],
+            )
+        uploaded = None
+        if payload.get("uploaded"):
+            uploaded = UploadedMedia(
+                media_ids=[str(media_id) for media_id in payload["uploaded"]["media_ids"]],
+                hosted_media_url=payload["uploaded"]["hosted_media_url"],
+            )
+        return ResponseCheckpoint(
+            notification_id=notification_id,
+            response=AgentResponse(
+                text=payload["text"],
+                mentions=list(payload["mentions"]),
+                images=images,
+                video=video,
+            ),
+            uploaded=uploaded,
+            status_id=payload.get("status_id"),
+            created_at=float(payload.get("created_at") or 0.0),
+        )
+
+    @classmethod
+    def _image_path(cls, index: int, image: GeneratedImage) -> str:
+        return f"image-{index}{cls._suffix(image.filename)}"
+
+    @classmethod
+    def _video_path(cls, video: GeneratedVideo) -> str:
+        return f"video{cls._suffix(video.filename)}"
+
+    @staticmethod
+    def _suffix(filename: str) -> str:
+        suffix = Path(filename).suffix
+        return suffix if _SAFE_SUFFIX_RE.fullmatch(suffix) else ".bin"
+
+    @staticmethod
+    def _write_atomic(path: Path, content: bytes) -> None:
+        fd, temp_name = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.")
+        try:
+            with os.fdopen(fd, "wb") as handle:
+                handle.write(content)
+                handle.flush()
+                os.fsync(handle.fileno())
+            os.replace(temp_name, path)
+        except BaseException:
+            Path(temp_name).unlink(missing_ok=True)
+            raise
@@ -0,0 +1,59 @@
+from __future__ import annotations
+
+import asyncio
+from collections.abc import AsyncIterator, Callable
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, replace
+import time
+
+CONVERSATION_LANE = "conversation"
+GPU_MEDIA_LANE = "gpu_media"
+API_MEDIA_LANE = "api_media"
+
+
+@dataclass(slots=True)
+class LaneStats:
+    max_concurrency: int
+    active: int = 0
+    queued: int = 0
+    admitted: int = 0
+    total_wait_seconds: float = 0.0
+    max_wait_seconds: float = 0.0
+
+    @property
+    def average_wait_seconds(self) -> float:
+        return self.total_wait_seconds / self.admitted if self.admitted else 0.0
+
+
+class AdmissionLane:
+    def __init__(self, name: str, max_concurrency: int, *, clock: Callable[[], float] = time.monotonic):
+        self._name = name
+        self._clock = clock
+        self._semaphore = asyncio.Semaphore(max(1, max_concurrency))
+        self._stats = LaneStats(max_concurrency=max(1, max_concurrency))
+
+    @property
+    def name(self) -> str:
+        return self._name
+
+    @asynccontextmanager
+    async def admit(self) -> AsyncIterator[float]:
+        queued_at = self._clock()
+        self._stats.queued += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self._stats.queued -= 1
+        waited = max(0.0, self._clock() - queued_at)
+        self._stats.admitted += 1
+        self._stats.total_wait_seconds += waited
+        self._stats.max_wait_seconds = max(self._stats.max_wait_seconds, waited)
+        self._stats.active += 1
+        try:
+            yield waited
+        finally:
+            self._stats.active -= 1
+            self._semaphore.release()
+
+    def stats(self) -> LaneStats:
+        return replace(self._stats)
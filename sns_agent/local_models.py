@@ -0,0 +1,206 @@
+from __future__ import annotations
+
+import asyncio
+from collections.abc import AsyncIterator, Awaitable, Callable
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+import inspect
+import logging
+import os
+from pathlib import Path
+import time
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+_DEFAULT_MAX_RESIDENT = 2
+_DEFAULT_IDLE_TTL_SECONDS = 600.0
+_REAPER_INTERVAL_SECONDS = 30.0
+
+
+@dataclass(slots=True)
+class ResidentModel:
+    name: str
+    path: Path
+    mtime_ns: int
+    module: Any
+    last_used: float
+    vram_bytes: int = 0
+    active: int = 0
+    broken: bool = False
+
+
+class LocalModelRegistry:
+    def __init__(
+        self,
+        *,
+        load: Callable[[str, Path], Any],
+        teardown: Callable[[Any], Awaitable[None]],
+        max_resident: int | None = None,
+        vram_budget_bytes: int | None = None,
+        idle_ttl_seconds: float | None = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        if max_resident is None:
+            max_resident = int(os.getenv("LOCAL_MODEL_MAX_RESIDENT", str(_DEFAULT_MAX_RESIDENT)))
+        if vram_budget_bytes is None:
+            vram_budget_bytes = int(float(os.getenv("LOCAL_MODEL_VRAM_BUDGET_MB", "0")) * 1024 * 1024)
+        if idle_ttl_seconds is None:
+            idle_ttl_seconds = float(os.getenv("LOCAL_MODEL_IDLE_TTL_SECONDS", str(_DEFAULT_IDLE_TTL_SECONDS)))
+        self._load = load
+        self._teardown = teardown
+        self._max_resident = max(0, max_resident)
+        self._vram_budget_bytes = max(0, vram_budget_bytes)
+        self._idle_ttl_seconds = max(0.0, idle_ttl_seconds)
+        self._clock = clock
+        self._lock = asyncio.Lock()
+        self._models: dict[str, ResidentModel] = {}
+        self._reaper: asyncio.Task[None] | None = None
+
+    def resident_models(self) -> list[str]:
+        return sorted(self._models, key=lambda name: self._models[name].last_used)
+
+    def resident_vram_bytes(self) -> int:
+        return sum(model.vram_bytes for model in self._models.values())
+
+    def peek(self, model_name: str) -> Any | None:
+        resident = self._models.get(model_name)
+        if resident is None or resident.broken:
+            return None
+        return resident.module
+
+    @asynccontextmanager
+    async def acquire(self, model_name: str, module_path: Path) -> AsyncIterator[Any]:
+        resident = await self._checkout(model_name, module_path)
+        try:
+            yield resident.module
+        except Exception:
+            # Generation errors (bad requests, GPU wait timeouts) leave the module usable;
+            # only unload when the module itself reports it is no longer healthy.
+            resident.broken = not await self._is_healthy(resident.module)
+            raise
+        finally:
+            await self._checkin(resident)
+
+    async def evict_idle(self, now: float | None = None) -> int:
+        now = self._clock() if now is None else now
+        async with self._lock:
+            expired = [
+                model
+                for model in self._models.values()
+                if model.active == 0 and now - model.last_used >= self._idle_ttl_seconds
+            ]
+            for model in expired:
+                await self._evict(model, reason="idle")
+        return len(expired)
+
+    async def close(self) -> None:
+        if self._reaper is not None:
+            self._reaper.cancel()
+            await asyncio.gather(self._reaper, return_exceptions=True)
+            self._reaper = None
+        async with self._lock:
+            for model in list(self._models.values()):
+                await self._evict(model, reason="shutdown")
+
+    async def _checkout(self, model_name: str, module_path: Path) -> ResidentModel:
+        mtime_ns = module_path.stat().st_mtime_ns
+        async with self._lock:
+            resident = self._models.get(model_name)
+            if resident is not None and resident.active == 0 and (
+                resident.broken or resident.path != module_path or resident.mtime_ns != mtime_ns
+            ):
+                await self._evict(resident, reason="stale")
+                resident = None
+            if resident is None:
+                await self._make_room(exclude=model_name, incoming=1)
+                resident = ResidentModel(
+                    name=model_name,
+                    path=module_path,
+                    mtime_ns=mtime_ns,
+                    module=self._load(model_name, module_path),
+                    last_used=self._clock(),
+                )
+                self._models[model_name] = resident
+            resident.active += 1
+            return resident
+
+    async def _checkin(self, resident: ResidentModel) -> None:
+        async with self._lock:
+            resident.active -= 1
+            resident.last_used = self._clock()
+            if self._models.get(resident.name) is not resident:
+                return
+            resident.vram_bytes = max(resident.vram_bytes, await self._measure_vram(resident.module))
+            if resident.active == 0 and (resident.broken or self._idle_ttl_seconds <= 0 or self._max_resident == 0):
+                await self._evict(resident, reason="broken" if resident.broken else "disabled")
+                return
+            await self._make_room(exclude=None, incoming=0)
+        self._ensure_reaper()
+
+    async def _make_room(self, *, exclude: str | None, incoming: int) -> None:
+        while self._over_capacity(incoming):
+            candidates = [
+                model for model in self._models.values() if model.active == 0 and model.name != exclude
+            ]
+            if not candidates:
+                return
+            await self._evict(min(candidates, key=lambda model: model.last_used), reason="pressure")
+
+    def _over_capacity(self, incoming: int) -> bool:
+        if self._max_resident and len(self._models) + incoming > self._max_resident:
+            return True
+        return bool(self._vram_budget_bytes) and self.resident_vram_bytes() > self._vram_budget_bytes
+
+    async def _evict(self, resident: ResidentModel, *, reason: str) -> None:
+        if self._models.get(resident.name) is resident:
+            del self._models[resident.name]
+        logger.info(
+            "unloading local image model=%s reason=%s vram_mb=%.0f",
+            resident.name,
+            reason,
+            resident.vram_bytes / (1024 * 1024),
+        )
+        try:
+            await self._teardown(resident.module)
+        except Exception as exc:
+            logger.warning("local image model cleanup failed model=%s error=%s", resident.name, exc)
+
+    @staticmethod
+    async def _is_healthy(module: Any) -> bool:
+        probe = getattr(module, "healthy", None)
+        if probe is None:
+            return True
+        try:
+            if inspect.iscoroutinefunction(probe):
+                return bool(await probe())
+            return bool(await asyncio.to_thread(probe))
+        except Exception:
+            return False
+
+    @staticmethod
+    async def _measure_vram(module: Any) -> int:
+        probe = getattr(module, "vram_bytes", None)
+        if probe is None:
+            return 0
+        try:
+            if inspect.iscoroutinefunction(probe):
+                value = await probe()
+            else:
+                value = await asyncio.to_thread(probe)
+        except Exception:
+            return 0
+        return max(0, int(value or 0))
+
+    def _ensure_reaper(self) -> None:
+        if self._idle_ttl_seconds <= 0 or not self._models:
+            return
+        if self._reaper is not None and not self._reaper.done():
+            return
+        self._reaper = asyncio.create_task(self._reap_forever(), name="local-model-reaper")
+
+    async def _reap_forever(self) -> None:
+        interval = min(_REAPER_INTERVAL_SECONDS, self._idle_ttl_seconds)
+        while self._models:
+            await asyncio.sleep(interval)
+            await self.evict_idle()
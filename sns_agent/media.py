@@ -17,7 +17,9 @@ from openai import APIConnectionError, APIStatusError, APITimeoutError, AsyncOpe
 
 from image_models import coerce_generated_images
 
+from .batching import MicroBatcher
 from .gpu_tasks import GPUTaskLimiter
+from .local_models import LocalModelRegistry
 from .schemas import GeneratedImage, GeneratedVideo, ImageGenerationRequest, VideoGenerationRequest
 
 logger = logging.getLogger(__name__)
@@ -39,6 +41,15 @@ class ImageGenerator:
         self._http_client = httpx.AsyncClient(timeout=120.0)
         self._openai_client = self._build_openai_client()
         self._gpu_task_limiter = gpu_task_limiter
+        self._local_models = LocalModelRegistry(
+            load=self._load_local_model_module,
+            teardown=self._teardown_local_model_module,
+        )
+        self._local_batcher: MicroBatcher[ImageGenerationRequest, list[GeneratedImage]] = MicroBatcher(
+            self._run_local_batch,
+            window_seconds=float(os.getenv("LOCAL_IMAGE_BATCH_WINDOW_MS", "50")) / 1000,
+            max_batch_size=int(os.getenv("LOCAL_IMAGE_BATCH_MAX_REQUESTS", "4")),
+        )
         self._api_retry_max_retries = max(0, int(os.getenv("IMAGE_API_MAX_RETRIES", "3")))
         self._api_retry_base_seconds = max(0.0, float(os.getenv("IMAGE_API_RETRY_BASE_SECONDS", "1.0")))
         self._api_retry_max_seconds = max(
@@ -46,7 +57,13 @@ class ImageGenerator:
             float(os.getenv("IMAGE_API_RETRY_MAX_SECONDS", "8.0")),
         )
 
+    @property
+    def runs_on_gpu(self) -> bool:
+        return self._backend == "stable-diffusion-cpp"
+
     async def aclose(self) -> None:
+        await self._local_batcher.aclose()
+        await self._local_models.close()
         await self._http_client.aclose()
         if self._openai_client is not None:
             maybe_awaitable = self._openai_client.close()
@@ -192,19 +209,96 @@ class ImageGenerator:
     async def _generate_with_local_model_module(self, request: ImageGenerationRequest) -> list[GeneratedImage]:
         model_name = self._resolve_local_model_name(request.model)
         module_path = self._resolve_local_model_module_path(model_name)
-        module = self._load_local_model_module(model_name, module_path)
-        try:
+        async with self._local_models.acquire(model_name, module_path) as module:
             generated = await self._invoke_local_model_generate(module, request, model_name)
-            if not generated:
-                raise RuntimeError(f"local image model '{model_name}' produced no images")
-            return generated[:4]
-        finally:
-            await self._teardown_local_model_module(module)
+        if not generated:
+            raise RuntimeError(f"local image model '{model_name}' produced no images")
+        return generated[:4]
 
-    async def _generate_with_local_backend(self, request: ImageGenerationRequest) -> list[GeneratedImage]:
+    async def _generate_local_batch(
+        self,
+        requests: list[ImageGenerationRequest],
+    ) -> list[list[GeneratedImage] | BaseException]:
+        if len(requests) == 1:
+            try:
+                return [await self._generate_with_local_model_module(requests[0])]
+            except Exception as exc:
+                return [exc]
+        model_name = self._resolve_local_model_name(requests[0].model)
+        module_path = self._resolve_local_model_module_path(model_name)
+        async with self._local_models.acquire(model_name, module_path) as module:
+            generate_batch = getattr(module, "generate_batch", None)
+            if generate_batch is None:
+                raw_results = [await self._try_local_model_generate(module, request, model_name) for request in requests]
+            elif inspect.iscoroutinefunction(generate_batch):
+                raw_results = await generate_batch(requests)
+            else:
+                raw_results = await asyncio.to_thread(generate_batch, requests)
+        logger.info("local image batch model=%s requests=%d", model_name, len(requests))
+        return [self._finish_local_batch_item(result, model_name) for result in raw_results]
+
+    async def _try_local_model_generate(
+        self,
+        module: Any,
+        request: ImageGenerationRequest,
+        model_name: str,
+    ) -> list[GeneratedImage] | BaseException:
+        try:
+            return await self._invoke_local_model_generate(module, request, model_name)
+        except Exception as exc:
+            return exc
+
+    @staticmethod
+    def _finish_local_batch_item(result: Any, model_name: str) -> list[GeneratedImage] | BaseException:
+        if isinstance(result, BaseException):
+            return result
+        try:
+            generated = coerce_generated_images(result, source=model_name, filename_prefix=model_name)
+        except TypeError as exc:
+            return RuntimeError(f"local image model '{model_name}' returned invalid images: {exc}")
+        if not generated:
+            return RuntimeError(f"local image model '{model_name}' produced no images")
+        return generated[:4]
+
+    async def _run_local_batch(
+        self,
+        requests: list[ImageGenerationRequest],
+    ) -> list[list[GeneratedImage] | BaseException]:
         if self._gpu_task_limiter is None:
-            return await self._generate_with_local_model_module(request)
-        return await self._gpu_task_limiter.run(lambda: self._generate_with_local_model_module(request))
+            return await self._generate_local_batch(requests)
+        return await self._gpu_task_limiter.run(lambda: self._generate_local_batch(requests))
+
+    async def _generate_with_local_backend(self, request: ImageGenerationRequest) -> list[GeneratedImage]:
+        model_name = self._resolve_local_model_name(request.model)
+        if self._has_spare_local_gpus(model_name):
+            [result] = await self._run_local_batch([request])
+            if isinstance(result, BaseException):
+                raise result
+            return result
+        return await self._local_batcher.submit(self._local_batch_key(model_name, request), request)
+
+    def _has_spare_local_gpus(self, model_name: str) -> bool:
+        # Waiting for batch partners only pays off when requests would otherwise queue for the same GPU.
+        probe = getattr(self._local_models.peek(model_name), "idle_gpu_count", None)
+        if probe is None:
+            return False
+        try:
+            return probe() > 1
+        except Exception:
+            return False
+
+    @staticmethod
+    def _local_batch_key(model_name: str, request: ImageGenerationRequest) -> tuple[object, ...]:
+        if request.reference_images:
+            return ("unbatched", id(request))
+        return (
+            model_name,
+            request.size,
+            request.steps,
+            request.cfg_scale,
+            request.sampler,
+            request.flow_shift,
+        )
 
     def _resolve_api_model_name(self, requested_model: str | None) -> str:
         return self._resolve_model_name(requested_model, backend_label="api")
@@ -0,0 +1,76 @@
+from __future__ import annotations
+
+from collections.abc import Callable
+import os
+import time
+
+from .proxy_client import RateLimitState
+
+_DEFAULT_POLL_SECONDS = 20.0
+_DEFAULT_MIN_POLL_SECONDS = 5.0
+_DEFAULT_MAX_POLL_SECONDS = 120.0
+_DEFAULT_BACKOFF_FACTOR = 2.0
+_DEFAULT_RATE_LIMIT_RESERVE = 10
+
+
+class AdaptivePollInterval:
+    def __init__(
+        self,
+        *,
+        initial_seconds: float | None = None,
+        min_seconds: float | None = None,
+        max_seconds: float | None = None,
+        backoff_factor: float | None = None,
+        rate_limit_reserve: int | None = None,
+        clock: Callable[[], float] = time.time,
+    ):
+        if initial_seconds is None:
+            initial_seconds = float(os.getenv("NOTIFICATION_POLL_SECONDS", str(_DEFAULT_POLL_SECONDS)))
+        if min_seconds is None:
+            min_seconds = float(os.getenv("NOTIFICATION_POLL_MIN_SECONDS", str(_DEFAULT_MIN_POLL_SECONDS)))
+        if max_seconds is None:
+            max_seconds = float(os.getenv("NOTIFICATION_POLL_MAX_SECONDS", str(_DEFAULT_MAX_POLL_SECONDS)))
+        if backoff_factor is None:
+            backoff_factor = float(os.getenv("NOTIFICATION_POLL_BACKOFF_FACTOR", str(_DEFAULT_BACKOFF_FACTOR)))
+        if rate_limit_reserve is None:
+            rate_limit_reserve = int(
+                os.getenv("NOTIFICATION_POLL_RATE_LIMIT_RESERVE", str(_DEFAULT_RATE_LIMIT_RESERVE))
+            )
+        self._min_seconds = max(0.0, min_seconds)
+        self._max_seconds = max(self._min_seconds, max_seconds)
+        self._backoff_factor = max(1.0, backoff_factor)
+        self._rate_limit_reserve = max(0, rate_limit_reserve)
+        self._clock = clock
+        self._interval = self._clamp(initial_seconds)
+
+    @property
+    def interval_seconds(self) -> float:
+        return self._interval
+
+    def after_poll(self, new_items: int, rate_limit: RateLimitState | None = None) -> float:
+        if new_items > 0:
+            self._interval = self._min_seconds
+        else:
+            self._interval = self._clamp(self._interval * self._backoff_factor)
+        return self._honor_rate_limit(self._interval, rate_limit)
+
+    def after_error(self, rate_limit: RateLimitState | None = None) -> float:
+        self._interval = self._clamp(max(self._interval, self._min_seconds) * self._backoff_factor)
+        return self._honor_rate_limit(self._interval, rate_limit)
+
+    def _honor_rate_limit(self, delay: float, rate_limit: RateLimitState | None) -> float:
+        if rate_limit is None:
+            return delay
+        now = self._clock()
+        if rate_limit.retry_after_until is not None:
+            delay = max(delay, rate_limit.retry_after_until - now)
+        if (
+            rate_limit.remaining is not None
+            and rate_limit.remaining <= self._rate_limit_reserve
+            and rate_limit.reset_at is not None
+        ):
+            delay = max(delay, rate_limit.reset_at - now)
+        return delay
+
+    def _clamp(self, seconds: float) -> float:
+        return min(self._max_seconds, max(self._min_seconds, seconds))
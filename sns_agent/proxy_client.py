@@ -1,13 +1,31 @@
 from __future__ import annotations
 
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, replace
+from datetime import datetime
+from email.utils import parsedate_to_datetime
+import time
 from typing import Any
 
 import httpx
 
 
+@dataclass(slots=True)
+class RateLimitState:
+    remaining: int | None = None
+    reset_at: float | None = None
+    retry_after_until: float | None = None
+
+
 class ProxyHttpClient:
     def __init__(self, base_url: str, timeout: float = 60.0):
         self._client = httpx.AsyncClient(base_url=base_url.rstrip("/"), timeout=timeout)
+        self._rate_limit = RateLimitState()
+
+    @property
+    def rate_limit(self) -> RateLimitState:
+        return replace(self._rate_limit)
 
     async def aclose(self) -> None:
         await self._client.aclose()
@@ -32,9 +50,17 @@ class ProxyHttpClient:
             content=content,
             files=files,
         )
+        self._observe_rate_limit(response)
         response.raise_for_status()
         return response
 
+    @asynccontextmanager
+    async def stream_lines(self, path: str) -> AsyncIterator[AsyncIterator[str]]:
+        async with self._client.stream("GET", path, headers={"Accept": "text/event-stream"}) as response:
+            self._observe_rate_limit(response)
+            response.raise_for_status()
+            yield response.aiter_lines()
+
     async def request_json(self, method: str, target_url: str, **kwargs: Any) -> Any:
         response = await self.request(method, target_url, **kwargs)
         if not response.content:
@@ -48,3 +74,45 @@ class ProxyHttpClient:
     async def request_bytes(self, method: str, target_url: str, **kwargs: Any) -> bytes:
         response = await self.request(method, target_url, **kwargs)
         return response.content
+
+    def _observe_rate_limit(self, response: httpx.Response, now: float | None = None) -> None:
+        now = time.time() if now is None else now
+        remaining = response.headers.get("x-ratelimit-remaining")
+        if remaining is not None:
+            try:
+                self._rate_limit.remaining = int(float(remaining))
+            except ValueError:
+                pass
+        reset_at = _parse_reset(response.headers.get("x-ratelimit-reset"), now)
+        if reset_at is not None:
+            self._rate_limit.reset_at = reset_at
+        if response.status_code == 429:
+            retry_after = _parse_retry_after(response.headers.get("retry-after"), now)
+            self._rate_limit.retry_after_until = retry_after or self._rate_limit.reset_at
+
+
+def _parse_retry_after(value: str | None, now: float) -> float | None:
+    if not value:
+        return None
+    try:
+        return now + max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError):
+        return None
+
+
+def _parse_reset(value: str | None, now: float) -> float | None:
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()
+    except ValueError:
+        pass
+    try:
+        number = float(value)
+    except ValueError:
+        return None
+    return number if number > 1_000_000_000 else now + number
@@ -1,11 +1,12 @@
 from __future__ import annotations
 
+from collections.abc import Awaitable, Callable
 import logging
 import os
 import re
 
 from .media_host import MediaHostClient
-from .schemas import AgentResponse, NormalizedPost, PublishResult
+from .schemas import AgentResponse, NormalizedPost, PublishResult, UploadedMedia
 from .truthsocial import TruthSocialClient
 
 MENTION_RE = re.compile(r"@([A-Za-z0-9_.-]+)")
@@ -41,25 +42,38 @@ class Publisher:
             status = status[: self._char_limit - 1].rstrip() + "…"
         return status
 
-    async def publish(self, response: AgentResponse, target_post: NormalizedPost) -> PublishResult:
-        response.validate()
-        media_ids: list[str] = []
-        hosted_media_url: str | None = None
+    async def upload_media(self, response: AgentResponse) -> UploadedMedia:
+        uploaded = UploadedMedia()
         if response.images and self._media_host.enabled:
             hosted_page = await self._media_host.create_page(response.images)
-            hosted_media_url = hosted_page.public_url
+            uploaded.hosted_media_url = hosted_page.public_url
         else:
             for image in response.images:
-                uploaded = await self._social.upload_media(image.filename, image.content, image.mime_type)
-                media_ids.append(uploaded.media_id)
+                media = await self._social.upload_media(image.filename, image.content, image.mime_type)
+                uploaded.media_ids.append(media.media_id)
         if response.video is not None:
-            uploaded = await self._social.upload_media(
+            media = await self._social.upload_media(
                 response.video.filename,
                 response.video.content,
                 response.video.mime_type,
             )
-            media_ids.append(uploaded.media_id)
-        status_text = self.build_status_text(response, target_post, hosted_media_url=hosted_media_url)
+            uploaded.media_ids.append(media.media_id)
+        return uploaded
+
+    async def publish(
+        self,
+        response: AgentResponse,
+        target_post: NormalizedPost,
+        *,
+        uploaded: UploadedMedia | None = None,
+        on_media_uploaded: Callable[[UploadedMedia], Awaitable[None]] | None = None,
+    ) -> PublishResult:
+        response.validate()
+        if uploaded is None:
+            uploaded = await self.upload_media(response)
+            if on_media_uploaded is not None:
+                await on_media_uploaded(uploaded)
+        status_text = self.build_status_text(response, target_post, hosted_media_url=uploaded.hosted_media_url)
         logger.info(
             "sending message in_reply_to_id=%s text=%r images=%d video=%s",
             target_post.post_id,
@@ -70,5 +84,5 @@ class Publisher:
         return await self._social.publish_reply(
             text=status_text,
             in_reply_to_id=target_post.post_id,
-            media_ids=media_ids,
+            media_ids=list(uploaded.media_ids),
         )
@@ -124,6 +124,12 @@ class HostedMediaPage:
     public_url: str
 
 
+@dataclass(slots=True)
+class UploadedMedia:
+    media_ids: list[str] = field(default_factory=list)
+    hosted_media_url: str | None = None
+
+
 @dataclass(slots=True)
 class CommandEnvelope:
     name: str
@@ -1,30 +1,32 @@
 from __future__ import annotations
 
 import asyncio
-from dataclasses import dataclass
 import inspect
+import json
 import logging
 import os
+import secrets
+import socket
 import time
 
+from .checkpoints import ResponseCheckpoint, ResponseCheckpointStore
 from .commands import CommandParseError, parse_command, to_image_request, to_video_request
 from .gpu_tasks import GPUTaskLimiter
+from .lanes import API_MEDIA_LANE, CONVERSATION_LANE, GPU_MEDIA_LANE, AdmissionLane, LaneStats
 from .media import ImageGenerator, VideoGenerator
+from .normalizer import normalize_status
+from .polling import AdaptivePollInterval
 from .proxy_client import ProxyHttpClient
 from .publisher import Publisher
 from .responder import LLMResponder
-from .schemas import AgentResponse, NotificationItem, NormalizedPost, ReferenceImage
-from .state_store import StateStore
-from .truthsocial import TruthSocialClient
+from .schemas import AgentResponse, CommandEnvelope, NotificationItem, NormalizedPost, ReferenceImage, UploadedMedia
+from .state_store import QueuedNotification, StateStore
+from .truthsocial import TruthSocialClient, notification_sort_key
 
 logger = logging.getLogger(__name__)
 
-
-@dataclass(slots=True)
-class NotificationRetryState:
-    failures: int = 0
-    next_attempt_at: float = 0.0
-    exhausted: bool = False
+NOTIFICATION_CURSOR = "notifications"
+NOTIFICATION_GAPS_CURSOR = "notification_gaps"
 
 
 class AgentService:
@@ -32,18 +34,41 @@ class AgentService:
         proxy_base_url = os.getenv("TS_HOOK_SERVER_BASE_URL", "http://127.0.0.1:8000")
         self._proxy = ProxyHttpClient(proxy_base_url)
         self._state = StateStore(os.getenv("STATE_DB_PATH", "history.db"))
+        self._checkpoints = ResponseCheckpointStore()
+        self._checkpoints.prune()
         self._social = TruthSocialClient(self._proxy)
         self._publisher = Publisher(self._social)
-        self._notification_semaphore = asyncio.Semaphore(int(os.getenv("NOTIFICATION_MAX_CONCURRENCY", "8")))
-        self._notification_lock = asyncio.Lock()
-        self._inflight_notification_ids: set[str] = set()
+        self._lanes = {
+            CONVERSATION_LANE: AdmissionLane(
+                CONVERSATION_LANE,
+                int(os.getenv("CONVERSATION_LANE_MAX_CONCURRENCY") or os.getenv("NOTIFICATION_MAX_CONCURRENCY", "8")),
+            ),
+            GPU_MEDIA_LANE: AdmissionLane(GPU_MEDIA_LANE, int(os.getenv("GPU_MEDIA_LANE_MAX_CONCURRENCY", "4"))),
+            API_MEDIA_LANE: AdmissionLane(API_MEDIA_LANE, int(os.getenv("API_MEDIA_LANE_MAX_CONCURRENCY", "4"))),
+        }
+        self._worker_id = os.getenv("AGENT_WORKER_ID") or f"{socket.gethostname()}:{os.getpid()}:{secrets.token_hex(4)}"
+        self._lease_seconds = max(1.0, float(os.getenv("NOTIFICATION_LEASE_SECONDS", "300")))
+        self._dispatch_lock = asyncio.Lock()
+        self._dispatch_task: asyncio.Task[None] | None = None
+        self._dispatch_requested = False
+        self._dispatch_wakeup: asyncio.TimerHandle | None = None
+        self._closing = False
+        self._inflight_lanes: dict[str, str] = {}
         self._notification_tasks: set[asyncio.Task[None]] = set()
-        self._notification_retry_states: dict[str, NotificationRetryState] = {}
         self._gpu_task_limiter = GPUTaskLimiter(int(os.getenv("GPU_TASK_MAX_CONCURRENCY", "1")))
         self._image_generator = ImageGenerator(gpu_task_limiter=self._gpu_task_limiter)
         self._video_generator = VideoGenerator()
         self._responder = LLMResponder(self._image_generator, self._video_generator)
-        self._poll_seconds = float(os.getenv("NOTIFICATION_POLL_SECONDS", "20"))
+        self._poll_interval = AdaptivePollInterval()
+        self._stream_path = os.getenv("NOTIFICATION_STREAM_PATH", "/stream/notifications").strip()
+        self._stream_retry_seconds = max(0.1, float(os.getenv("NOTIFICATION_STREAM_RETRY_SECONDS", "5")))
+        self._stream_retry_max_seconds = max(
+            self._stream_retry_seconds,
+            float(os.getenv("NOTIFICATION_STREAM_RETRY_MAX_SECONDS", "120")),
+        )
+        self._reconcile_seconds = max(0.0, float(os.getenv("NOTIFICATION_RECONCILE_SECONDS", "300")))
+        self._stream_connected = False
+        self._poll_wakeup = asyncio.Event()
         self._notification_failure_max_retries = max(0, int(os.getenv("NOTIFICATION_FAILURE_MAX_RETRIES", "4")))
         self._notification_retry_base_seconds = max(
             0.0,
@@ -55,15 +80,21 @@ class AgentService:
         )
 
     async def aclose(self) -> None:
+        self._closing = True
+        if self._dispatch_wakeup is not None:
+            self._dispatch_wakeup.cancel()
+            self._dispatch_wakeup = None
+        dispatch_task, self._dispatch_task = self._dispatch_task, None
+        if dispatch_task is not None:
+            dispatch_task.cancel()
+            await asyncio.gather(dispatch_task, return_exceptions=True)
         tasks = list(self._notification_tasks)
         for task in tasks:
             task.cancel()
         if tasks:
             await asyncio.gather(*tasks, return_exceptions=True)
         self._notification_tasks.clear()
-        async with self._notification_lock:
-            self._inflight_notification_ids.clear()
-            self._notification_retry_states.clear()
+        self._inflight_lanes.clear()
         await self._image_generator.aclose()
         await self._video_generator.aclose()
         await self._responder.aclose()
@@ -73,108 +104,324 @@ class AgentService:
             if inspect.isawaitable(result):
                 await result
         await self._proxy.aclose()
+        self._state.close()
+
+    def lane_stats(self) -> dict[str, LaneStats]:
+        return {name: lane.stats() for name, lane in self._lanes.items()}
+
+    def queue_stats(self) -> dict[str, int]:
+        return self._state.notification_queue_counts()
 
     async def run_forever(self) -> None:
-        while True:
+        stream_task = None
+        if self._stream_path:
+            stream_task = asyncio.create_task(self.consume_notification_stream(), name="notification-stream")
+        try:
+            while True:
+                self._poll_wakeup.clear()
+                try:
+                    new_items = await self.poll_once()
+                except Exception as exc:
+                    logger.exception("poll failed: %s", exc)
+                    delay = self._poll_interval.after_error(self._proxy.rate_limit)
+                else:
+                    delay = self._poll_interval.after_poll(new_items, self._proxy.rate_limit)
+                if self._stream_connected:
+                    delay = max(delay, self._reconcile_seconds)
+                logger.debug("next notification poll in %.1fs", delay)
+                try:
+                    await asyncio.wait_for(self._poll_wakeup.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            if stream_task is not None:
+                stream_task.cancel()
+                await asyncio.gather(stream_task, return_exceptions=True)
+
+    async def consume_notification_stream(self) -> None:
+        failures = 0
+        while not self._closing:
             try:
-                await self.poll_once()
+                async with self._social.stream_notifications(self._stream_path) as notifications:
+                    self._set_stream_connected(True)
+                    failures = 0
+                    async for notification in notifications:
+                        if await self._ingest_notifications([notification]):
+                            await self._dispatch_queued_notifications()
+                logger.warning("notification stream ended; polling until it reconnects")
+            except asyncio.CancelledError:
+                raise
             except Exception as exc:
-                logger.exception("poll failed: %s", exc)
-            await asyncio.sleep(self._poll_seconds)
-
-    async def poll_once(self) -> None:
-        notifications = await self._social.fetch_notifications()
-        for notification in notifications:
-            if self._state.is_processed(notification.notification_id):
-                continue
-            if self._is_notification_backing_off(notification.notification_id):
-                continue
-            await self._spawn_notification_task(notification)
-
-    async def _spawn_notification_task(self, notification: NotificationItem) -> None:
-        async with self._notification_lock:
-            if notification.notification_id in self._inflight_notification_ids:
+                logger.warning("notification stream failed; polling until it reconnects: %s", exc)
+            finally:
+                self._set_stream_connected(False)
+            failures += 1
+            await asyncio.sleep(
+                min(self._stream_retry_max_seconds, self._stream_retry_seconds * 2 ** min(failures - 1, 10))
+            )
+
+    def _set_stream_connected(self, connected: bool) -> None:
+        if connected == self._stream_connected:
+            return
+        self._stream_connected = connected
+        logger.info("notification stream %s", "connected" if connected else "disconnected")
+        self._poll_wakeup.set()
+
+    async def poll_once(self) -> int:
+        since_id = await asyncio.to_thread(self._state.get_cursor, NOTIFICATION_CURSOR)
+        notifications, resume_max_id = await self._social.fetch_notification_range(since_id=since_id)
+        stored_gaps = await self._notification_gaps()
+        gaps = list(stored_gaps)
+        if since_id is not None and resume_max_id is not None:
+            gaps.append((since_id, resume_max_id))
+        notifications = [*notifications, *await self._backfill_notification_gap(gaps)]
+        enqueued = await self._ingest_notifications(notifications)
+        if gaps != stored_gaps:
+            await asyncio.to_thread(self._state.set_cursor, NOTIFICATION_GAPS_CURSOR, json.dumps(gaps))
+        await self._advance_notification_cursor(since_id, notifications)
+        await self._dispatch_queued_notifications()
+        return enqueued
+
+    async def _notification_gaps(self) -> list[tuple[str, str]]:
+        raw = await asyncio.to_thread(self._state.get_cursor, NOTIFICATION_GAPS_CURSOR)
+        return [(str(since_id), str(max_id)) for since_id, max_id in json.loads(raw)] if raw else []
+
+    async def _backfill_notification_gap(self, gaps: list[tuple[str, str]]) -> list[NotificationItem]:
+        # Paging stopped at NOTIFICATION_MAX_PAGES before reaching the old cursor; fill one gap per poll.
+        if not gaps:
+            return []
+        since_id, max_id = gaps[0]
+        try:
+            notifications, resume_max_id = await self._social.fetch_notification_range(since_id=since_id, max_id=max_id)
+        except Exception as exc:
+            logger.warning("notification gap backfill failed since_id=%s max_id=%s error=%s", since_id, max_id, exc)
+            return []
+        if resume_max_id is None:
+            del gaps[0]
+        else:
+            gaps[0] = (since_id, resume_max_id)
+        return notifications
+
+    async def _ingest_notifications(self, notifications: list[NotificationItem]) -> int:
+        unprocessed_ids = set(
+            await asyncio.to_thread(
+                self._state.filter_unprocessed,
+                [notification.notification_id for notification in notifications],
+            )
+        )
+        pending = [
+            (notification.notification_id, notification.post_id, self._classify_notification(notification))
+            for notification in notifications
+            if notification.notification_id in unprocessed_ids
+        ]
+        if not pending:
+            return 0
+        return await asyncio.to_thread(self._state.enqueue_notifications, pending)
+
+    async def _advance_notification_cursor(self, since_id: str | None, notifications: list[NotificationItem]) -> None:
+        if not notifications:
+            return
+        newest = max((notification.notification_id for notification in notifications), key=notification_sort_key)
+        if since_id is None or notification_sort_key(newest) > notification_sort_key(since_id):
+            await asyncio.to_thread(self._state.set_cursor, NOTIFICATION_CURSOR, newest)
+
+    async def _dispatch_queued_notifications(self) -> None:
+        async with self._dispatch_lock:
+            if self._closing:
                 return
-            self._inflight_notification_ids.add(notification.notification_id)
+            self._dispatch_requested = False
+            for name in self._lanes:
+                leased = await asyncio.to_thread(
+                    self._state.lease_notifications,
+                    self._worker_id,
+                    limit=self._lane_capacity(name),
+                    lease_seconds=self._lease_seconds,
+                    lane=name,
+                )
+                for item in leased:
+                    self._spawn_notification_task(item)
+            # Backoff retries and other workers' expired leases become due without any new notification arriving.
+            self._schedule_dispatch_wakeup(
+                await asyncio.to_thread(self._state.next_notification_due, self._worker_id)
+            )
+
+    def _lane_capacity(self, name: str) -> int:
+        inflight = sum(1 for lane in self._inflight_lanes.values() if lane == name)
+        return self._lanes[name].stats().max_concurrency - inflight
+
+    def _classify_notification(self, notification: NotificationItem) -> str:
+        # Lease per lane so queued GPU work cannot hold every slot; the handler re-checks after fetching.
+        status = notification.payload.get("status") if isinstance(notification.payload, dict) else None
+        if not isinstance(status, dict):
+            return CONVERSATION_LANE
+        try:
+            command = parse_command(normalize_status(status).command_text)
+        except Exception:
+            return CONVERSATION_LANE
+        return self._notification_lane(command)
+
+    def _request_dispatch(self) -> None:
+        if self._closing:
+            return
+        if self._dispatch_task is not None and not self._dispatch_task.done():
+            # A lane may free up after the running pass has already leased for it.
+            self._dispatch_requested = True
+            return
+        self._dispatch_task = asyncio.create_task(self._dispatch_queued_notifications(), name="notification-dispatch")
+        self._dispatch_task.add_done_callback(self._redispatch_if_requested)
+
+    def _redispatch_if_requested(self, task: asyncio.Task[None]) -> None:
+        if self._dispatch_requested and not task.cancelled():
+            self._request_dispatch()
+
+    def _schedule_dispatch_wakeup(self, due: float | None) -> None:
+        if due is None or self._closing:
+            return
+        loop = asyncio.get_running_loop()
+        when = loop.time() + max(0.0, due - time.time())
+        if self._dispatch_wakeup is not None:
+            if self._dispatch_wakeup.when() <= when:
+                return
+            self._dispatch_wakeup.cancel()
+        self._dispatch_wakeup = loop.call_at(when, self._wake_dispatch)
+
+    def _wake_dispatch(self) -> None:
+        self._dispatch_wakeup = None
+        self._request_dispatch()
+
+    def _spawn_notification_task(self, item: QueuedNotification) -> None:
+        if item.notification_id in self._inflight_lanes:
+            return
+        self._inflight_lanes[item.notification_id] = item.lane
         task = asyncio.create_task(
-            self._run_notification_task(notification.notification_id, notification.post_id),
-            name=f"notification:{notification.notification_id}",
+            self._run_notification_task(item.notification_id, item.post_id, attempts=item.attempts),
+            name=f"notification:{item.notification_id}",
         )
         self._notification_tasks.add(task)
         task.add_done_callback(self._notification_tasks.discard)
 
-    async def _run_notification_task(self, notification_id: str, post_id: str) -> None:
+    async def _run_notification_task(self, notification_id: str, post_id: str, *, attempts: int = 1) -> None:
+        task = asyncio.current_task()
+        heartbeat = asyncio.create_task(self._heartbeat_lease(notification_id, task), name=f"lease:{notification_id}")
         try:
-            async with self._notification_semaphore:
-                await self._handle_notification(notification_id, post_id)
-            await self._clear_notification_retry_state(notification_id)
+            await self._handle_notification(notification_id, post_id)
+            await asyncio.to_thread(self._state.complete_notification, notification_id, self._worker_id)
         except asyncio.CancelledError:
+            await asyncio.to_thread(self._state.release_notification, notification_id, self._worker_id)
             raise
-        except Exception:
-            await self._record_notification_failure(notification_id)
+        except Exception as exc:
+            await self._record_notification_failure(notification_id, attempts, exc)
             logger.exception("notification %s failed", notification_id)
         finally:
-            async with self._notification_lock:
-                self._inflight_notification_ids.discard(notification_id)
+            heartbeat.cancel()
+            lane = self._inflight_lanes.get(notification_id)
+            was_full = lane is not None and self._lane_capacity(lane) <= 0
+            self._inflight_lanes.pop(notification_id, None)
+            if was_full:
+                self._request_dispatch()
+
+    async def _heartbeat_lease(self, notification_id: str, task: asyncio.Task[None] | None) -> None:
+        while True:
+            await asyncio.sleep(self._lease_seconds / 3)
+            renewed = await asyncio.to_thread(
+                self._state.heartbeat_notification,
+                notification_id,
+                self._worker_id,
+                lease_seconds=self._lease_seconds,
+            )
+            if not renewed:
+                logger.warning("notification %s lease was lost; abandoning this attempt", notification_id)
+                if task is not None:
+                    task.cancel()
+                return
 
     async def _handle_notification(self, notification_id: str, post_id: str) -> None:
         target_post = await self._social.fetch_status(post_id)
-        chain = await self._social.fetch_ancestor_chain(target_post)
-        logger.info(
-            "received prompt notification_id=%s post_id=%s author=@%s prompt=%r",
-            notification_id,
-            post_id,
-            target_post.author_handle,
-            target_post.command_text or target_post.llm_text,
+        command = parse_command(target_post.command_text)
+        lane = self._lanes[self._notification_lane(command)]
+        async with lane.admit() as waited:
+            chain = await self._social.fetch_ancestor_chain(target_post)
+            logger.info(
+                "received prompt notification_id=%s post_id=%s author=@%s lane=%s lane_wait=%.2fs prompt=%r",
+                notification_id,
+                post_id,
+                target_post.author_handle,
+                lane.name,
+                waited,
+                target_post.command_text or target_post.llm_text,
+            )
+
+            try:
+                checkpoint = await asyncio.to_thread(self._checkpoints.load, notification_id)
+                if checkpoint is None:
+                    if command is not None:
+                        response = await self._handle_command(command, target_post, chain)
+                    else:
+                        response = await self._responder.respond(chain, target_post)
+                    checkpoint = await asyncio.to_thread(self._checkpoints.save_response, notification_id, response)
+                else:
+                    logger.info(
+                        "resuming notification_id=%s from checkpoint stage=%s",
+                        notification_id,
+                        checkpoint.stage,
+                    )
+                await self._publish_checkpoint(checkpoint, target_post)
+                await asyncio.to_thread(self._state.mark_processed, notification_id)
+                await asyncio.to_thread(self._checkpoints.discard, notification_id)
+            except CommandParseError as exc:
+                error_response = AgentResponse(text=f"/{target_post.command_text.splitlines()[0].lstrip('/')} の解析に失敗しました: {exc}")
+                await self._publisher.publish(error_response, target_post)
+                await asyncio.to_thread(self._state.mark_processed, notification_id)
+            except Exception:
+                raise
+
+    async def _publish_checkpoint(self, checkpoint: ResponseCheckpoint, target_post: NormalizedPost) -> None:
+        if checkpoint.status_id is not None:
+            return
+
+        async def record_uploaded(uploaded: UploadedMedia) -> None:
+            await asyncio.to_thread(self._checkpoints.save_uploaded, checkpoint, uploaded)
+
+        result = await self._publisher.publish(
+            checkpoint.response,
+            target_post,
+            uploaded=checkpoint.uploaded,
+            on_media_uploaded=record_uploaded,
         )
+        await asyncio.to_thread(self._checkpoints.save_published, checkpoint, str(result.status_id))
 
-        try:
-            command = parse_command(target_post.command_text)
-            if command is not None:
-                response = await self._handle_command(command, target_post, chain)
-            else:
-                response = await self._responder.respond(chain, target_post)
-            await self._publisher.publish(response, target_post)
-            self._state.mark_processed(notification_id)
-        except CommandParseError as exc:
-            error_response = AgentResponse(text=f"/{target_post.command_text.splitlines()[0].lstrip('/')} の解析に失敗しました: {exc}")
-            await self._publisher.publish(error_response, target_post)
-            self._state.mark_processed(notification_id)
-        except Exception:
-            raise
+    def _notification_lane(self, command: CommandEnvelope | None) -> str:
+        if command is None:
+            return CONVERSATION_LANE
+        if command.name in {"image_gen", "image_edit"} and self._image_generator.runs_on_gpu:
+            return GPU_MEDIA_LANE
+        return API_MEDIA_LANE
 
-    def _is_notification_backing_off(self, notification_id: str) -> bool:
-        state = self._notification_retry_states.get(notification_id)
-        if state is None:
-            return False
-        if state.exhausted:
-            return True
-        return state.next_attempt_at > time.monotonic()
-
-    async def _clear_notification_retry_state(self, notification_id: str) -> None:
-        async with self._notification_lock:
-            self._notification_retry_states.pop(notification_id, None)
-
-    async def _record_notification_failure(self, notification_id: str) -> None:
-        async with self._notification_lock:
-            state = self._notification_retry_states.setdefault(notification_id, NotificationRetryState())
-            state.failures += 1
-            if state.failures > self._notification_failure_max_retries:
-                state.exhausted = True
-                logger.error(
-                    "notification %s exhausted retries failures=%d",
-                    notification_id,
-                    state.failures,
-                )
-                return
-            delay = self._notification_backoff_delay(state.failures - 1)
-            state.next_attempt_at = time.monotonic() + delay
+    async def _record_notification_failure(self, notification_id: str, attempts: int, exc: Exception) -> None:
+        retry_at: float | None = None
+        if attempts > self._notification_failure_max_retries:
+            logger.error(
+                "notification %s exhausted retries failures=%d",
+                notification_id,
+                attempts,
+            )
+        else:
+            delay = self._notification_backoff_delay(attempts - 1)
+            retry_at = time.time() + delay
             logger.warning(
                 "notification %s backing off failures=%d retry_in=%.2fs",
                 notification_id,
-                state.failures,
+                attempts,
                 delay,
             )
+        await asyncio.to_thread(
+            self._state.fail_notification,
+            notification_id,
+            self._worker_id,
+            retry_at=retry_at,
+            error=str(exc) or type(exc).__name__,
+        )
+        self._schedule_dispatch_wakeup(retry_at)
 
     def _notification_backoff_delay(self, attempt: int) -> float:
         return min(self._notification_retry_max_seconds, self._notification_retry_base_seconds * (2 ** attempt))
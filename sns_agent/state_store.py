@@ -1,24 +1,60 @@
 from __future__ import annotations
 
 import sqlite3
+import threading
+import time
+from collections.abc import Iterable
 from contextlib import contextmanager
+from dataclasses import dataclass
 from pathlib import Path
 from typing import Iterator
 
+from .lanes import CONVERSATION_LANE
+
+_SQLITE_MAX_VARIABLES = 900
+_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-8000",
+    "PRAGMA busy_timeout=5000",
+)
+
+
+@dataclass(slots=True)
+class QueuedNotification:
+    notification_id: str
+    post_id: str
+    attempts: int
+    lane: str = CONVERSATION_LANE
+
 
 class StateStore:
     def __init__(self, db_path: str | Path):
         self._db_path = Path(db_path)
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(self._db_path, check_same_thread=False)
+        for pragma in _PRAGMAS:
+            self._conn.execute(pragma)
         self._initialize()
 
     @contextmanager
     def _connect(self) -> Iterator[sqlite3.Connection]:
-        conn = sqlite3.connect(self._db_path)
-        try:
-            yield conn
-            conn.commit()
-        finally:
-            conn.close()
+        with self._lock:
+            if self._conn is None:
+                raise RuntimeError("state store is closed")
+            try:
+                yield self._conn
+                self._conn.commit()
+            except BaseException:
+                self._conn.rollback()
+                raise
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
 
     def _initialize(self) -> None:
         with self._connect() as conn:
@@ -30,6 +66,42 @@ class StateStore:
                 )
                 """
             )
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS cursors (
+                    name TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    updated_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+                )
+                """
+            )
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS notification_queue (
+                    notification_id TEXT PRIMARY KEY,
+                    post_id TEXT NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    available_at REAL NOT NULL,
+                    lease_owner TEXT,
+                    lease_expires_at REAL,
+                    heartbeat_at REAL,
+                    last_error TEXT,
+                    enqueued_at REAL NOT NULL,
+                    updated_at REAL NOT NULL,
+                    lane TEXT NOT NULL DEFAULT 'conversation'
+                )
+                """
+            )
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(notification_queue)")}
+            if "lane" not in columns:
+                conn.execute("ALTER TABLE notification_queue ADD COLUMN lane TEXT NOT NULL DEFAULT 'conversation'")
+            conn.execute(
+                """
+                CREATE INDEX IF NOT EXISTS notification_queue_ready
+                ON notification_queue(status, available_at)
+                """
+            )
 
     def is_processed(self, notification_id: str) -> bool:
         with self._connect() as conn:
@@ -39,6 +111,20 @@ class StateStore:
             ).fetchone()
         return row is not None
 
+    def filter_unprocessed(self, notification_ids: Iterable[str]) -> list[str]:
+        candidates = list(dict.fromkeys(notification_ids))
+        processed: set[str] = set()
+        with self._connect() as conn:
+            for start in range(0, len(candidates), _SQLITE_MAX_VARIABLES):
+                chunk = candidates[start:start + _SQLITE_MAX_VARIABLES]
+                placeholders = ", ".join("?" for _ in chunk)
+                rows = conn.execute(
+                    f"SELECT notification_id FROM processed_notifications WHERE notification_id IN ({placeholders})",
+                    chunk,
+                ).fetchall()
+                processed.update(row[0] for row in rows)
+        return [notification_id for notification_id in candidates if notification_id not in processed]
+
     def mark_processed(self, notification_id: str) -> None:
         with self._connect() as conn:
             conn.execute(
@@ -48,3 +134,173 @@ class StateStore:
                 """,
                 (notification_id,),
             )
+
+    def get_cursor(self, name: str) -> str | None:
+        with self._connect() as conn:
+            row = conn.execute("SELECT value FROM cursors WHERE name = ?", (name,)).fetchone()
+        return row[0] if row is not None else None
+
+    def set_cursor(self, name: str, value: str) -> None:
+        with self._connect() as conn:
+            conn.execute(
+                """
+                INSERT OR REPLACE INTO cursors(name, value, updated_at)
+                VALUES (?, ?, CURRENT_TIMESTAMP)
+                """,
+                (name, value),
+            )
+
+    def enqueue_notifications(
+        self,
+        items: Iterable[tuple[str, str] | tuple[str, str, str]],
+        now: float | None = None,
+    ) -> int:
+        now = time.time() if now is None else now
+        rows = [
+            (notification_id, post_id, lane[0] if lane else CONVERSATION_LANE, now, now, now)
+            for notification_id, post_id, *lane in items
+        ]
+        with self._connect() as conn:
+            before = conn.total_changes
+            conn.executemany(
+                """
+                INSERT OR IGNORE INTO notification_queue(notification_id, post_id, lane, available_at, enqueued_at, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+                """,
+                rows,
+            )
+            return conn.total_changes - before
+
+    def lease_notifications(
+        self,
+        owner: str,
+        *,
+        limit: int,
+        lease_seconds: float,
+        lane: str | None = None,
+        now: float | None = None,
+    ) -> list[QueuedNotification]:
+        if limit <= 0:
+            return []
+        now = time.time() if now is None else now
+        with self._connect() as conn:
+            rows = conn.execute(
+                """
+                UPDATE notification_queue
+                SET status = 'leased',
+                    lease_owner = ?,
+                    lease_expires_at = ?,
+                    heartbeat_at = ?,
+                    attempts = attempts + 1,
+                    updated_at = ?
+                WHERE notification_id IN (
+                    SELECT notification_id FROM notification_queue
+                    WHERE ((status = 'pending' AND available_at <= ?)
+                       OR (status = 'leased' AND lease_expires_at <= ?))
+                      AND (? IS NULL OR lane = ?)
+                    ORDER BY available_at, length(notification_id), notification_id
+                    LIMIT ?
+                )
+                RETURNING notification_id, post_id, attempts, lane
+                """,
+                (owner, now + lease_seconds, now, now, now, now, lane, lane, limit),
+            ).fetchall()
+        leased = [
+            QueuedNotification(notification_id=row[0], post_id=row[1], attempts=row[2], lane=row[3]) for row in rows
+        ]
+        return sorted(leased, key=lambda item: (len(item.notification_id), item.notification_id))
+
+    def heartbeat_notification(
+        self,
+        notification_id: str,
+        owner: str,
+        *,
+        lease_seconds: float,
+        now: float | None = None,
+    ) -> bool:
+        now = time.time() if now is None else now
+        with self._connect() as conn:
+            cursor = conn.execute(
+                """
+                UPDATE notification_queue
+                SET lease_expires_at = ?, heartbeat_at = ?, updated_at = ?
+                WHERE notification_id = ? AND status = 'leased' AND lease_owner = ?
+                """,
+                (now + lease_seconds, now, now, notification_id, owner),
+            )
+            return cursor.rowcount == 1
+
+    def complete_notification(self, notification_id: str, owner: str, now: float | None = None) -> bool:
+        now = time.time() if now is None else now
+        with self._connect() as conn:
+            cursor = conn.execute(
+                """
+                UPDATE notification_queue
+                SET status = 'done', lease_owner = NULL, lease_expires_at = NULL, last_error = NULL, updated_at = ?
+                WHERE notification_id = ? AND lease_owner = ?
+                """,
+                (now, notification_id, owner),
+            )
+            conn.execute(
+                "INSERT OR REPLACE INTO processed_notifications(notification_id) VALUES (?)",
+                (notification_id,),
+            )
+            return cursor.rowcount == 1
+
+    def fail_notification(
+        self,
+        notification_id: str,
+        owner: str,
+        *,
+        retry_at: float | None,
+        error: str,
+        now: float | None = None,
+    ) -> bool:
+        now = time.time() if now is None else now
+        with self._connect() as conn:
+            cursor = conn.execute(
+                """
+                UPDATE notification_queue
+                SET status = ?, available_at = COALESCE(?, available_at), lease_owner = NULL,
+                    lease_expires_at = NULL, last_error = ?, updated_at = ?
+                WHERE notification_id = ? AND status = 'leased' AND lease_owner = ?
+                """,
+                ("dead" if retry_at is None else "pending", retry_at, error, now, notification_id, owner),
+            )
+            return cursor.rowcount == 1
+
+    def release_notification(self, notification_id: str, owner: str, now: float | None = None) -> bool:
+        now = time.time() if now is None else now
+        with self._connect() as conn:
+            cursor = conn.execute(
+                """
+                UPDATE notification_queue
+                SET status = 'pending', attempts = MAX(0, attempts - 1), available_at = ?,
+                    lease_owner = NULL, lease_expires_at = NULL, updated_at = ?
+                WHERE notification_id = ? AND status = 'leased' AND lease_owner = ?
+                """,
+                (now, now, notification_id, owner),
+            )
+            return cursor.rowcount == 1
+
+    def next_notification_due(self, owner: str, now: float | None = None) -> float | None:
+        now = time.time() if now is None else now
+        with self._connect() as conn:
+            row = conn.execute(
+                """
+                SELECT MIN(due) FROM (
+                    SELECT MIN(available_at) AS due FROM notification_queue
+                    WHERE status = 'pending' AND available_at > ?
+                    UNION ALL
+                    SELECT MIN(lease_expires_at) FROM notification_queue
+                    WHERE status = 'leased' AND lease_owner != ? AND lease_expires_at > ?
+                )
+                """,
+                (now, owner, now),
+            ).fetchone()
+        return row[0]
+
+    def notification_queue_counts(self) -> dict[str, int]:
+        with self._connect() as conn:
+            rows = conn.execute("SELECT status, COUNT(*) FROM notification_queue GROUP BY status").fetchall()
+        return {status: count for status, count in rows}
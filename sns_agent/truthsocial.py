@@ -1,5 +1,9 @@
 from __future__ import annotations
 
+import asyncio
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+import json
 import logging
 import os
 from pathlib import Path
@@ -7,30 +11,122 @@ import re
 from typing import Any
 from urllib.parse import urlsplit
 
+import httpx
+
+from .batching import MicroBatcher
+from .cache import CacheStats, LRUTTLCache
 from .normalizer import normalize_status
 from .proxy_client import ProxyHttpClient
 from .schemas import MediaAttachment, NormalizedPost, NotificationItem, PublishResult
 
 BLANK_LINES_RE = re.compile(r"\n{3,}")
+NOTIFICATION_MAX_PAGES = 10
 logger = logging.getLogger(__name__)
 
 
+def notification_sort_key(notification_id: str) -> tuple[int, str]:
+    return len(notification_id), notification_id
+
+
 class TruthSocialClient:
     def __init__(self, proxy_client: ProxyHttpClient):
         self._proxy = proxy_client
         self._base_url = os.getenv("TRUTHSOCIAL_BASE_URL", "").rstrip("/")
         self._media_host_api_url = os.getenv("MEDIA_HOST_API_URL", "").rstrip("/")
+        cache_max_entries = int(os.getenv("STATUS_CACHE_MAX_ENTRIES", "1024"))
+        cache_ttl_seconds = float(os.getenv("STATUS_CACHE_TTL_SECONDS", "300"))
+        self._status_cache: LRUTTLCache[str, tuple[str | None, NormalizedPost]] = LRUTTLCache(
+            cache_max_entries,
+            cache_ttl_seconds,
+        )
+        self._ancestor_cache: LRUTTLCache[str, tuple[str, ...]] = LRUTTLCache(cache_max_entries, cache_ttl_seconds)
+        self._media_page_cache: LRUTTLCache[str, dict[str, Any]] = LRUTTLCache(
+            int(os.getenv("MEDIA_HOST_PAGE_CACHE_MAX_ENTRIES", "4096"))
+        )
+        self._media_page_requests: dict[str, asyncio.Future[dict[str, Any]]] = {}
+        self._media_page_semaphore = asyncio.Semaphore(max(1, int(os.getenv("MEDIA_HOST_RESOLVE_CONCURRENCY", "8"))))
+        self._media_page_batcher: MicroBatcher[str, dict[str, Any]] = MicroBatcher(
+            self._request_media_host_pages,
+            window_seconds=float(os.getenv("MEDIA_HOST_RESOLVE_BATCH_WINDOW_MS", "5")) / 1000,
+            max_batch_size=int(os.getenv("MEDIA_HOST_RESOLVE_BATCH_MAX_PAGES", "100")),
+        )
+        self._media_page_batch_supported = True
 
     def _url(self, path: str) -> str:
         if self._base_url:
             return f"{self._base_url}/{path.lstrip('/')}"
         return f"/{path.lstrip('/')}"
 
-    async def fetch_notifications(self) -> list[NotificationItem]:
-        payload = await self._proxy.request_json(
-            "GET",
-            self._url("/api/v1/alerts?category=mentions&follow_mentions=false"),
-        )
+    async def fetch_notification_range(
+        self,
+        since_id: str | None = None,
+        max_id: str | None = None,
+    ) -> tuple[list[NotificationItem], str | None]:
+        path = "/api/v1/alerts?category=mentions&follow_mentions=false"
+        if since_id is None:
+            return self._parse_notifications(await self._proxy.request_json("GET", self._url(path))), None
+
+        notifications: list[NotificationItem] = []
+        resume_max_id: str | None = None
+        for _ in range(NOTIFICATION_MAX_PAGES):
+            page_path = f"{path}&since_id={since_id}"
+            if max_id is not None:
+                page_path = f"{page_path}&max_id={max_id}"
+            payload = await self._proxy.request_json("GET", self._url(page_path))
+            page_ids = [str(item["id"]) for item in payload or [] if "id" in item]
+            page_ids = [item_id for item_id in page_ids if notification_sort_key(item_id) > notification_sort_key(since_id)]
+            if not page_ids:
+                break
+            notifications.extend(self._parse_notifications(payload))
+            oldest_id = min(page_ids, key=notification_sort_key)
+            if max_id is not None and notification_sort_key(oldest_id) >= notification_sort_key(max_id):
+                break
+            max_id = oldest_id
+        else:
+            resume_max_id = max_id
+            logger.warning(
+                "notification backfill stopped after %d pages since_id=%s max_id=%s",
+                NOTIFICATION_MAX_PAGES,
+                since_id,
+                max_id,
+            )
+        unique = {notification.notification_id: notification for notification in notifications}
+        return [
+            notification
+            for notification in unique.values()
+            if notification_sort_key(notification.notification_id) > notification_sort_key(since_id)
+        ], resume_max_id
+
+    @asynccontextmanager
+    async def stream_notifications(self, path: str) -> AsyncIterator[AsyncIterator[NotificationItem]]:
+        async with self._proxy.stream_lines(path) as lines:
+            yield self._parse_notification_events(lines)
+
+    async def _parse_notification_events(self, lines: AsyncIterator[str]) -> AsyncIterator[NotificationItem]:
+        event = "message"
+        data: list[str] = []
+        async for line in lines:
+            if line:
+                field, _, value = line.partition(":")
+                value = value[1:] if value.startswith(" ") else value
+                if field == "event":
+                    event = value
+                elif field == "data":
+                    data.append(value)
+                continue
+            if event == "notification" and data:
+                try:
+                    payload = json.loads("\n".join(data))
+                except json.JSONDecodeError:
+                    logger.warning("ignoring malformed notification stream event")
+                else:
+                    for notification in self._parse_notifications([payload]):
+                        yield notification
+            event = "message"
+            data = []
+
+    @staticmethod
+    def _parse_notifications(payload: Any) -> list[NotificationItem]:
         notifications: list[NotificationItem] = []
         for item in payload or []:
             status = item.get("status")
@@ -48,19 +144,77 @@ class TruthSocialClient:
         return notifications
 
     async def fetch_status(self, post_id: str) -> NormalizedPost:
+        cached = self._status_cache.get(post_id)
+        if cached is not None:
+            return cached[1]
         payload = await self._proxy.request_json("GET", self._url(f"/api/v1/statuses/{post_id}"))
-        return await self._normalize_and_expand(payload)
+        post = await self._normalize_and_expand(payload)
+        self._status_cache.put(post.post_id, (payload.get("edited_at"), post))
+        return post
 
     async def fetch_ancestor_chain(self, post: NormalizedPost) -> list[NormalizedPost]:
         if not post.parent_post_id:
             return [post]
-        payload = await self._proxy.request_json(
-            "GET",
-            self._url(f"/api/v2/statuses/{post.post_id}/context/ancestors"),
-        )
-        ancestors = [await self._normalize_and_expand(item) for item in payload or []]
+        ancestors = self._cached_ancestors(post.post_id)
+        if ancestors is None:
+            parent_ancestors = self._cached_ancestors(post.parent_post_id)
+            parent = self._status_cache.get(post.parent_post_id)
+            if parent_ancestors is not None and parent is not None:
+                ancestors = parent_ancestors + [parent[1]]
+        if ancestors is None:
+            payload = await self._proxy.request_json(
+                "GET",
+                self._url(f"/api/v2/statuses/{post.post_id}/context/ancestors"),
+            )
+            ancestors = list(await asyncio.gather(*(self._normalize_cached(item) for item in payload or [])))
+            ancestor_ids = [ancestor.post_id for ancestor in ancestors]
+            for index, ancestor in enumerate(ancestors):
+                self._ancestor_cache.put(ancestor.post_id, tuple(ancestor_ids[:index]))
+        self._ancestor_cache.put(post.post_id, tuple(ancestor.post_id for ancestor in ancestors))
         return ancestors + [post]
 
+    def cache_stats(self) -> dict[str, CacheStats]:
+        return {
+            "status": self._status_cache.stats(),
+            "ancestors": self._ancestor_cache.stats(),
+            "media_pages": self._media_page_cache.stats(),
+        }
+
+    def _cached_ancestors(self, post_id: str) -> list[NormalizedPost] | None:
+        ancestor_ids = self._ancestor_cache.get(post_id)
+        if ancestor_ids is None:
+            return None
+        ancestors: list[NormalizedPost] = []
+        for ancestor_id in ancestor_ids:
+            cached = self._status_cache.get(ancestor_id)
+            if cached is None:
+                self._ancestor_cache.pop(post_id)
+                return None
+            ancestors.append(cached[1])
+        return ancestors
+
+    async def _normalize_cached(self, payload: dict[str, Any]) -> NormalizedPost:
+        post_id = str(payload["id"])
+        edited_at = payload.get("edited_at")
+        cached = self._status_cache.get(post_id)
+        if cached is not None and cached[0] == edited_at:
+            return cached[1]
+        if cached is not None:
+            self._ancestor_cache.pop(post_id)
+        post = await self._normalize_and_expand(payload)
+        self._status_cache.put(post_id, (edited_at, post))
+        return post
+
+    async def _remember_published_reply(self, payload: dict[str, Any], in_reply_to_id: str) -> None:
+        try:
+            post = await self._normalize_cached(payload)
+        except Exception as exc:
+            logger.debug("failed to cache published reply id=%s error=%s", payload.get("id"), exc)
+            return
+        parent_ancestors = self._ancestor_cache.get(in_reply_to_id)
+        if parent_ancestors is not None and in_reply_to_id in self._status_cache:
+            self._ancestor_cache.put(post.post_id, parent_ancestors + (in_reply_to_id,))
+
     async def upload_media(self, filename: str, content: bytes, mime_type: str) -> MediaAttachment:
         response = await self._proxy.request_json(
             "POST",
@@ -92,16 +246,25 @@ class TruthSocialClient:
         if not self._media_host_api_url:
             return [], []
 
-        media: list[MediaAttachment] = []
-        resolved_urls: list[str] = []
+        urls_by_page: dict[str, list[str]] = {}
         for url in urls:
             page_id = self._media_host_page_id(url)
-            if page_id is None:
-                continue
-            try:
-                payload = await self._proxy.request_json("GET", f"{self._media_host_api_url}/api/pages/{page_id}")
-            except Exception as exc:
-                logger.warning("failed to resolve hosted media url=%s error=%s", url, exc)
+            if page_id is not None:
+                urls_by_page.setdefault(page_id, []).append(url)
+        if not urls_by_page:
+            return [], []
+
+        payloads = await asyncio.gather(
+            *(self._fetch_media_host_page(page_id) for page_id in urls_by_page),
+            return_exceptions=True,
+        )
+        media: list[MediaAttachment] = []
+        resolved_urls: list[str] = []
+        for (page_id, page_urls), payload in zip(urls_by_page.items(), payloads, strict=True):
+            if isinstance(payload, BaseException):
+                if isinstance(payload, asyncio.CancelledError):
+                    raise payload
+                logger.warning("failed to resolve hosted media url=%s error=%s", page_urls[0], payload)
                 continue
             items = payload.get("items") or []
             for index, item in enumerate(items, start=1):
@@ -115,9 +278,61 @@ class TruthSocialClient:
                         source="media_host",
                     )
                 )
-            resolved_urls.append(url)
+            resolved_urls.extend(page_urls)
         return media, resolved_urls
 
+    async def _fetch_media_host_page(self, page_id: str) -> dict[str, Any]:
+        cached = self._media_page_cache.get(page_id)
+        if cached is not None:
+            return cached
+        pending = self._media_page_requests.get(page_id)
+        if pending is None:
+            pending = asyncio.ensure_future(self._request_media_host_page(page_id))
+            self._media_page_requests[page_id] = pending
+            pending.add_done_callback(lambda future: self._forget_media_page_request(page_id, future))
+        return await asyncio.shield(pending)
+
+    async def _request_media_host_page(self, page_id: str) -> dict[str, Any]:
+        payload = await self._media_page_batcher.submit("pages", page_id)
+        self._media_page_cache.put(page_id, payload)
+        return payload
+
+    async def _request_media_host_pages(self, page_ids: list[str]) -> list[dict[str, Any] | BaseException]:
+        if self._media_page_batch_supported:
+            try:
+                async with self._media_page_semaphore:
+                    payload = await self._proxy.request_json(
+                        "POST",
+                        f"{self._media_host_api_url}/api/pages/batch",
+                        json_body={"page_ids": page_ids},
+                    )
+            except httpx.HTTPStatusError as exc:
+                if exc.response.status_code not in {404, 405}:
+                    raise
+                logger.info("media host has no batch page endpoint; resolving pages one by one")
+                self._media_page_batch_supported = False
+            else:
+                pages = (payload or {}).get("pages") or {}
+                return [
+                    pages[page_id] if page_id in pages else LookupError(f"media host page not found: {page_id}")
+                    for page_id in page_ids
+                ]
+        return await asyncio.gather(
+            *(self._request_single_media_host_page(page_id) for page_id in page_ids),
+            return_exceptions=True,
+        )
+
+    async def _request_single_media_host_page(self, page_id: str) -> dict[str, Any]:
+        async with self._media_page_semaphore:
+            payload = await self._proxy.request_json("GET", f"{self._media_host_api_url}/api/pages/{page_id}")
+        return payload or {}
+
+    def _forget_media_page_request(self, page_id: str, future: asyncio.Future[dict[str, Any]]) -> None:
+        if self._media_page_requests.get(page_id) is future:
+            del self._media_page_requests[page_id]
+        if not future.cancelled():
+            future.exception()
+
     def _media_host_page_id(self, url: str) -> str | None:
         if not self._media_host_api_url:
             return None
@@ -178,4 +393,5 @@ class TruthSocialClient:
             "group_timeline_visible": True,
         }
         response = await self._proxy.request_json("POST", self._url("/api/v1/statuses"), json_body=payload)
+        await self._remember_published_reply(response, in_reply_to_id)
         return PublishResult(status_id=str(response["id"]), raw_response=response)
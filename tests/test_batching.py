@@ -0,0 +1,62 @@
+import asyncio
+import unittest
+
+from sns_agent.batching import MicroBatcher
+
+
+class MicroBatcherTests(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.batches: list[list[str]] = []
+
+    async def _run_batch(self, items):
+        self.batches.append(list(items))
+        return [RuntimeError(item) if item.startswith("bad") else item.upper() for item in items]
+
+    async def test_compatible_requests_inside_window_run_as_one_batch(self):
+        batcher = MicroBatcher(self._run_batch, window_seconds=0.02, max_batch_size=8)
+
+        results = await asyncio.gather(batcher.submit("sdxl", "a"), batcher.submit("sdxl", "b"))
+
+        self.assertEqual(results, ["A", "B"])
+        self.assertEqual(self.batches, [["a", "b"]])
+
+    async def test_different_keys_are_not_mixed(self):
+        batcher = MicroBatcher(self._run_batch, window_seconds=0.02, max_batch_size=8)
+
+        await asyncio.gather(batcher.submit("sdxl", "a"), batcher.submit("zimage_turbo", "b"))
+
+        self.assertCountEqual(self.batches, [["a"], ["b"]])
+
+    async def test_full_batch_is_flushed_before_window_expires(self):
+        batcher = MicroBatcher(self._run_batch, window_seconds=10.0, max_batch_size=2)
+
+        results = await asyncio.wait_for(
+            asyncio.gather(batcher.submit("sdxl", "a"), batcher.submit("sdxl", "b")),
+            timeout=1.0,
+        )
+
+        self.assertEqual(results, ["A", "B"])
+
+    async def test_failure_is_delivered_only_to_its_caller(self):
+        batcher = MicroBatcher(self._run_batch, window_seconds=0.02, max_batch_size=8)
+
+        results = await asyncio.gather(
+            batcher.submit("sdxl", "a"),
+            batcher.submit("sdxl", "bad"),
+            return_exceptions=True,
+        )
+
+        self.assertEqual(results[0], "A")
+        self.assertIsInstance(results[1], RuntimeError)
+
+    async def test_zero_window_runs_each_request_immediately(self):
+        batcher = MicroBatcher(self._run_batch, window_seconds=0, max_batch_size=8)
+
+        self.assertEqual(await batcher.submit("sdxl", "a"), "A")
+        with self.assertRaises(RuntimeError):
+            await batcher.submit("sdxl", "bad")
+        self.assertEqual(self.batches, [["a"], ["bad"]])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,40 @@
+import unittest
+
+from sns_agent.cache import LRUTTLCache
+
+
+class LRUTTLCacheTests(unittest.TestCase):
+    def test_evicts_least_recently_used_entry(self):
+        cache: LRUTTLCache[str, int] = LRUTTLCache(2)
+        cache.put("a", 1)
+        cache.put("b", 2)
+        cache.get("a")
+        cache.put("c", 3)
+
+        self.assertEqual(cache.get("a"), 1)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.stats().evictions, 1)
+
+    def test_expires_entries_after_ttl(self):
+        now = [0.0]
+        cache: LRUTTLCache[str, int] = LRUTTLCache(8, 10.0, clock=lambda: now[0])
+        cache.put("a", 1)
+
+        now[0] = 9.0
+        self.assertEqual(cache.get("a"), 1)
+        now[0] = 10.0
+        self.assertIsNone(cache.get("a"))
+        stats = cache.stats()
+        self.assertEqual((stats.hits, stats.misses, stats.size), (1, 1, 0))
+
+    def test_entries_without_ttl_never_expire(self):
+        now = [0.0]
+        cache: LRUTTLCache[str, int] = LRUTTLCache(8, None, clock=lambda: now[0])
+        cache.put("a", 1)
+        now[0] = 1e9
+
+        self.assertIn("a", cache)
+
+
+if __name__ == "__main__":
+    unittest.main()
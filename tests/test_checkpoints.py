@@ -0,0 +1,78 @@
+import os
+import tempfile
+import time
+import unittest
+from pathlib import Path
+
+from sns_agent.checkpoints import ResponseCheckpointStore
+from sns_agent.schemas import AgentResponse, GeneratedImage, GeneratedVideo, UploadedMedia
+
+
+class ResponseCheckpointStoreTests(unittest.TestCase):
+    def setUp(self):
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.root = Path(temp_dir.name)
+        self.store = ResponseCheckpointStore(self.root, max_age_seconds=60)
+
+    def test_generated_response_round_trips_with_media_bytes(self):
+        response = AgentResponse(
+            text="done",
+            mentions=["bob"],
+            images=[
+                GeneratedImage(content=b"one", filename="sdxl-1.png", source="sdxl"),
+                GeneratedImage(content=b"two", mime_type="image/jpeg", filename="sdxl-2.jpg", source="sdxl"),
+            ],
+        )
+
+        self.store.save_response("123", response)
+        checkpoint = self.store.load("123")
+
+        self.assertEqual(checkpoint.stage, "generated")
+        self.assertEqual(checkpoint.response, response)
+        self.assertTrue((self.root / "123" / "image-2.jpg").is_file())
+
+    def test_upload_and_publish_stages_are_persisted(self):
+        checkpoint = self.store.save_response(
+            "123",
+            AgentResponse(text="", video=GeneratedVideo(content=b"mp4", source="api")),
+        )
+
+        self.store.save_uploaded(checkpoint, UploadedMedia(media_ids=["m1"]))
+        self.assertEqual(self.store.load("123").uploaded, UploadedMedia(media_ids=["m1"]))
+        self.store.save_published(checkpoint, "status-1")
+
+        loaded = self.store.load("123")
+        self.assertEqual(loaded.stage, "published")
+        self.assertEqual(loaded.status_id, "status-1")
+        self.assertEqual(loaded.response.video.content, b"mp4")
+
+    def test_discard_and_unreadable_checkpoints_are_removed(self):
+        self.store.save_response("123", AgentResponse(text="a"))
+        self.store.discard("123")
+        self.assertIsNone(self.store.load("123"))
+
+        self.store.save_response("456", AgentResponse(text="b"))
+        (self.root / "456" / "checkpoint.json").write_text("{", encoding="utf-8")
+        self.assertIsNone(self.store.load("456"))
+        self.assertFalse((self.root / "456").exists())
+
+    def test_prune_removes_only_expired_checkpoints(self):
+        self.store.save_response("old", AgentResponse(text="a"))
+        self.store.save_response("new", AgentResponse(text="b"))
+        past = time.time() - 120
+        os.utime(self.root / "old" / "checkpoint.json", (past, past))
+
+        self.assertEqual(self.store.prune(), 1)
+        self.assertIsNone(self.store.load("old"))
+        self.assertIsNotNone(self.store.load("new"))
+
+    def test_notification_ids_cannot_escape_root(self):
+        self.store.save_response("../evil", AgentResponse(text="a"))
+
+        self.assertEqual([path.name for path in self.root.iterdir()], ["___evil"])
+        self.assertEqual(self.store.load("../evil").response.text, "a")
+
+
+if __name__ == "__main__":
+    unittest.main()
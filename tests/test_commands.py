@@ -1,3 +1,4 @@
+import asyncio
 import unittest
 from pathlib import Path
 from tempfile import TemporaryDirectory
@@ -277,6 +278,122 @@ class ImageGeneratorTests(unittest.IsolatedAsyncioTestCase):
             self.assertEqual(images[0].source, "sdxl")
             self.assertEqual(marker_file.read_text(encoding="utf-8"), "done")
 
+    async def test_local_backend_keeps_module_loaded_between_generations(self):
+        with TemporaryDirectory() as temp_dir:
+            model_dir = Path(temp_dir)
+            (model_dir / "sdxl.py").write_text(
+                "CLEANUPS = []\n"
+                "def generate(request):\n"
+                "    return [b'img']\n"
+                "def cleanup():\n"
+                "    CLEANUPS.append(True)\n",
+                encoding="utf-8",
+            )
+
+            with patch.dict(
+                "os.environ",
+                {
+                    "IMAGE_BACKEND": "stable-diffusion-cpp",
+                    "IMAGE_MODEL": "sdxl",
+                    "IMAGE_MODELS_DIR": str(model_dir),
+                },
+                clear=True,
+            ), patch("sns_agent.media.httpx.AsyncClient") as mock_client_cls:
+                self._mock_async_client(mock_client_cls)
+                generator = ImageGenerator()
+                registry = generator._local_models
+                with patch.object(registry, "_load", wraps=registry._load) as load:
+                    await generator.generate(ImageGenerationRequest(prompt="one"))
+                    await generator.generate(ImageGenerationRequest(prompt="two"))
+                module = registry._models["sdxl"].module
+                self.assertEqual(load.call_count, 1)
+                self.assertEqual(module.CLEANUPS, [])
+                await generator.aclose()
+                self.assertEqual(module.CLEANUPS, [True])
+
+    async def test_local_backend_batches_concurrent_compatible_requests(self):
+        with TemporaryDirectory() as temp_dir:
+            model_dir = Path(temp_dir)
+            (model_dir / "sdxl.py").write_text(
+                "BATCHES = []\n"
+                "def generate(request):\n"
+                "    return [request.prompt.encode()]\n"
+                "def generate_batch(requests):\n"
+                "    BATCHES.append([request.prompt for request in requests])\n"
+                "    return [[request.prompt.encode()] for request in requests]\n",
+                encoding="utf-8",
+            )
+
+            with patch.dict(
+                "os.environ",
+                {
+                    "IMAGE_BACKEND": "stable-diffusion-cpp",
+                    "IMAGE_MODEL": "sdxl",
+                    "IMAGE_MODELS_DIR": str(model_dir),
+                    "LOCAL_IMAGE_BATCH_WINDOW_MS": "20",
+                },
+                clear=True,
+            ), patch("sns_agent.media.httpx.AsyncClient") as mock_client_cls:
+                self._mock_async_client(mock_client_cls)
+                generator = ImageGenerator()
+                results = await asyncio.gather(
+                    generator.generate(ImageGenerationRequest(prompt="cat", size="1024x1024")),
+                    generator.generate(ImageGenerationRequest(prompt="dog", size="1024x1024")),
+                    generator.generate(ImageGenerationRequest(prompt="fox", size="512x512")),
+                )
+                module = generator._local_models._models["sdxl"].module
+                await generator.aclose()
+
+            self.assertEqual([images[0].content for images in results], [b"cat", b"dog", b"fox"])
+            self.assertEqual(module.BATCHES, [["cat", "dog"]])
+
+    async def test_local_backend_skips_batch_window_while_several_gpus_are_idle(self):
+        with TemporaryDirectory() as temp_dir:
+            model_dir = Path(temp_dir)
+            (model_dir / "sdxl.py").write_text(
+                "BATCHES = []\n"
+                "IDLE_GPUS = 2\n"
+                "def generate(request):\n"
+                "    return [request.prompt.encode()]\n"
+                "def generate_batch(requests):\n"
+                "    BATCHES.append([request.prompt for request in requests])\n"
+                "    return [[request.prompt.encode()] for request in requests]\n"
+                "def idle_gpu_count():\n"
+                "    return IDLE_GPUS\n",
+                encoding="utf-8",
+            )
+
+            with patch.dict(
+                "os.environ",
+                {
+                    "IMAGE_BACKEND": "stable-diffusion-cpp",
+                    "IMAGE_MODEL": "sdxl",
+                    "IMAGE_MODELS_DIR": str(model_dir),
+                    "LOCAL_IMAGE_BATCH_WINDOW_MS": "20",
+                },
+                clear=True,
+            ), patch("sns_agent.media.httpx.AsyncClient") as mock_client_cls:
+                self._mock_async_client(mock_client_cls)
+                generator = ImageGenerator()
+                await generator.generate(ImageGenerationRequest(prompt="warmup"))
+                module = generator._local_models._models["sdxl"].module
+                with patch.object(generator._local_batcher, "submit", wraps=generator._local_batcher.submit) as submit:
+                    results = await asyncio.gather(
+                        generator.generate(ImageGenerationRequest(prompt="cat")),
+                        generator.generate(ImageGenerationRequest(prompt="dog")),
+                    )
+                    self.assertEqual(submit.call_count, 0)
+                    module.IDLE_GPUS = 1
+                    await asyncio.gather(
+                        generator.generate(ImageGenerationRequest(prompt="cat")),
+                        generator.generate(ImageGenerationRequest(prompt="dog")),
+                    )
+                    self.assertEqual(submit.call_count, 2)
+                await generator.aclose()
+
+            self.assertEqual([images[0].content for images in results], [b"cat", b"dog"])
+            self.assertEqual(module.BATCHES, [["cat", "dog"]])
+
     async def test_local_backend_teardown_runs_cleanup_and_unloads_module_once(self):
         with TemporaryDirectory() as temp_dir:
             model_dir = Path(temp_dir)
@@ -0,0 +1,93 @@
+import threading
+import time
+import unittest
+from tempfile import TemporaryDirectory
+
+from image_models._gpu_leases import GPULeaseManager
+from image_models._gpu_monitor import FakeGPUDeviceProvider, GPUMonitor
+from image_models._gpu_scheduler import GPUScheduler
+from image_models._sd_server import SDServerImageGenerator
+
+
+class GPUMonitorTests(unittest.TestCase):
+    def _monitor(self, provider: FakeGPUDeviceProvider, interval_seconds: float = 60.0) -> GPUMonitor:
+        monitor = GPUMonitor(lambda: provider, interval_seconds=interval_seconds)
+        self.addCleanup(monitor.close)
+        return monitor
+
+    def test_provider_is_opened_once_and_kept_open(self):
+        provider = FakeGPUDeviceProvider.idle(2)
+        monitor = self._monitor(provider)
+
+        first = monitor.snapshot()
+        second = monitor.snapshot()
+
+        self.assertEqual([candidate.index for candidate in first], [0, 1])
+        self.assertEqual(first, second)
+        self.assertTrue(provider.opened)
+        self.assertEqual(provider.samples, 1)
+        monitor.close()
+        self.assertFalse(provider.opened)
+
+    def test_listeners_are_notified_only_when_sample_changes(self):
+        provider = FakeGPUDeviceProvider.idle(1)
+        monitor = self._monitor(provider)
+        notified: list[bool] = []
+        monitor.add_listener(lambda: notified.append(True))
+        monitor.snapshot()
+
+        self.assertFalse(monitor.refresh())
+        provider.set_usage(0, gpu_utilization_percent=90, memory_used_mb=8192)
+        self.assertTrue(monitor.refresh())
+
+        self.assertEqual(notified, [True])
+        self.assertEqual(monitor.snapshot()[0].gpu_utilization_percent, 90)
+
+    def test_background_sampling_wakes_waiting_scheduler(self):
+        provider = FakeGPUDeviceProvider.idle(1)
+        provider.set_usage(0, gpu_utilization_percent=90, memory_used_mb=8192)
+        monitor = self._monitor(provider, interval_seconds=0.05)
+        temp_dir = TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        leases = GPULeaseManager(temp_dir.name)
+        self.addCleanup(leases.close)
+        scheduler = GPUScheduler(threading.Condition(), leases, poll_interval_seconds=30.0)
+        monitor.add_listener(scheduler.notify)
+        monitor.snapshot()
+        release = threading.Timer(
+            0.1,
+            provider.set_usage,
+            args=(0,),
+            kwargs={"gpu_utilization_percent": 0, "memory_used_mb": 0},
+        )
+        release.start()
+
+        started = time.monotonic()
+        gpu_index = scheduler.acquire(
+            "sdxl",
+            discover=monitor.snapshot,
+            is_available=SDServerImageGenerator._is_gpu_available,
+            resident_models=dict,
+            timeout=10.0,
+        )
+
+        self.assertEqual(gpu_index, 0)
+        self.assertLess(time.monotonic() - started, 2.0)
+
+    def test_failed_open_is_not_cached(self):
+        attempts: list[int] = []
+
+        def factory():
+            attempts.append(1)
+            raise RuntimeError("failed to initialize NVML")
+
+        monitor = GPUMonitor(factory, interval_seconds=60.0)
+
+        for _ in range(2):
+            with self.assertRaisesRegex(RuntimeError, "NVML"):
+                monitor.snapshot()
+        self.assertEqual(len(attempts), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
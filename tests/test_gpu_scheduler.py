@@ -0,0 +1,248 @@
+import asyncio
+import subprocess
+import sys
+import threading
+import time
+import unittest
+from tempfile import TemporaryDirectory
+from types import SimpleNamespace
+
+from image_models._gpu_leases import GPULeaseManager
+from image_models._gpu_scheduler import GPUScheduler
+
+_HOLD_LEASE_SCRIPT = """
+import sys, time
+from image_models._gpu_leases import GPULeaseManager
+leases = GPULeaseManager(sys.argv[1])
+assert leases.try_acquire(0, owner="other-process")
+print("held", flush=True)
+time.sleep(float(sys.argv[2]))
+"""
+
+
+class GPUSchedulerTests(unittest.TestCase):
+    def setUp(self):
+        temp_dir = TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.lease_dir = temp_dir.name
+        self.leases = GPULeaseManager(self.lease_dir)
+        self.addCleanup(self.leases.close)
+        self.resident: dict[int, str] = {}
+        self.devices = [SimpleNamespace(index=0)]
+        self.results: dict[str, int] = {}
+
+    def _scheduler(self, fairness_bound: int = 3) -> GPUScheduler:
+        return GPUScheduler(
+            threading.Condition(),
+            self.leases,
+            fairness_bound=fairness_bound,
+            poll_interval_seconds=0.01,
+        )
+
+    def _acquire(self, scheduler: GPUScheduler, model_name: str, timeout: float = 5.0) -> int:
+        return scheduler.acquire(
+            model_name,
+            discover=lambda: self.devices,
+            is_available=lambda device: True,
+            resident_models=lambda: self.resident,
+            timeout=timeout,
+        )
+
+    def _enqueue(self, scheduler: GPUScheduler, label: str, model_name: str) -> threading.Thread:
+        before = sum(scheduler.queue_depth().values())
+
+        def run():
+            self.results[label] = self._acquire(scheduler, model_name)
+
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        self._wait_until(lambda: sum(scheduler.queue_depth().values()) > before)
+        return thread
+
+    @staticmethod
+    def _wait_until(predicate):
+        deadline = time.monotonic() + 2.0
+        while time.monotonic() < deadline:
+            if predicate():
+                return
+            time.sleep(0.005)
+        raise AssertionError("condition was not met")
+
+    def test_routes_request_to_gpu_holding_its_model(self):
+        self.devices = [SimpleNamespace(index=0), SimpleNamespace(index=1)]
+        self.resident = {0: "sdxl", 1: "zimage_turbo"}
+        scheduler = self._scheduler()
+
+        self.assertEqual(self._acquire(scheduler, "zimage_turbo"), 1)
+        self.assertEqual(self._acquire(scheduler, "sdxl"), 0)
+        self.assertEqual(scheduler.stats()["sdxl"].swaps, 0)
+
+    def test_same_model_job_is_grouped_ahead_of_swap(self):
+        self.resident = {0: "sdxl"}
+        scheduler = self._scheduler()
+        first = self._acquire(scheduler, "sdxl")
+        other = self._enqueue(scheduler, "other", "zimage_turbo")
+        same = self._enqueue(scheduler, "same", "sdxl")
+
+        scheduler.release(first)
+        same.join(timeout=2.0)
+
+        self.assertEqual(self.results["same"], 0)
+        self.assertNotIn("other", self.results)
+        scheduler.release(0)
+        other.join(timeout=2.0)
+        self.assertEqual(self.results["other"], 0)
+        self.assertEqual(scheduler.stats()["zimage_turbo"].swaps, 1)
+
+    def test_fairness_bound_forces_swap_for_long_skipped_job(self):
+        self.resident = {0: "sdxl"}
+        scheduler = self._scheduler(fairness_bound=1)
+        self._acquire(scheduler, "sdxl")
+        other = self._enqueue(scheduler, "other", "zimage_turbo")
+        same = self._enqueue(scheduler, "same", "sdxl")
+        scheduler.release(0)
+        same.join(timeout=2.0)
+        late = self._enqueue(scheduler, "late", "sdxl")
+
+        scheduler.release(0)
+        other.join(timeout=2.0)
+
+        self.assertEqual(self.results["other"], 0)
+        self.assertNotIn("late", self.results)
+        scheduler.release(0)
+        late.join(timeout=2.0)
+
+    def test_idle_gpu_count_excludes_leased_gpus_and_queued_waiters(self):
+        self.devices = [SimpleNamespace(index=0), SimpleNamespace(index=1)]
+        scheduler = self._scheduler()
+
+        def idle() -> int:
+            return scheduler.idle_gpu_count(self.devices, lambda device: True, self.resident)
+
+        self.assertEqual(idle(), 2)
+        first = self._acquire(scheduler, "sdxl")
+        self.assertEqual(idle(), 1)
+        self._acquire(scheduler, "sdxl")
+        waiter = self._enqueue(scheduler, "next", "sdxl")
+        scheduler.release(first)
+        waiter.join(timeout=2.0)
+        self.assertEqual(idle(), 0)
+
+    def test_reports_queue_wait_per_model(self):
+        scheduler = self._scheduler()
+        self._acquire(scheduler, "sdxl")
+        waiter = self._enqueue(scheduler, "next", "sdxl")
+        time.sleep(0.05)
+
+        scheduler.release(0)
+        waiter.join(timeout=2.0)
+
+        stats = scheduler.stats()["sdxl"]
+        self.assertEqual(stats.requests, 2)
+        self.assertGreaterEqual(stats.max_wait_seconds, 0.05)
+        self.assertGreater(stats.average_wait_seconds, 0)
+
+    def test_async_waiters_are_woken_on_release_without_threads(self):
+        scheduler = GPUScheduler(threading.Condition(), self.leases, poll_interval_seconds=5.0)
+        order: list[int] = []
+
+        async def acquire() -> int:
+            return await scheduler.acquire_async(
+                "sdxl",
+                discover=lambda: self.devices,
+                is_available=lambda device: True,
+                resident_models=lambda: self.resident,
+                timeout=5.0,
+            )
+
+        async def worker(label: int) -> None:
+            gpu_index = await acquire()
+            order.append(label)
+            await asyncio.sleep(0)
+            scheduler.release(gpu_index)
+
+        async def run() -> None:
+            threads_before = threading.active_count()
+            first = await acquire()
+            tasks = [asyncio.create_task(worker(label)) for label in range(50)]
+            while sum(scheduler.queue_depth().values()) < 50:
+                await asyncio.sleep(0.001)
+            self.assertEqual(threading.active_count(), threads_before)
+            scheduler.release(first)
+            await asyncio.wait_for(asyncio.gather(*tasks), timeout=2.0)
+
+        asyncio.run(run())
+
+        self.assertEqual(order, list(range(50)))
+        self.assertEqual(scheduler.stats()["sdxl"].requests, 51)
+
+    def test_times_out_when_no_gpu_frees(self):
+        scheduler = self._scheduler()
+        self._acquire(scheduler, "sdxl")
+
+        with self.assertRaisesRegex(RuntimeError, "no GPU available"):
+            self._acquire(scheduler, "sdxl", timeout=0.05)
+        self.assertEqual(scheduler.queue_depth(), {})
+
+
+class GPULeaseManagerTests(unittest.TestCase):
+    def setUp(self):
+        temp_dir = TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.lease_dir = temp_dir.name
+
+    def _hold_in_other_process(self, seconds: float) -> subprocess.Popen:
+        process = subprocess.Popen(
+            [sys.executable, "-c", _HOLD_LEASE_SCRIPT, self.lease_dir, str(seconds)],
+            stdout=subprocess.PIPE,
+            text=True,
+        )
+        self.addCleanup(process.wait)
+        self.addCleanup(process.kill)
+        self.assertEqual(process.stdout.readline().strip(), "held")
+        return process
+
+    def test_lease_is_exclusive_across_processes_and_expires_on_process_death(self):
+        leases = GPULeaseManager(self.lease_dir)
+        self.addCleanup(leases.close)
+        process = self._hold_in_other_process(60)
+
+        self.assertFalse(leases.try_acquire(0))
+        self.assertIn("other-process", leases.holder(0))
+        process.kill()
+        process.wait()
+
+        self.assertTrue(leases.try_acquire(0))
+
+    def test_waiter_wakes_when_other_process_releases(self):
+        leases = GPULeaseManager(self.lease_dir)
+        self.addCleanup(leases.close)
+        scheduler = GPUScheduler(threading.Condition(), leases, poll_interval_seconds=30.0)
+        self._hold_in_other_process(0.2)
+
+        started = time.monotonic()
+        gpu_index = scheduler.acquire(
+            "sdxl",
+            discover=lambda: [SimpleNamespace(index=0)],
+            is_available=lambda device: True,
+            resident_models=dict,
+            timeout=10.0,
+        )
+
+        self.assertEqual(gpu_index, 0)
+        self.assertLess(time.monotonic() - started, 5.0)
+
+    def test_release_clears_holder(self):
+        leases = GPULeaseManager(self.lease_dir)
+
+        self.assertTrue(leases.try_acquire(1, owner="sdxl"))
+        self.assertFalse(leases.try_acquire(1))
+        leases.release(1)
+
+        self.assertIsNone(leases.holder(1))
+        self.assertTrue(leases.try_acquire(1))
+        leases.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
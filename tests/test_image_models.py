@@ -1,13 +1,67 @@
+import asyncio
+import os
+import sys
+import threading
+import time
 import unittest
 from pathlib import Path
-from unittest.mock import MagicMock, patch
+from tempfile import TemporaryDirectory
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import httpx
 
 from image_models import coerce_generated_images
-from image_models._sd_server import GPUCandidate, SDServerImageGenerator, SDServerModelConfig, build_argument_list
+from image_models._gpu_leases import GPULeaseManager
+from image_models._gpu_monitor import FakeGPUDeviceProvider, GPUMonitor
+from image_models._gpu_scheduler import GPUScheduler
+from image_models._sd_server import (
+    GPUCandidate,
+    SDServerImageGenerator,
+    SDServerModelConfig,
+    SDServerModelModule,
+    SDServerPool,
+    SDServerReservation,
+    build_argument_list,
+)
 from sns_agent.schemas import GeneratedImage, ImageGenerationRequest, ReferenceImage
 
+_FAKE_SD_SERVER = """
+import base64, json, sys
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+if "--exit" in sys.argv:
+    sys.exit(3)
+port = int(sys.argv[sys.argv.index("--listen-port") + 1])
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        self._reply({"data": [{"id": "fake"}]})
+
+    def do_POST(self):
+        payload = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        images = [base64.b64encode(f"image-{index}".encode()).decode() for index in range(int(payload["n"]))]
+        self._reply({"data": [{"b64_json": image} for image in images]})
 
-class ImageModelsTests(unittest.TestCase):
+    def _reply(self, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+HTTPServer(("127.0.0.1", port), Handler).serve_forever()
+"""
+
+
+class ImageModelsTests(unittest.IsolatedAsyncioTestCase):
     def test_coerce_generated_images_accepts_bytes(self):
         images = coerce_generated_images([b"a", b"b"], source="dummy")
         self.assertEqual(len(images), 2)
@@ -104,43 +158,47 @@ class ImageModelsTests(unittest.TestCase):
         self.assertEqual(files[0][1][0], "cat.png")
         self.assertEqual(files[0][1][1], b"png-bytes")
 
-    def test_sd_server_requires_reference_images_once_for_edit_only_models(self):
+    async def test_sd_server_requires_reference_images_once_for_edit_only_models(self):
         generator = SDServerImageGenerator(
             SDServerModelConfig(model_name="qwen_image_edit", arguments=["--model", "dummy"], requires_reference_images=True)
         )
         with self.assertRaisesRegex(RuntimeError, "requires reference images"):
-            generator.generate(ImageGenerationRequest(prompt="add flowers"))
+            await generator.generate(ImageGenerationRequest(prompt="add flowers"))
 
-    def test_sd_server_decodes_generation_response_via_shared_path(self):
-        generator = SDServerImageGenerator(SDServerModelConfig(model_name="sdxl", arguments=["--model", "dummy"]))
+    async def test_sd_server_decodes_generation_response_via_shared_path(self):
+        pool = SDServerPool(idle_ttl_seconds=60)
+        generator = SDServerImageGenerator(
+            SDServerModelConfig(model_name="sdxl", arguments=["--model", "dummy"]),
+            server_pool=pool,
+        )
         response = MagicMock()
         response.status_code = 200
         response.json.return_value = {"data": [{"b64_json": "aGVsbG8="}]}
 
         client = MagicMock()
-        client.__enter__.return_value = client
-        client.__exit__.return_value = False
-        client.post.return_value = response
+        client.post = AsyncMock(return_value=response)
 
-        with patch("image_models._sd_server.httpx.Client", return_value=client):
-            images = generator._request_images(7860, ImageGenerationRequest(prompt="cat"))
+        with patch.object(pool, "http_client", return_value=client):
+            images = await generator._request_images(7860, ImageGenerationRequest(prompt="cat"))
 
         self.assertEqual(images[0].content, b"hello")
         self.assertEqual(images[0].filename, "sdxl-1.png")
 
-    def test_sd_server_decodes_edit_response_via_shared_path(self):
-        generator = SDServerImageGenerator(SDServerModelConfig(model_name="qwen_image_edit", arguments=["--model", "dummy"]))
+    async def test_sd_server_decodes_edit_response_via_shared_path(self):
+        pool = SDServerPool(idle_ttl_seconds=60)
+        generator = SDServerImageGenerator(
+            SDServerModelConfig(model_name="qwen_image_edit", arguments=["--model", "dummy"]),
+            server_pool=pool,
+        )
         response = MagicMock()
         response.status_code = 200
         response.json.return_value = {"data": [{"b64_json": "aGVsbG8="}]}
 
         client = MagicMock()
-        client.__enter__.return_value = client
-        client.__exit__.return_value = False
-        client.post.return_value = response
+        client.post = AsyncMock(return_value=response)
 
-        with patch("image_models._sd_server.httpx.Client", return_value=client):
-            images = generator._request_images(
+        with patch.object(pool, "http_client", return_value=client):
+            images = await generator._request_images(
                 7860,
                 ImageGenerationRequest(
                     prompt="add flowers",
@@ -190,5 +248,307 @@ class ImageModelsTests(unittest.TestCase):
         )
 
 
+
+class SDServerModelModuleTests(unittest.IsolatedAsyncioTestCase):
+    async def test_config_is_built_once_and_cleanup_releases_model_servers(self):
+        pool = MagicMock(spec=SDServerPool)
+        build_config = MagicMock(return_value=SDServerModelConfig(model_name="sdxl", arguments=["--model", "dummy"]))
+        model = SDServerModelModule(build_config, server_pool=pool)
+        request = ImageGenerationRequest(prompt="cat")
+
+        with patch.object(SDServerImageGenerator, "generate", return_value=[]) as generate_mock:
+            await model.generate(request)
+            await model.generate(request)
+            await model.cleanup()
+            await model.generate(request)
+
+        self.assertEqual(build_config.call_count, 2)
+        self.assertEqual(generate_mock.call_count, 3)
+        pool.discard_model.assert_awaited_once_with("sdxl")
+
+
+class SDServerBatchTests(unittest.IsolatedAsyncioTestCase):
+    async def test_identical_prompts_are_merged_and_split_per_caller(self):
+        generator = SDServerImageGenerator(SDServerModelConfig(model_name="sdxl", arguments=["--model", "dummy"]))
+        images = [GeneratedImage(content=bytes([index]), filename=f"sdxl-{index}.png") for index in range(3)]
+        requests = [
+            ImageGenerationRequest(prompt="cat", count=2),
+            ImageGenerationRequest(prompt="dog"),
+            ImageGenerationRequest(prompt="cat"),
+        ]
+
+        async def generate_on_gpu(gpu_index, request):
+            return images if request.prompt == "cat" else [images[0]]
+
+        with (
+            patch.object(generator, "_acquire_gpu", side_effect=[0, 1]) as acquire_mock,
+            patch.object(generator, "_release_gpu") as release_mock,
+            patch.object(generator, "_generate_on_gpu", side_effect=generate_on_gpu) as generate_mock,
+        ):
+            results = await generator.generate_batch(requests)
+
+        self.assertEqual(acquire_mock.await_count, 2)
+        self.assertEqual(sorted(call.args[0] for call in release_mock.call_args_list), [0, 1])
+        self.assertEqual(
+            sorted((call.args[1].prompt, call.args[1].count) for call in generate_mock.call_args_list),
+            [("cat", 3), ("dog", 1)],
+        )
+        self.assertEqual(results[0], images[:2])
+        self.assertEqual(results[1], [images[0]])
+        self.assertEqual(results[2], images[2:])
+
+    async def test_failed_group_does_not_fail_other_callers(self):
+        generator = SDServerImageGenerator(SDServerModelConfig(model_name="sdxl", arguments=["--model", "dummy"]))
+        image = GeneratedImage(content=b"img", filename="sdxl-1.png")
+        requests = [ImageGenerationRequest(prompt="cat", seed=1), ImageGenerationRequest(prompt="cat", seed=1)]
+
+        with (
+            patch.object(generator, "_acquire_gpu", return_value=0),
+            patch.object(generator, "_release_gpu"),
+            patch.object(generator, "_generate_on_gpu", side_effect=[RuntimeError("boom"), [image]]),
+        ):
+            results = await generator.generate_batch(requests)
+
+        self.assertIsInstance(results[0], RuntimeError)
+        self.assertEqual(results[1], [image])
+
+
+    async def test_distinct_prompts_in_one_batch_run_on_separate_gpus(self):
+        temp_dir = TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        leases = GPULeaseManager(temp_dir.name)
+        self.addCleanup(leases.close)
+        monitor = GPUMonitor(lambda: FakeGPUDeviceProvider.idle(2), interval_seconds=60.0)
+        self.addCleanup(monitor.close)
+        scheduler = GPUScheduler(threading.Condition(), leases, poll_interval_seconds=0.05)
+        config = SDServerModelConfig(model_name="sdxl", arguments=["--model", "dummy"])
+        generator = SDServerImageGenerator(config)
+        module = SDServerModelModule(lambda: config)
+        running: dict[str, int] = {}
+        both_running = asyncio.Event()
+
+        async def generate_on_gpu(gpu_index, request):
+            running[request.prompt] = gpu_index
+            if len(running) == 2:
+                both_running.set()
+            await asyncio.wait_for(both_running.wait(), timeout=5.0)
+            return [GeneratedImage(content=request.prompt.encode(), filename=f"{request.prompt}.png")]
+
+        with (
+            patch("image_models._sd_server._GPU_MONITOR", monitor),
+            patch("image_models._sd_server._GPU_SCHEDULER", scheduler),
+            patch.object(generator, "_generate_on_gpu", side_effect=generate_on_gpu),
+        ):
+            self.assertEqual(module.idle_gpu_count(), 2)
+            results = await generator.generate_batch(
+                [ImageGenerationRequest(prompt="cat"), ImageGenerationRequest(prompt="dog")]
+            )
+            self.assertEqual(module.idle_gpu_count(), 2)
+
+        self.assertEqual(sorted(running.values()), [0, 1])
+        self.assertEqual([images[0].content for images in results], [b"cat", b"dog"])
+
+
+class SDServerPoolTests(unittest.IsolatedAsyncioTestCase):
+    @staticmethod
+    def _reservation(port: int, *, alive: bool = True) -> SDServerReservation:
+        process = MagicMock()
+        process.returncode = None if alive else 1
+        process.wait = AsyncMock(return_value=process.returncode)
+        return SDServerReservation(port=port, process=process)
+
+    async def test_checkout_reuses_warm_server_across_requests(self):
+        pool = SDServerPool(idle_ttl_seconds=60)
+        config = SDServerModelConfig(model_name="sdxl", arguments=["--model", "dummy"])
+        start_server = AsyncMock(return_value=self._reservation(7860))
+
+        with patch.object(SDServerPool, "_is_healthy", return_value=True), patch.object(pool, "_ensure_reaper"):
+            first = await pool.checkout(config, 0, start_server)
+            await pool.checkin("sdxl", 0)
+            second = await pool.checkout(config, 0, start_server)
+
+        self.assertIs(first, second)
+        start_server.assert_called_once_with(0)
+        self.assertEqual(pool.resident_models(), {0: "sdxl"})
+
+    async def test_checkout_restarts_crashed_server(self):
+        pool = SDServerPool(idle_ttl_seconds=60)
+        config = SDServerModelConfig(model_name="sdxl", arguments=["--model", "dummy"])
+        crashed = self._reservation(7860, alive=False)
+        restarted = self._reservation(7861)
+        start_server = AsyncMock(side_effect=[crashed, restarted])
+
+        with patch.object(pool, "_ensure_reaper"):
+            await pool.checkout(config, 0, start_server)
+            await pool.checkin("sdxl", 0)
+            reservation = await pool.checkout(config, 0, start_server)
+
+        self.assertIs(reservation, restarted)
+        self.assertEqual(start_server.call_count, 2)
+
+    async def test_checkout_replaces_other_model_on_same_gpu(self):
+        pool = SDServerPool(idle_ttl_seconds=60)
+        sdxl = SDServerModelConfig(model_name="sdxl", arguments=["--model", "sdxl"])
+        zimage = SDServerModelConfig(model_name="zimage_turbo", arguments=["--model", "zimage"])
+        sdxl_reservation = self._reservation(7860)
+        start_server = AsyncMock(side_effect=[sdxl_reservation, self._reservation(7861)])
+
+        with patch.object(pool, "_ensure_reaper"), patch.object(SDServerImageGenerator, "_stop_server") as stop_mock:
+            await pool.checkout(sdxl, 0, start_server)
+            await pool.checkin("sdxl", 0)
+            await pool.checkout(zimage, 0, start_server)
+
+        stop_mock.assert_called_once_with(sdxl_reservation)
+        self.assertEqual(pool.resident_models(), {0: "zimage_turbo"})
+
+    async def test_evict_idle_stops_only_expired_idle_servers(self):
+        pool = SDServerPool(idle_ttl_seconds=60)
+        config = SDServerModelConfig(model_name="sdxl", arguments=["--model", "dummy"])
+        idle = self._reservation(7860)
+        busy = self._reservation(7861)
+
+        with patch.object(pool, "_ensure_reaper"), patch.object(SDServerImageGenerator, "_stop_server") as stop_mock:
+            await pool.checkout(config, 0, AsyncMock(return_value=idle))
+            await pool.checkin("sdxl", 0)
+            await pool.checkout(config, 1, AsyncMock(return_value=busy))
+            evicted = await pool.evict_idle(now=time.monotonic() + 120)
+
+        self.assertEqual(evicted, 1)
+        stop_mock.assert_called_once_with(idle)
+        self.assertEqual(pool.resident_models(), {1: "sdxl"})
+
+    async def test_zero_ttl_stops_server_after_each_request(self):
+        pool = SDServerPool(idle_ttl_seconds=0)
+        config = SDServerModelConfig(model_name="sdxl", arguments=["--model", "dummy"])
+        reservation = self._reservation(7860)
+
+        with patch.object(SDServerImageGenerator, "_stop_server") as stop_mock:
+            await pool.checkout(config, 0, AsyncMock(return_value=reservation))
+            await pool.checkin("sdxl", 0)
+
+        stop_mock.assert_called_once_with(reservation)
+        self.assertEqual(pool.resident_models(), {})
+
+    async def test_generate_restarts_server_once_after_crash_during_request(self):
+        pool = SDServerPool(idle_ttl_seconds=60)
+        generator = SDServerImageGenerator(
+            SDServerModelConfig(model_name="sdxl", arguments=["--model", "dummy"]),
+            server_pool=pool,
+        )
+        crashed = self._reservation(7860)
+        healthy = self._reservation(7861)
+        image = GeneratedImage(content=b"img")
+
+        async def request_images(port, request):
+            if port == 7860:
+                crashed.process.returncode = -9
+                raise httpx.RemoteProtocolError("server disconnected")
+            return [image]
+
+        with (
+            patch.object(pool, "_ensure_reaper"),
+            patch.object(generator, "_start_server", side_effect=[crashed, healthy]),
+            patch.object(generator, "_request_images", side_effect=request_images),
+            patch.object(SDServerImageGenerator, "_stop_server"),
+        ):
+            images = await generator._generate_on_gpu(0, ImageGenerationRequest(prompt="cat"))
+
+        self.assertEqual(images, [image])
+        self.assertEqual(pool.resident_models(), {0: "sdxl"})
+
+    async def test_acquire_gpu_prefers_gpu_holding_warm_server_for_model(self):
+        pool = SDServerPool(idle_ttl_seconds=60)
+        config = SDServerModelConfig(model_name="sdxl", arguments=["--model", "dummy"])
+        generator = SDServerImageGenerator(config, server_pool=pool)
+        idle = GPUCandidate(0, "GPU-0", 32 * 1024, 32 * 1024, 0, 0, 0)
+        warm = GPUCandidate(1, "GPU-1", 32 * 1024, 16 * 1024, 16 * 1024, 0, 50)
+
+        with patch.object(pool, "_ensure_reaper"):
+            await pool.checkout(config, 1, AsyncMock(return_value=self._reservation(7860)))
+            await pool.checkin("sdxl", 1)
+        with patch.object(SDServerImageGenerator, "_discover_gpus", return_value=[idle, warm]):
+            gpu_index = await generator._acquire_gpu()
+        generator._release_gpu(gpu_index)
+
+        self.assertEqual(gpu_index, 1)
+
+
+
+class SDServerPoolHTTPClientTests(unittest.TestCase):
+    def test_http_client_is_closed_with_the_loop_that_created_it(self):
+        pool = SDServerPool(idle_ttl_seconds=60)
+
+        async def client() -> httpx.AsyncClient:
+            client = pool.http_client()
+            await asyncio.sleep(0)
+            return client
+
+        first = asyncio.run(client())
+        second = asyncio.run(client())
+
+        self.assertIsNot(first, second)
+        self.assertTrue(first.is_closed)
+        self.assertTrue(second.is_closed)
+
+    def test_aclose_closes_http_client_on_the_current_loop(self):
+        pool = SDServerPool(idle_ttl_seconds=60)
+
+        async def scenario() -> httpx.AsyncClient:
+            client = pool.http_client()
+            self.assertIs(pool.http_client(), client)
+            await pool.aclose()
+            return client
+
+        self.assertTrue(asyncio.run(scenario()).is_closed)
+
+
+class SDServerProcessTests(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        temp_dir = TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.binary = Path(temp_dir.name) / "sd-server"
+        self.binary.write_text(f"#!{sys.executable}\n{_FAKE_SD_SERVER}", encoding="utf-8")
+        os.chmod(self.binary, 0o755)
+
+    async def test_generate_starts_probes_and_reuses_async_server(self):
+        pool = SDServerPool(idle_ttl_seconds=60)
+        generator = SDServerImageGenerator(
+            SDServerModelConfig(model_name="sdxl", arguments=["--model", "dummy"]),
+            server_pool=pool,
+        )
+
+        with (
+            patch.object(SDServerImageGenerator, "_find_sd_server_binary", return_value=self.binary),
+            patch.object(generator, "_acquire_gpu", AsyncMock(return_value=0)),
+            patch.object(generator, "_release_gpu"),
+        ):
+            try:
+                first = await generator.generate(ImageGenerationRequest(prompt="cat", count=2))
+                process = pool._servers[("sdxl", 0)].reservation.process
+                second = await generator.generate(ImageGenerationRequest(prompt="dog"))
+                self.assertIs(pool._servers[("sdxl", 0)].reservation.process, process)
+            finally:
+                await pool.aclose()
+
+        self.assertEqual([image.content for image in first], [b"image-0", b"image-1"])
+        self.assertEqual([image.content for image in second], [b"image-0"])
+        self.assertIsNotNone(process.returncode)
+        self.assertEqual(pool.resident_models(), {})
+
+    async def test_start_reports_server_that_exits_before_ready(self):
+        pool = SDServerPool(idle_ttl_seconds=60)
+        generator = SDServerImageGenerator(
+            SDServerModelConfig(model_name="sdxl", arguments=["--exit"]),
+            server_pool=pool,
+        )
+
+        with patch.object(SDServerImageGenerator, "_find_sd_server_binary", return_value=self.binary):
+            try:
+                with self.assertRaisesRegex(RuntimeError, "exited before it became ready"):
+                    await generator._start_server(0)
+            finally:
+                await pool.aclose()
+
+
 if __name__ == "__main__":
     unittest.main()
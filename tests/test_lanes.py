@@ -0,0 +1,77 @@
+import asyncio
+import unittest
+
+from sns_agent.lanes import AdmissionLane
+
+
+class AdmissionLaneTests(unittest.IsolatedAsyncioTestCase):
+    async def test_limits_concurrency_and_reports_queue_depth(self):
+        lane = AdmissionLane("gpu_media", 1)
+        gate = asyncio.Event()
+
+        async def hold():
+            async with lane.admit():
+                await gate.wait()
+
+        tasks = [asyncio.create_task(hold()) for _ in range(3)]
+        await asyncio.sleep(0)
+
+        stats = lane.stats()
+        self.assertEqual((stats.active, stats.queued, stats.admitted), (1, 2, 1))
+
+        gate.set()
+        await asyncio.gather(*tasks)
+        stats = lane.stats()
+        self.assertEqual((stats.active, stats.queued, stats.admitted), (0, 0, 3))
+
+    async def test_records_wait_time_per_admission(self):
+        now = [0.0]
+        lane = AdmissionLane("conversation", 1, clock=lambda: now[0])
+        release = asyncio.Event()
+
+        async def first():
+            async with lane.admit():
+                await release.wait()
+
+        task = asyncio.create_task(first())
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(self._admit(lane))
+        await asyncio.sleep(0)
+        now[0] = 2.5
+        release.set()
+        await task
+
+        self.assertEqual(await waiter, 2.5)
+        stats = lane.stats()
+        self.assertEqual(stats.max_wait_seconds, 2.5)
+        self.assertEqual(stats.average_wait_seconds, 1.25)
+
+    async def test_cancelled_waiter_leaves_queue(self):
+        lane = AdmissionLane("api_media", 1)
+        gate = asyncio.Event()
+
+        async def hold():
+            async with lane.admit():
+                await gate.wait()
+
+        holder = asyncio.create_task(hold())
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(self._admit(lane))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+
+        self.assertEqual(lane.stats().queued, 0)
+        gate.set()
+        await holder
+        await asyncio.wait_for(self._admit(lane), timeout=1.0)
+        self.assertEqual(lane.stats().admitted, 2)
+
+    @staticmethod
+    async def _admit(lane: AdmissionLane) -> float:
+        async with lane.admit() as waited:
+            return waited
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,167 @@
+import os
+import unittest
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+
+from sns_agent.local_models import LocalModelRegistry
+
+
+class LocalModelRegistryTests(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        temp_dir = TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.model_dir = Path(temp_dir.name)
+        self.loaded: list[str] = []
+        self.teardown = AsyncMock()
+        self.now = [0.0]
+
+    def _module_path(self, name: str) -> Path:
+        path = self.model_dir / f"{name}.py"
+        if not path.exists():
+            path.write_text("", encoding="utf-8")
+        return path
+
+    def _load(self, name: str, path: Path):
+        self.loaded.append(name)
+        return SimpleNamespace(name=name)
+
+    def _registry(self, **kwargs) -> LocalModelRegistry:
+        options = {"max_resident": 2, "vram_budget_bytes": 0, "idle_ttl_seconds": 60.0}
+        options.update(kwargs)
+        registry = LocalModelRegistry(load=self._load, teardown=self.teardown, clock=lambda: self.now[0], **options)
+        self.addAsyncCleanup(registry.close)
+        return registry
+
+    async def _use(self, registry: LocalModelRegistry, name: str):
+        async with registry.acquire(name, self._module_path(name)) as module:
+            return module
+
+    async def test_module_stays_loaded_between_requests(self):
+        registry = self._registry()
+
+        first = await self._use(registry, "sdxl")
+        second = await self._use(registry, "sdxl")
+
+        self.assertIs(first, second)
+        self.assertEqual(self.loaded, ["sdxl"])
+        self.teardown.assert_not_awaited()
+
+    async def test_least_recently_used_module_is_evicted_when_full(self):
+        registry = self._registry()
+        sdxl = await self._use(registry, "sdxl")
+        self.now[0] = 1.0
+        await self._use(registry, "zimage_turbo")
+        self.now[0] = 2.0
+        await self._use(registry, "sdxl")
+        self.now[0] = 3.0
+
+        await self._use(registry, "qwen_image_edit")
+
+        self.assertEqual(registry.resident_models(), ["sdxl", "qwen_image_edit"])
+        self.assertEqual(self.teardown.await_args.args[0].name, "zimage_turbo")
+        self.assertIsNot(self.teardown.await_args.args[0], sdxl)
+
+    async def test_modules_over_vram_budget_are_evicted_oldest_first(self):
+        def load(name: str, path: Path):
+            self.loaded.append(name)
+            return SimpleNamespace(name=name, vram_bytes=lambda: 600)
+
+        registry = LocalModelRegistry(
+            load=load,
+            teardown=self.teardown,
+            max_resident=4,
+            vram_budget_bytes=1000,
+            idle_ttl_seconds=60.0,
+            clock=lambda: self.now[0],
+        )
+        self.addAsyncCleanup(registry.close)
+        await self._use(registry, "sdxl")
+        self.now[0] = 1.0
+        await self._use(registry, "zimage_turbo")
+
+        self.assertEqual(registry.resident_models(), ["zimage_turbo"])
+        self.assertEqual(registry.resident_vram_bytes(), 600)
+
+    async def test_idle_modules_are_unloaded_after_ttl(self):
+        registry = self._registry(idle_ttl_seconds=10.0)
+        await self._use(registry, "sdxl")
+
+        self.assertEqual(await registry.evict_idle(now=5.0), 0)
+        self.assertEqual(await registry.evict_idle(now=10.0), 1)
+        self.assertEqual(registry.resident_models(), [])
+        self.teardown.assert_awaited_once()
+
+    async def test_failed_generation_keeps_healthy_module_resident(self):
+        registry = self._registry()
+
+        with self.assertRaises(RuntimeError):
+            async with registry.acquire("sdxl", self._module_path("sdxl")):
+                raise RuntimeError("no GPU available before timeout")
+        await self._use(registry, "sdxl")
+
+        self.assertEqual(registry.resident_models(), ["sdxl"])
+        self.assertEqual(self.loaded, ["sdxl"])
+        self.teardown.assert_not_awaited()
+
+    async def test_module_reporting_unhealthy_after_failure_is_unloaded(self):
+        def load(name: str, path: Path):
+            self.loaded.append(name)
+            return SimpleNamespace(name=name, healthy=lambda: False)
+
+        registry = LocalModelRegistry(
+            load=load,
+            teardown=self.teardown,
+            max_resident=2,
+            vram_budget_bytes=0,
+            idle_ttl_seconds=60.0,
+            clock=lambda: self.now[0],
+        )
+        self.addAsyncCleanup(registry.close)
+
+        with self.assertRaises(RuntimeError):
+            async with registry.acquire("sdxl", self._module_path("sdxl")):
+                raise RuntimeError("CUDA out of memory")
+
+        self.assertEqual(registry.resident_models(), [])
+        self.teardown.assert_awaited_once()
+
+    async def test_module_load_failure_is_not_kept_resident(self):
+        def load(name: str, path: Path):
+            raise RuntimeError("failed to load local image model module")
+
+        registry = LocalModelRegistry(load=load, teardown=self.teardown, max_resident=2, idle_ttl_seconds=60.0)
+        self.addAsyncCleanup(registry.close)
+
+        with self.assertRaises(RuntimeError):
+            async with registry.acquire("sdxl", self._module_path("sdxl")):
+                pass
+
+        self.assertEqual(registry.resident_models(), [])
+        self.teardown.assert_not_awaited()
+
+    async def test_changed_module_file_is_reloaded(self):
+        registry = self._registry()
+        path = self._module_path("sdxl")
+        await self._use(registry, "sdxl")
+
+        stat = path.stat()
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+        await self._use(registry, "sdxl")
+
+        self.assertEqual(self.loaded, ["sdxl", "sdxl"])
+        self.teardown.assert_awaited_once()
+
+    async def test_zero_ttl_unloads_after_each_request(self):
+        registry = self._registry(idle_ttl_seconds=0.0)
+
+        await self._use(registry, "sdxl")
+        await self._use(registry, "sdxl")
+
+        self.assertEqual(self.loaded, ["sdxl", "sdxl"])
+        self.assertEqual(self.teardown.await_count, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
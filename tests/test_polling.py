@@ -0,0 +1,96 @@
+import unittest
+
+import httpx
+
+from sns_agent.polling import AdaptivePollInterval
+from sns_agent.proxy_client import ProxyHttpClient, RateLimitState
+
+
+def make_interval(**kwargs):
+    options = {
+        "initial_seconds": 20.0,
+        "min_seconds": 5.0,
+        "max_seconds": 120.0,
+        "backoff_factor": 2.0,
+        "rate_limit_reserve": 10,
+        "clock": lambda: 1000.0,
+    }
+    options.update(kwargs)
+    return AdaptivePollInterval(**options)
+
+
+class AdaptivePollIntervalTests(unittest.TestCase):
+    def test_new_work_tightens_to_floor(self):
+        interval = make_interval()
+
+        self.assertEqual(interval.after_poll(3), 5.0)
+
+    def test_idle_polls_back_off_to_ceiling(self):
+        interval = make_interval()
+
+        delays = [interval.after_poll(0) for _ in range(5)]
+
+        self.assertEqual(delays, [40.0, 80.0, 120.0, 120.0, 120.0])
+        self.assertEqual(interval.after_poll(1), 5.0)
+
+    def test_errors_back_off(self):
+        interval = make_interval()
+        interval.after_poll(1)
+
+        self.assertEqual(interval.after_error(), 10.0)
+        self.assertEqual(interval.after_error(), 20.0)
+
+    def test_retry_after_overrides_short_interval(self):
+        interval = make_interval()
+
+        delay = interval.after_error(RateLimitState(retry_after_until=1300.0))
+
+        self.assertEqual(delay, 300.0)
+
+    def test_low_remaining_budget_waits_for_reset(self):
+        interval = make_interval()
+
+        self.assertEqual(interval.after_poll(1, RateLimitState(remaining=3, reset_at=1090.0)), 90.0)
+        self.assertEqual(interval.after_poll(1, RateLimitState(remaining=50, reset_at=1090.0)), 5.0)
+
+
+class RateLimitParsingTests(unittest.IsolatedAsyncioTestCase):
+    async def test_records_rate_limit_headers_before_raising(self):
+        def handler(request):
+            return httpx.Response(
+                429,
+                headers={
+                    "Retry-After": "30",
+                    "X-RateLimit-Remaining": "0",
+                    "X-RateLimit-Reset": "2026-01-01T00:00:00.000Z",
+                },
+            )
+
+        client = ProxyHttpClient("http://proxy.test")
+        client._client = httpx.AsyncClient(base_url="http://proxy.test", transport=httpx.MockTransport(handler))
+        try:
+            with self.assertRaises(httpx.HTTPStatusError):
+                await client.request("GET", "/api/v1/notifications")
+        finally:
+            await client.aclose()
+
+        state = client.rate_limit
+        self.assertEqual(state.remaining, 0)
+        self.assertEqual(state.reset_at, 1767225600.0)
+        self.assertIsNotNone(state.retry_after_until)
+
+    async def test_retry_after_accepts_http_date(self):
+        client = ProxyHttpClient("http://proxy.test")
+        try:
+            client._observe_rate_limit(
+                httpx.Response(429, headers={"Retry-After": "Thu, 01 Jan 2026 00:00:30 GMT"}),
+                now=0.0,
+            )
+        finally:
+            await client.aclose()
+
+        self.assertEqual(client.rate_limit.retry_after_until, 1767225630.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -3,7 +3,7 @@ from unittest.mock import AsyncMock
 
 from sns_agent.publisher import Publisher
 from sns_agent.schemas import GeneratedImage
-from sns_agent.schemas import AgentResponse, NormalizedPost, PublishResult
+from sns_agent.schemas import AgentResponse, NormalizedPost, PublishResult, UploadedMedia
 
 
 class DummySocialClient:
@@ -107,6 +107,46 @@ class PublisherTests(unittest.TestCase):
 
         asyncio.run(run_test())
 
+    def test_publish_reuses_uploaded_media_and_reports_new_uploads(self):
+        social = DummySocialClient()
+        media_host = DummyMediaHostClient()
+        publisher = Publisher(social, media_host)
+        post = NormalizedPost(
+            post_id="1",
+            author_handle="alice",
+            author_display_name="Alice",
+            parent_post_id=None,
+            raw_content="",
+            plain_text="@bot hi",
+            llm_text="hi",
+            command_text="hi",
+            leading_mentions=[],
+            inline_mentions=[],
+            expanded_urls=[],
+            media=[],
+            created_at=None,
+        )
+        response = AgentResponse(
+            text="",
+            images=[GeneratedImage(content=b"png", filename="image.png", mime_type="image/png")],
+        )
+        recorded: list[UploadedMedia] = []
+
+        async def record(uploaded: UploadedMedia) -> None:
+            recorded.append(uploaded)
+
+        async def run_test() -> None:
+            await publisher.publish(response, post, on_media_uploaded=record)
+            self.assertEqual(recorded, [UploadedMedia(hosted_media_url="https://media.example/m/abc")])
+            await publisher.publish(response, post, uploaded=recorded[0], on_media_uploaded=record)
+            media_host.create_page.assert_awaited_once()
+            self.assertEqual(len(recorded), 1)
+            self.assertEqual(social.publish_reply.await_count, 2)
+
+        import asyncio
+
+        asyncio.run(run_test())
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -1,12 +1,57 @@
 import asyncio
+import json
 import tempfile
+import threading
 import time
 import unittest
 from pathlib import Path
 from unittest.mock import AsyncMock, MagicMock, patch
 
-from sns_agent.schemas import AgentResponse, MediaAttachment, NotificationItem, NormalizedPost
-from sns_agent.service import AgentService, NotificationRetryState
+from sns_agent.schemas import (
+    AgentResponse,
+    CommandEnvelope,
+    GeneratedImage,
+    MediaAttachment,
+    NotificationItem,
+    NormalizedPost,
+    PublishResult,
+    UploadedMedia,
+)
+from sns_agent.lanes import CONVERSATION_LANE, GPU_MEDIA_LANE, AdmissionLane
+from sns_agent.polling import AdaptivePollInterval
+from sns_agent.proxy_client import ProxyHttpClient, RateLimitState
+from sns_agent.service import NOTIFICATION_CURSOR, NOTIFICATION_GAPS_CURSOR, AgentService
+from sns_agent.truthsocial import TruthSocialClient
+
+
+class FakeNotificationStreamServer:
+    def __init__(self):
+        self.events: asyncio.Queue[dict | None] = asyncio.Queue()
+        self.connections = 0
+        self.url = ""
+        self._server: asyncio.AbstractServer | None = None
+
+    async def start(self) -> None:
+        self._server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+        port = self._server.sockets[0].getsockname()[1]
+        self.url = f"http://127.0.0.1:{port}"
+
+    async def close(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.connections += 1
+        await reader.readuntil(b"\r\n\r\n")
+        writer.write(
+            b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\nConnection: close\r\n\r\n: connected\n\n"
+        )
+        await writer.drain()
+        while (payload := await self.events.get()) is not None:
+            writer.write(f"event: notification\ndata: {json.dumps(payload)}\n\n".encode("utf-8"))
+            await writer.drain()
+        writer.close()
 
 
 class ServiceConcurrencyTests(unittest.IsolatedAsyncioTestCase):
@@ -22,9 +67,12 @@ class ServiceConcurrencyTests(unittest.IsolatedAsyncioTestCase):
             "STATE_DB_PATH": str(Path(self._temp_dir.name) / "state.db"),
             "NOTIFICATION_MAX_CONCURRENCY": "8",
             "GPU_TASK_MAX_CONCURRENCY": "1",
+            "GPU_MEDIA_LANE_MAX_CONCURRENCY": "1",
+            "RESPONSE_CHECKPOINT_DIR": str(Path(self._temp_dir.name) / "checkpoints"),
         }
         proxy = MagicMock()
         proxy.aclose = AsyncMock()
+        proxy.rate_limit = RateLimitState()
         responder = MagicMock()
         responder.aclose = AsyncMock()
         image_generator = MagicMock()
@@ -49,11 +97,14 @@ class ServiceConcurrencyTests(unittest.IsolatedAsyncioTestCase):
 
     async def test_poll_once_schedules_notifications_without_waiting_for_completion(self):
         service = self._build_service()
-        service._social.fetch_notifications = AsyncMock(
-            return_value=[
-                NotificationItem("1", "p1", "mention", "alice", {}),
-                NotificationItem("2", "p2", "mention", "bob", {}),
-            ]
+        service._social.fetch_notification_range = AsyncMock(
+            return_value=(
+                [
+                    NotificationItem("1", "p1", "mention", "alice", {}),
+                    NotificationItem("2", "p2", "mention", "bob", {}),
+                ],
+                None,
+            )
         )
         gate = asyncio.Event()
 
@@ -74,11 +125,14 @@ class ServiceConcurrencyTests(unittest.IsolatedAsyncioTestCase):
 
     async def test_poll_once_skips_inflight_duplicate_notifications(self):
         service = self._build_service()
-        service._social.fetch_notifications = AsyncMock(
-            return_value=[
-                NotificationItem("1", "p1", "mention", "alice", {}),
-                NotificationItem("1", "p1", "mention", "alice", {}),
-            ]
+        service._social.fetch_notification_range = AsyncMock(
+            return_value=(
+                [
+                    NotificationItem("1", "p1", "mention", "alice", {}),
+                    NotificationItem("1", "p1", "mention", "alice", {}),
+                ],
+                None,
+            )
         )
         gate = asyncio.Event()
 
@@ -93,10 +147,83 @@ class ServiceConcurrencyTests(unittest.IsolatedAsyncioTestCase):
         gate.set()
         await asyncio.gather(*list(service._notification_tasks))
 
+    @staticmethod
+    async def _wait_until(predicate) -> None:
+        for _ in range(400):
+            if predicate():
+                return
+            await asyncio.sleep(0.01)
+        raise AssertionError("condition was not met")
+
+    async def test_stream_notifications_are_queued_without_polling(self):
+        server = FakeNotificationStreamServer()
+        await server.start()
+        self.addAsyncCleanup(server.close)
+        service = self._build_service()
+        service._proxy = ProxyHttpClient(server.url)
+        self.addAsyncCleanup(service._proxy.aclose)
+        service._social = TruthSocialClient(service._proxy)
+        service._stream_retry_seconds = 0.1
+        handled = asyncio.Event()
+
+        async def handle(notification_id: str, post_id: str) -> None:
+            handled.set()
+
+        service._handle_notification = AsyncMock(side_effect=handle)
+        stream_task = asyncio.create_task(service.consume_notification_stream())
+        self.addAsyncCleanup(self._cancel, stream_task)
+
+        await self._wait_until(lambda: service._stream_connected)
+        await server.events.put({"id": "21", "type": "mention", "account": {"acct": "alice"}, "status": {"id": "p21"}})
+        await asyncio.wait_for(handled.wait(), timeout=2)
+
+        service._handle_notification.assert_awaited_once_with("21", "p21")
+        self.assertIsNone(service._state.get_cursor(NOTIFICATION_CURSOR))
+        await asyncio.gather(*list(service._notification_tasks))
+        self.assertEqual(service.queue_stats().get("done"), 1)
+
+        service._poll_wakeup.clear()
+        await server.events.put(None)
+        await self._wait_until(lambda: not service._stream_connected)
+        self.assertTrue(service._poll_wakeup.is_set())
+        await self._wait_until(lambda: server.connections == 2 and service._stream_connected)
+
+    async def test_run_forever_reconciles_when_stream_connects_and_drops(self):
+        service = self._build_service()
+        service._poll_interval = AdaptivePollInterval(initial_seconds=60, min_seconds=60, max_seconds=60)
+        service._reconcile_seconds = 600
+        service.poll_once = AsyncMock(return_value=0)
+        connected = asyncio.Event()
+        drop = asyncio.Event()
+
+        async def stream() -> None:
+            await connected.wait()
+            service._set_stream_connected(True)
+            await drop.wait()
+            service._set_stream_connected(False)
+            await asyncio.Event().wait()
+
+        service.consume_notification_stream = stream
+        runner = asyncio.create_task(service.run_forever())
+        self.addAsyncCleanup(self._cancel, runner)
+
+        await self._wait_until(lambda: service.poll_once.await_count == 1)
+        connected.set()
+        await self._wait_until(lambda: service.poll_once.await_count == 2)
+        drop.set()
+        await self._wait_until(lambda: service.poll_once.await_count == 3)
+        await asyncio.sleep(0.05)
+        self.assertEqual(service.poll_once.await_count, 3)
+
+    @staticmethod
+    async def _cancel(task: asyncio.Task) -> None:
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
     async def test_aclose_cancels_inflight_notification_tasks(self):
         service = self._build_service()
-        service._social.fetch_notifications = AsyncMock(
-            return_value=[NotificationItem("1", "p1", "mention", "alice", {})]
+        service._social.fetch_notification_range = AsyncMock(
+            return_value=([NotificationItem("1", "p1", "mention", "alice", {})], None)
         )
 
         async def handle(notification_id: str, post_id: str) -> None:
@@ -110,7 +237,7 @@ class ServiceConcurrencyTests(unittest.IsolatedAsyncioTestCase):
         await service.aclose()
 
         self.assertEqual(len(service._notification_tasks), 0)
-        self.assertEqual(service._inflight_notification_ids, set())
+        self.assertEqual(service._inflight_lanes, {})
         service._proxy.aclose.assert_awaited_once()
         service._responder.aclose.assert_awaited_once()
         service._image_generator.aclose.assert_awaited_once()
@@ -144,30 +271,385 @@ class ServiceConcurrencyTests(unittest.IsolatedAsyncioTestCase):
         self.assertIn("received prompt", captured.output[0])
         self.assertIn("hello", captured.output[0])
 
-    async def test_poll_once_skips_notifications_in_backoff(self):
+    async def test_poll_once_requests_only_notifications_newer_than_cursor(self):
+        service = self._build_service()
+        service._state.set_cursor("notifications", "10")
+        service._social.fetch_notification_range = AsyncMock(return_value=([], None))
+
+        await service.poll_once()
+
+        service._social.fetch_notification_range.assert_awaited_once_with(since_id="10")
+        self.assertEqual(service._state.get_cursor("notifications"), "10")
+
+    async def test_poll_once_reads_state_store_off_the_event_loop(self):
         service = self._build_service()
-        service._notification_retry_states["1"] = NotificationRetryState(
-            failures=1,
-            next_attempt_at=time.monotonic() + 60,
+        service._social.fetch_notification_range = AsyncMock(
+            return_value=([NotificationItem("1", "p1", "mention", "alice", {})], None)
+        )
+        service._handle_notification = AsyncMock()
+        reader_threads: list[str] = []
+
+        def record(method):
+            def wrapper(*args, **kwargs):
+                reader_threads.append(f"{method.__name__}:{threading.current_thread() is threading.main_thread()}")
+                return method(*args, **kwargs)
+
+            return wrapper
+
+        service._state.get_cursor = record(service._state.get_cursor)
+        service._state.filter_unprocessed = record(service._state.filter_unprocessed)
+
+        await service.poll_once()
+        await asyncio.gather(*list(service._notification_tasks))
+
+        self.assertEqual(
+            sorted(reader_threads),
+            ["filter_unprocessed:False", "get_cursor:False", "get_cursor:False"],
         )
-        service._social.fetch_notifications = AsyncMock(
-            return_value=[NotificationItem("1", "p1", "mention", "alice", {})]
+
+    async def test_poll_once_advances_cursor_past_durably_queued_notifications(self):
+        service = self._build_service()
+        service._state.mark_processed("11")
+        service._state.mark_processed("12")
+        service._social.fetch_notification_range = AsyncMock(
+            return_value=(
+                [
+                    NotificationItem("13", "p13", "mention", "carol", {}),
+                    NotificationItem("12", "p12", "mention", "bob", {}),
+                    NotificationItem("11", "p11", "mention", "alice", {}),
+                ],
+                None,
+            )
+        )
+        gate = asyncio.Event()
+
+        async def handle(notification_id: str, post_id: str) -> None:
+            await gate.wait()
+
+        service._handle_notification = AsyncMock(side_effect=handle)
+
+        await service.poll_once()
+
+        self.assertEqual(service._state.get_cursor("notifications"), "13")
+        self.assertEqual(service.queue_stats(), {"leased": 1})
+        gate.set()
+        await asyncio.gather(*list(service._notification_tasks))
+
+    async def test_poll_once_resumes_truncated_backfill_on_later_polls(self):
+        service = self._build_service()
+        service._state.set_cursor(NOTIFICATION_CURSOR, "10")
+        service._spawn_notification_task = MagicMock()
+        service._social.fetch_notification_range = AsyncMock(
+            side_effect=[
+                ([NotificationItem("30", "p30", "mention", "alice", {})], "30"),
+                ([NotificationItem("29", "p29", "mention", "bob", {})], "29"),
+                ([NotificationItem("31", "p31", "mention", "carol", {})], None),
+                ([NotificationItem("11", "p11", "mention", "dave", {})], None),
+                ([], None),
+            ]
         )
-        service._spawn_notification_task = AsyncMock()
 
         await service.poll_once()
+        self.assertEqual(service._state.get_cursor(NOTIFICATION_CURSOR), "30")
+        self.assertEqual(json.loads(service._state.get_cursor(NOTIFICATION_GAPS_CURSOR)), [["10", "29"]])
 
-        service._spawn_notification_task.assert_not_awaited()
+        await service.poll_once()
+        await service.poll_once()
+
+        calls = [call.kwargs for call in service._social.fetch_notification_range.await_args_list]
+        self.assertEqual(
+            calls,
+            [
+                {"since_id": "10"},
+                {"since_id": "10", "max_id": "30"},
+                {"since_id": "30"},
+                {"since_id": "10", "max_id": "29"},
+                {"since_id": "31"},
+            ],
+        )
+        self.assertEqual(service._state.get_cursor(NOTIFICATION_CURSOR), "31")
+        self.assertEqual(json.loads(service._state.get_cursor(NOTIFICATION_GAPS_CURSOR)), [])
+        self.assertEqual(sum(service.queue_stats().values()), 4)
+
+    async def test_poll_once_skips_notifications_in_backoff(self):
+        service = self._build_service()
+        service._state.enqueue_notifications([("1", "p1")])
+        service._state.lease_notifications(service._worker_id, limit=1, lease_seconds=60)
+        service._state.fail_notification("1", service._worker_id, retry_at=time.time() + 60, error="boom")
+        service._social.fetch_notification_range = AsyncMock(
+            return_value=([NotificationItem("1", "p1", "mention", "alice", {})], None)
+        )
+        service._spawn_notification_task = MagicMock()
+
+        await service.poll_once()
+
+        service._spawn_notification_task.assert_not_called()
+        self.assertEqual(service.queue_stats(), {"pending": 1})
 
     async def test_run_notification_task_records_backoff_after_failure(self):
         service = self._build_service()
         service._handle_notification = AsyncMock(side_effect=RuntimeError("boom"))
+        service._state.enqueue_notifications([("1", "p1")])
+        [item] = service._state.lease_notifications(service._worker_id, limit=1, lease_seconds=60)
+
+        await service._run_notification_task("1", "p1", attempts=item.attempts)
+
+        self.assertEqual(service.queue_stats(), {"pending": 1})
+        self.assertEqual(service._state.lease_notifications("other", limit=1, lease_seconds=60), [])
+        [retried] = service._state.lease_notifications("other", limit=1, lease_seconds=60, now=time.time() + 31)
+        self.assertEqual(retried.attempts, 2)
+
+    async def test_failed_notification_is_retried_without_another_poll(self):
+        service = self._build_service()
+        service._notification_retry_base_seconds = 0.05
+        service._social.fetch_notification_range = AsyncMock(
+            return_value=([NotificationItem("1", "p1", "mention", "alice", {})], None)
+        )
+        service._handle_notification = AsyncMock(side_effect=[RuntimeError("boom"), None])
 
-        await service._run_notification_task("1", "p1")
+        await service.poll_once()
+        await asyncio.wait_for(self._wait_for_queue(service, {"done": 1}), timeout=2)
+
+        self.assertEqual(service._social.fetch_notification_range.await_count, 1)
+        self.assertEqual(service._handle_notification.await_count, 2)
+        await service.aclose()
+
+    async def test_expired_lease_from_another_worker_is_picked_up_without_another_poll(self):
+        service = self._build_service()
+        service._state.enqueue_notifications([("1", "p1")])
+        service._state.lease_notifications("dead-worker", limit=1, lease_seconds=0.05)
+        service._handle_notification = AsyncMock()
+
+        await service._dispatch_queued_notifications()
+        await asyncio.wait_for(self._wait_for_queue(service, {"done": 1}), timeout=2)
+
+        service._handle_notification.assert_awaited_once_with("1", "p1")
+        await service.aclose()
 
-        state = service._notification_retry_states["1"]
-        self.assertEqual(state.failures, 1)
-        self.assertGreater(state.next_attempt_at, time.monotonic())
+    async def _wait_for_queue(self, service: AgentService, expected: dict[str, int]) -> None:
+        while service.queue_stats() != expected:
+            await asyncio.sleep(0.01)
+
+    async def test_exhausted_notification_is_dead_lettered(self):
+        service = self._build_service()
+        service._notification_failure_max_retries = 0
+        service._handle_notification = AsyncMock(side_effect=RuntimeError("boom"))
+        service._state.enqueue_notifications([("1", "p1")])
+        [item] = service._state.lease_notifications(service._worker_id, limit=1, lease_seconds=60)
+
+        await service._run_notification_task("1", "p1", attempts=item.attempts)
+
+        self.assertEqual(service.queue_stats(), {"dead": 1})
+
+    async def test_two_workers_share_queue_without_double_handling(self):
+        first = self._build_service()
+        second = self._build_service()
+        notifications = [NotificationItem(str(index), f"p{index}", "mention", "alice", {}) for index in range(1, 7)]
+        handled: list[str] = []
+        for service in (first, second):
+            service._lanes[CONVERSATION_LANE] = AdmissionLane(CONVERSATION_LANE, 3)
+            service._social.fetch_notification_range = AsyncMock(return_value=(notifications, None))
+
+            async def handle(notification_id: str, post_id: str) -> None:
+                handled.append(notification_id)
+
+            service._handle_notification = AsyncMock(side_effect=handle)
+
+        await first.poll_once()
+        await second.poll_once()
+        await asyncio.gather(*first._notification_tasks, *second._notification_tasks)
+
+        self.assertEqual(sorted(handled, key=int), [str(index) for index in range(1, 7)])
+        self.assertEqual(first.queue_stats(), {"done": 6})
+
+    async def test_cancelled_task_releases_lease_for_other_workers(self):
+        service = self._build_service()
+        service._social.fetch_notification_range = AsyncMock(
+            return_value=([NotificationItem("1", "p1", "mention", "alice", {})], None)
+        )
+
+        async def handle(notification_id: str, post_id: str) -> None:
+            await asyncio.sleep(10)
+
+        service._handle_notification = AsyncMock(side_effect=handle)
+        await service.poll_once()
+        await asyncio.sleep(0)
+        [task] = list(service._notification_tasks)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+        [item] = service._state.lease_notifications("other", limit=1, lease_seconds=60)
+        self.assertEqual((item.notification_id, item.attempts), ("1", 1))
+
+    async def test_gpu_command_burst_does_not_block_conversational_reply(self):
+        service = self._build_service()
+        service._image_generator.runs_on_gpu = True
+        posts = {
+            "p1": self._post("p1", "/image_gen\n\ncat"),
+            "p2": self._post("p2", "/image_gen\n\ndog"),
+            "p3": self._post("p3", "/image_gen\n\nfox"),
+            "p4": self._post("p4", "hello"),
+        }
+        service._social.fetch_status = AsyncMock(side_effect=lambda post_id: posts[post_id])
+        service._social.fetch_ancestor_chain = AsyncMock(side_effect=lambda post: [post])
+        service._social.fetch_notification_range = AsyncMock(
+            return_value=([NotificationItem(post_id[1:], post_id, "mention", "alice", {}) for post_id in posts], None)
+        )
+        gate = asyncio.Event()
+
+        async def generate(request):
+            await gate.wait()
+            return []
+
+        service._image_generator.generate = AsyncMock(side_effect=generate)
+        service._responder.respond = AsyncMock(return_value=AgentResponse(text="reply"))
+        replied = asyncio.Event()
+
+        async def publish(response, post, **kwargs):
+            if response.text:
+                replied.set()
+            return PublishResult("status", {})
+
+        service._publisher.publish = AsyncMock(side_effect=publish)
+
+        await service.poll_once()
+        await asyncio.wait_for(replied.wait(), timeout=1.0)
+
+        stats = service.lane_stats()
+        self.assertEqual(stats["conversation"].admitted, 1)
+        self.assertEqual((stats["gpu_media"].active, stats["gpu_media"].queued), (1, 2))
+        gate.set()
+        await asyncio.gather(*list(service._notification_tasks))
+        self.assertEqual(service.lane_stats()["gpu_media"].admitted, 3)
+
+    async def test_queued_gpu_commands_beyond_lane_capacity_do_not_hold_conversation_leases(self):
+        service = self._build_service()
+        service._image_generator.runs_on_gpu = True
+        lane_capacity = sum(lane.stats().max_concurrency for lane in service._lanes.values())
+        texts = {f"p{index}": "/image_gen\n\ncat" for index in range(1, lane_capacity + 1)}
+        texts[f"p{lane_capacity + 1}"] = "hello"
+        posts = {post_id: self._post(post_id, text) for post_id, text in texts.items()}
+
+        def notification(post_id: str) -> NotificationItem:
+            status = {
+                "id": post_id,
+                "content": f"<p>@bot {texts[post_id].replace(chr(10), '<br>')}</p>",
+                "account": {"acct": "alice"},
+            }
+            return NotificationItem(post_id[1:], post_id, "mention", "alice", {"id": post_id[1:], "status": status})
+
+        service._social.fetch_status = AsyncMock(side_effect=lambda post_id: posts[post_id])
+        service._social.fetch_ancestor_chain = AsyncMock(side_effect=lambda post: [post])
+        service._social.fetch_notification_range = AsyncMock(
+            return_value=([notification(post_id) for post_id in posts], None)
+        )
+        gate = asyncio.Event()
+
+        async def generate(request):
+            await gate.wait()
+            return []
+
+        service._image_generator.generate = AsyncMock(side_effect=generate)
+        service._responder.respond = AsyncMock(return_value=AgentResponse(text="reply"))
+        replied = asyncio.Event()
+
+        async def publish(response, post, **kwargs):
+            if response.text == "reply":
+                replied.set()
+            return PublishResult("status", {})
+
+        service._publisher.publish = AsyncMock(side_effect=publish)
+
+        await service.poll_once()
+        await asyncio.wait_for(replied.wait(), timeout=1.0)
+        [reply_task] = [task for task in service._notification_tasks if task.get_name() == f"notification:{lane_capacity + 1}"]
+        await reply_task
+
+        stats = service.lane_stats()
+        self.assertEqual(stats[CONVERSATION_LANE].admitted, 1)
+        self.assertEqual((stats[GPU_MEDIA_LANE].active, stats[GPU_MEDIA_LANE].queued), (1, 0))
+        self.assertEqual(service.queue_stats(), {"leased": 1, "pending": lane_capacity - 1, "done": 1})
+        gate.set()
+        while service._notification_tasks or (service._dispatch_task and not service._dispatch_task.done()):
+            await asyncio.gather(*filter(None, [service._dispatch_task, *service._notification_tasks]))
+        self.assertEqual(service.queue_stats(), {"done": lane_capacity + 1})
+        self.assertEqual(service.lane_stats()[GPU_MEDIA_LANE].max_concurrency, 1)
+
+    async def test_commands_use_api_media_lane_when_not_on_gpu(self):
+        service = self._build_service()
+        service._image_generator.runs_on_gpu = False
+
+        self.assertEqual(service._notification_lane(None), "conversation")
+        self.assertEqual(service._notification_lane(CommandEnvelope("image_gen", {}, "cat")), "api_media")
+        self.assertEqual(service._notification_lane(CommandEnvelope("video", {}, "cat")), "api_media")
+        service._image_generator.runs_on_gpu = True
+        self.assertEqual(service._notification_lane(CommandEnvelope("image_edit", {}, "cat")), "gpu_media")
+
+    async def test_retry_after_publish_failure_resumes_from_generated_checkpoint(self):
+        service = self._build_service()
+        post = self._post("p1", "/image_gen\n\ncat")
+        service._social.fetch_status = AsyncMock(return_value=post)
+        service._social.fetch_ancestor_chain = AsyncMock(return_value=[post])
+        image = GeneratedImage(content=b"png-bytes", filename="sdxl-1.png")
+        service._image_generator.generate = AsyncMock(return_value=[image])
+        uploaded = UploadedMedia(hosted_media_url="https://media.example/m/abc")
+
+        async def publish(response, target_post, *, uploaded=None, on_media_uploaded=None):
+            if uploaded is None:
+                uploaded = UploadedMedia(hosted_media_url="https://media.example/m/abc")
+                await on_media_uploaded(uploaded)
+                raise RuntimeError("reply failed")
+            return PublishResult("status-1", {})
+
+        service._publisher.publish = AsyncMock(side_effect=publish)
+
+        await service._run_notification_task("n1", "p1")
+        checkpoint = service._checkpoints.load("n1")
+        self.assertEqual(checkpoint.stage, "uploaded")
+        self.assertEqual(checkpoint.response.images[0].content, b"png-bytes")
+
+        await service._run_notification_task("n1", "p1")
+
+        service._image_generator.generate.assert_awaited_once()
+        resumed = service._publisher.publish.await_args
+        self.assertEqual(resumed.kwargs["uploaded"], uploaded)
+        self.assertEqual(resumed.args[0].images[0].content, b"png-bytes")
+        self.assertTrue(service._state.is_processed("n1"))
+        self.assertIsNone(service._checkpoints.load("n1"))
+
+    async def test_published_checkpoint_is_not_replied_twice(self):
+        service = self._build_service()
+        post = self._post("p1", "hello")
+        service._social.fetch_status = AsyncMock(return_value=post)
+        service._social.fetch_ancestor_chain = AsyncMock(return_value=[post])
+        service._responder.respond = AsyncMock()
+        service._publisher.publish = AsyncMock()
+        checkpoint = service._checkpoints.save_response("n1", AgentResponse(text="reply"))
+        service._checkpoints.save_published(checkpoint, "status-1")
+
+        await service._handle_notification("n1", "p1")
+
+        service._responder.respond.assert_not_awaited()
+        service._publisher.publish.assert_not_awaited()
+        self.assertTrue(service._state.is_processed("n1"))
+
+    @staticmethod
+    def _post(post_id: str, command_text: str) -> NormalizedPost:
+        return NormalizedPost(
+            post_id=post_id,
+            author_handle="alice",
+            author_display_name="Alice",
+            parent_post_id=None,
+            raw_content="",
+            plain_text=command_text,
+            llm_text=command_text,
+            command_text=command_text,
+            leading_mentions=[],
+            inline_mentions=[],
+            expanded_urls=[],
+            media=[],
+            created_at=None,
+        )
 
     async def test_handle_image_edit_command_collects_attached_images(self):
         service = self._build_service()
@@ -0,0 +1,143 @@
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+
+from sns_agent.state_store import StateStore
+
+
+class StateStoreTests(unittest.TestCase):
+    def setUp(self):
+        self._temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self._temp_dir.cleanup)
+        self.store = StateStore(Path(self._temp_dir.name) / "state.db")
+        self.addCleanup(self.store.close)
+
+    def test_uses_wal_journal_mode(self):
+        with self.store._connect() as conn:
+            mode = conn.execute("PRAGMA journal_mode").fetchone()[0]
+        self.assertEqual(mode, "wal")
+
+    def test_filter_unprocessed_returns_unseen_ids_in_order(self):
+        self.store.mark_processed("2")
+        self.store.mark_processed("4")
+
+        self.assertEqual(self.store.filter_unprocessed(["5", "4", "3", "2", "1", "3"]), ["5", "3", "1"])
+
+    def test_filter_unprocessed_handles_batches_larger_than_variable_limit(self):
+        ids = [str(index) for index in range(2500)]
+        for notification_id in ids[::2]:
+            self.store.mark_processed(notification_id)
+
+        self.assertEqual(self.store.filter_unprocessed(ids), ids[1::2])
+
+    def test_cursor_round_trip(self):
+        self.assertIsNone(self.store.get_cursor("notifications"))
+        self.store.set_cursor("notifications", "10")
+        self.store.set_cursor("notifications", "12")
+        self.assertEqual(self.store.get_cursor("notifications"), "12")
+
+    def test_close_rejects_further_use(self):
+        self.store.close()
+        with self.assertRaisesRegex(RuntimeError, "closed"):
+            self.store.is_processed("1")
+
+
+class NotificationQueueTests(unittest.TestCase):
+    def setUp(self):
+        self._temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self._temp_dir.cleanup)
+        self.db_path = Path(self._temp_dir.name) / "state.db"
+        self.store = StateStore(self.db_path)
+        self.addCleanup(self.store.close)
+
+    def test_enqueue_ignores_duplicates_and_leases_oldest_first(self):
+        self.assertEqual(self.store.enqueue_notifications([("10", "p10"), ("9", "p9")], now=100.0), 2)
+        self.assertEqual(self.store.enqueue_notifications([("9", "p9")], now=101.0), 0)
+
+        leased = self.store.lease_notifications("worker-a", limit=5, lease_seconds=30, now=100.0)
+
+        self.assertEqual(
+            [(item.notification_id, item.post_id, item.attempts) for item in leased],
+            [("9", "p9", 1), ("10", "p10", 1)],
+        )
+        self.assertEqual(self.store.lease_notifications("worker-b", limit=5, lease_seconds=30, now=110.0), [])
+
+    def test_lease_can_be_limited_to_one_lane(self):
+        self.store.enqueue_notifications([("1", "p1", "gpu_media"), ("2", "p2", "gpu_media"), ("3", "p3")], now=100.0)
+
+        [item] = self.store.lease_notifications("worker-a", limit=1, lease_seconds=30, lane="conversation", now=100.0)
+        self.assertEqual((item.notification_id, item.lane), ("3", "conversation"))
+        leased = self.store.lease_notifications("worker-a", limit=5, lease_seconds=30, lane="gpu_media", now=100.0)
+        self.assertEqual([(item.notification_id, item.lane) for item in leased], [("1", "gpu_media"), ("2", "gpu_media")])
+        self.assertEqual(self.store.notification_queue_counts(), {"leased": 3})
+
+    def test_expired_lease_becomes_visible_to_other_workers(self):
+        self.store.enqueue_notifications([("1", "p1")], now=100.0)
+        self.store.lease_notifications("worker-a", limit=1, lease_seconds=30, now=100.0)
+
+        self.assertTrue(self.store.heartbeat_notification("1", "worker-a", lease_seconds=30, now=120.0))
+        self.assertEqual(self.store.lease_notifications("worker-b", limit=1, lease_seconds=30, now=140.0), [])
+        [item] = self.store.lease_notifications("worker-b", limit=1, lease_seconds=30, now=151.0)
+
+        self.assertEqual(item.attempts, 2)
+        self.assertFalse(self.store.heartbeat_notification("1", "worker-a", lease_seconds=30, now=152.0))
+        self.assertFalse(self.store.complete_notification("1", "worker-a"))
+        self.assertTrue(self.store.complete_notification("1", "worker-b"))
+        self.assertTrue(self.store.is_processed("1"))
+
+    def test_failure_schedules_retry_or_dead_letters(self):
+        self.store.enqueue_notifications([("1", "p1"), ("2", "p2")], now=100.0)
+        self.store.lease_notifications("worker-a", limit=2, lease_seconds=30, now=100.0)
+
+        self.store.fail_notification("1", "worker-a", retry_at=160.0, error="boom", now=101.0)
+        self.store.fail_notification("2", "worker-a", retry_at=None, error="boom", now=101.0)
+
+        self.assertEqual(self.store.notification_queue_counts(), {"pending": 1, "dead": 1})
+        self.assertEqual(self.store.lease_notifications("worker-a", limit=2, lease_seconds=30, now=159.0), [])
+        [item] = self.store.lease_notifications("worker-a", limit=2, lease_seconds=30, now=160.0)
+        self.assertEqual((item.notification_id, item.attempts), ("1", 2))
+
+    def test_next_due_covers_backoff_and_other_workers_leases(self):
+        self.store.enqueue_notifications([("1", "p1"), ("2", "p2"), ("3", "p3")], now=100.0)
+        self.store.lease_notifications("worker-a", limit=1, lease_seconds=30, now=100.0)
+        self.store.lease_notifications("worker-b", limit=2, lease_seconds=90, now=100.0)
+        self.store.fail_notification("1", "worker-a", retry_at=160.0, error="boom", now=101.0)
+
+        self.assertEqual(self.store.next_notification_due("worker-a", now=101.0), 160.0)
+        self.assertEqual(self.store.next_notification_due("worker-a", now=160.0), 190.0)
+        self.assertIsNone(self.store.next_notification_due("worker-b", now=160.0))
+
+    def test_release_returns_work_without_counting_an_attempt(self):
+        self.store.enqueue_notifications([("1", "p1")], now=100.0)
+        self.store.lease_notifications("worker-a", limit=1, lease_seconds=30, now=100.0)
+
+        self.assertTrue(self.store.release_notification("1", "worker-a", now=101.0))
+
+        [item] = self.store.lease_notifications("worker-b", limit=1, lease_seconds=30, now=101.0)
+        self.assertEqual(item.attempts, 1)
+
+    def test_concurrent_workers_never_lease_the_same_notification(self):
+        self.store.enqueue_notifications([(str(index), f"p{index}") for index in range(200)])
+        leased: dict[str, list[str]] = {}
+
+        def work(owner: str) -> None:
+            store = StateStore(self.db_path)
+            try:
+                while batch := store.lease_notifications(owner, limit=3, lease_seconds=60):
+                    leased.setdefault(owner, []).extend(item.notification_id for item in batch)
+            finally:
+                store.close()
+
+        threads = [threading.Thread(target=work, args=(f"worker-{index}",)) for index in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(timeout=10)
+
+        claimed = [notification_id for ids in leased.values() for notification_id in ids]
+        self.assertEqual(sorted(claimed, key=int), [str(index) for index in range(200)])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,9 +1,25 @@
+import asyncio
 import unittest
 from unittest.mock import AsyncMock, MagicMock, patch
 
+import httpx
+
+from sns_agent.proxy_client import ProxyHttpClient
 from sns_agent.truthsocial import TruthSocialClient
 
 
+def _status(post_id: str, parent_id: str | None = None, *, text: str = "hello", edited_at: str | None = None) -> dict:
+    return {
+        "id": post_id,
+        "content": f"<p>{text}</p>",
+        "account": {"acct": "alice", "display_name": "Alice"},
+        "in_reply_to_id": parent_id,
+        "media_attachments": [],
+        "created_at": "2026-04-18T00:00:00Z",
+        "edited_at": edited_at,
+    }
+
+
 class TruthSocialClientTests(unittest.IsolatedAsyncioTestCase):
     async def test_fetch_status_expands_media_host_page_into_media_attachments(self):
         proxy = MagicMock()
@@ -18,17 +34,22 @@ class TruthSocialClientTests(unittest.IsolatedAsyncioTestCase):
                     "created_at": "2026-04-18T00:00:00Z",
                 },
                 {
-                    "page_id": "abc",
-                    "public_url": "http://media.example/m/abc",
-                    "og_image_url": "http://media.example/og/abc.png",
-                    "items": [
-                        {
-                            "filename": "1-cat.png",
-                            "mime_type": "image/png",
-                            "kind": "image",
-                            "url": "http://media.example/media/abc/1-cat.png",
+                    "pages": {
+                        "abc": {
+                            "page_id": "abc",
+                            "public_url": "http://media.example/m/abc",
+                            "og_image_url": "http://media.example/og/abc.png",
+                            "items": [
+                                {
+                                    "filename": "1-cat.png",
+                                    "mime_type": "image/png",
+                                    "kind": "image",
+                                    "url": "http://media.example/media/abc/1-cat.png",
+                                }
+                            ],
                         }
-                    ],
+                    },
+                    "missing": [],
                 },
             ]
         )
@@ -41,6 +62,11 @@ class TruthSocialClientTests(unittest.IsolatedAsyncioTestCase):
         self.assertEqual(len(post.media), 1)
         self.assertEqual(post.media[0].source, "media_host")
         self.assertEqual(post.media[0].url, "http://media.example/media/abc/1-cat.png")
+        self.assertEqual(
+            proxy.request_json.await_args_list[1].args,
+            ("POST", "http://media.example/api/pages/batch"),
+        )
+        self.assertEqual(proxy.request_json.await_args_list[1].kwargs, {"json_body": {"page_ids": ["abc"]}})
 
     async def test_fetch_ancestor_chain_keeps_non_media_host_urls_in_text(self):
         proxy = MagicMock()
@@ -74,6 +100,309 @@ class TruthSocialClientTests(unittest.IsolatedAsyncioTestCase):
         self.assertEqual(chain[0].llm_text, "check this")
         self.assertEqual(chain[0].media, [])
 
+    async def test_fetch_notification_range_pages_back_to_since_id(self):
+        def alert(notification_id: str) -> dict:
+            return {
+                "id": notification_id,
+                "type": "mention",
+                "account": {"acct": "alice"},
+                "status": {"id": f"p{notification_id}"},
+            }
+
+        proxy = MagicMock()
+        proxy.request_json = AsyncMock(side_effect=[[alert("105"), alert("104")], [alert("103"), alert("102")], []])
+
+        client = TruthSocialClient(proxy)
+        notifications, resume_max_id = await client.fetch_notification_range(since_id="101")
+
+        self.assertEqual([item.notification_id for item in notifications], ["105", "104", "103", "102"])
+        self.assertIsNone(resume_max_id)
+        urls = [call.args[1] for call in proxy.request_json.await_args_list]
+        self.assertTrue(all("since_id=101" in url for url in urls))
+        self.assertNotIn("max_id", urls[0])
+        self.assertIn("max_id=104", urls[1])
+        self.assertIn("max_id=102", urls[2])
+
+    async def test_fetch_notification_range_reports_where_to_resume_after_page_limit(self):
+        def alert(notification_id: int) -> dict:
+            return {
+                "id": str(notification_id),
+                "type": "mention",
+                "account": {"acct": "alice"},
+                "status": {"id": f"p{notification_id}"},
+            }
+
+        async def request_json(method: str, url: str, **kwargs):
+            top = int(url.split("max_id=")[1]) - 1 if "max_id=" in url else 200
+            return [alert(top), alert(top - 1)]
+
+        proxy = MagicMock()
+        proxy.request_json = AsyncMock(side_effect=request_json)
+
+        client = TruthSocialClient(proxy)
+        with patch("sns_agent.truthsocial.NOTIFICATION_MAX_PAGES", 2):
+            notifications, resume_max_id = await client.fetch_notification_range(since_id="100")
+            resumed, _ = await client.fetch_notification_range(since_id="100", max_id=resume_max_id)
+
+        self.assertEqual([item.notification_id for item in notifications], ["200", "199", "198", "197"])
+        self.assertEqual(resume_max_id, "197")
+        self.assertEqual([item.notification_id for item in resumed], ["196", "195", "194", "193"])
+
+    async def test_fetch_notification_range_without_cursor_fetches_single_page(self):
+        proxy = MagicMock()
+        proxy.request_json = AsyncMock(return_value=[])
+
+        client = TruthSocialClient(proxy)
+        notifications, resume_max_id = await client.fetch_notification_range()
+
+        self.assertEqual(notifications, [])
+        self.assertIsNone(resume_max_id)
+        proxy.request_json.assert_awaited_once_with(
+            "GET",
+            "/api/v1/alerts?category=mentions&follow_mentions=false",
+        )
+
+    async def test_stream_notifications_parses_sse_notification_events(self):
+        lines = [
+            ": connected",
+            "",
+            "event: notification",
+            'data: {"id": "11", "type": "mention",',
+            'data:  "account": {"acct": "alice"}, "status": {"id": "p11"}}',
+            "",
+            ": keepalive",
+            "",
+            "event: other",
+            'data: {"id": "12", "status": {"id": "p12"}}',
+            "",
+            "event: notification",
+            "data: not-json",
+            "",
+            "event: notification",
+            'data: {"id": "13", "type": "mention", "status": {"id": "p13"}}',
+            "",
+        ]
+
+        async def aiter_lines():
+            for line in lines:
+                yield line
+
+        class StreamContext:
+            async def __aenter__(self):
+                return aiter_lines()
+
+            async def __aexit__(self, *exc_info):
+                return None
+
+        proxy = MagicMock()
+        proxy.stream_lines = MagicMock(return_value=StreamContext())
+        client = TruthSocialClient(proxy)
+
+        async with client.stream_notifications("/stream/notifications") as notifications:
+            received = [notification async for notification in notifications]
+
+        proxy.stream_lines.assert_called_once_with("/stream/notifications")
+        self.assertEqual([(item.notification_id, item.post_id) for item in received], [("11", "p11"), ("13", "p13")])
+        self.assertEqual(received[0].account_handle, "alice")
+
+    async def test_fetch_status_is_served_from_cache(self):
+        proxy = MagicMock()
+        proxy.request_json = AsyncMock(return_value=_status("1"))
+
+        client = TruthSocialClient(proxy)
+        first = await client.fetch_status("1")
+        second = await client.fetch_status("1")
+
+        self.assertIs(first, second)
+        proxy.request_json.assert_awaited_once()
+        stats = client.cache_stats()["status"]
+        self.assertEqual((stats.hits, stats.misses), (1, 1))
+
+    async def test_fetch_ancestor_chain_reuses_cached_parent_chain(self):
+        proxy = MagicMock()
+        proxy.request_json = AsyncMock(
+            side_effect=[
+                _status("3", "2"),
+                [_status("1"), _status("2", "1")],
+                _status("4", "3"),
+            ]
+        )
+
+        client = TruthSocialClient(proxy)
+        reply = await client.fetch_status("3")
+        first_chain = await client.fetch_ancestor_chain(reply)
+        next_reply = await client.fetch_status("4")
+        second_chain = await client.fetch_ancestor_chain(next_reply)
+
+        self.assertEqual([post.post_id for post in first_chain], ["1", "2", "3"])
+        self.assertEqual([post.post_id for post in second_chain], ["1", "2", "3", "4"])
+        self.assertEqual(proxy.request_json.await_count, 3)
+
+    async def test_fetch_ancestor_chain_renormalizes_edited_ancestor(self):
+        proxy = MagicMock()
+        proxy.request_json = AsyncMock(
+            side_effect=[
+                [_status("1", text="before")],
+                [_status("1", text="after", edited_at="2026-04-18T01:00:00Z")],
+            ]
+        )
+
+        client = TruthSocialClient(proxy)
+        first = await client.fetch_ancestor_chain(type("Target", (), {"post_id": "2", "parent_post_id": "1"})())
+        client._ancestor_cache.clear()
+        second = await client.fetch_ancestor_chain(type("Target", (), {"post_id": "3", "parent_post_id": "1"})())
+
+        self.assertEqual(first[0].llm_text, "before")
+        self.assertEqual(second[0].llm_text, "after")
+
+    async def test_publish_reply_caches_reply_for_follow_up_chain(self):
+        proxy = MagicMock()
+        proxy.request_json = AsyncMock(
+            side_effect=[
+                _status("1"),
+                _status("2", "1", text="bot reply"),
+                _status("3", "2"),
+            ]
+        )
+
+        client = TruthSocialClient(proxy)
+        root = await client.fetch_status("1")
+        await client.fetch_ancestor_chain(root)
+        client._ancestor_cache.put("1", ())
+        await client.publish_reply(text="bot reply", in_reply_to_id="1")
+        follow_up = await client.fetch_status("3")
+        chain = await client.fetch_ancestor_chain(follow_up)
+
+        self.assertEqual([post.post_id for post in chain], ["1", "2", "3"])
+        self.assertEqual(proxy.request_json.await_count, 3)
+
+    async def test_fetch_ancestor_chain_resolves_media_host_pages_in_one_batch(self):
+        batch_requests: list[list[str]] = []
+
+        def linked(post_id: str, parent_id: str | None, page_ids: list[str]) -> dict:
+            links = " ".join(f'<a href="http://media.example/m/{page_id}">x</a>' for page_id in page_ids)
+            return _status(post_id, parent_id, text=links)
+
+        async def request_json(method: str, url: str, **kwargs):
+            if "/context/ancestors" in url:
+                return [
+                    linked("1", None, ["a", "b"]),
+                    linked("2", "1", ["a", "gone"]),
+                    linked("3", "2", ["c", "a"]),
+                ]
+            self.assertEqual((method, url), ("POST", "http://media.example/api/pages/batch"))
+            page_ids = kwargs["json_body"]["page_ids"]
+            batch_requests.append(page_ids)
+            return {
+                "pages": {
+                    page_id: {"items": [{"kind": "image", "mime_type": "image/png", "url": f"http://media.example/media/{page_id}/1.png"}]}
+                    for page_id in page_ids
+                    if page_id != "gone"
+                },
+                "missing": ["gone"] if "gone" in page_ids else [],
+            }
+
+        proxy = MagicMock()
+        proxy.request_json = AsyncMock(side_effect=request_json)
+
+        with patch.dict("os.environ", {"MEDIA_HOST_API_URL": "http://media.example"}, clear=False):
+            client = TruthSocialClient(proxy)
+        target = type("Target", (), {"post_id": "4", "parent_post_id": "3"})()
+        chain = await client.fetch_ancestor_chain(target)
+        client._status_cache.clear()
+        client._ancestor_cache.clear()
+        await client.fetch_ancestor_chain(target)
+
+        self.assertEqual(sorted(batch_requests[0]), ["a", "b", "c", "gone"])
+        self.assertEqual(batch_requests[1:], [["gone"]])
+        self.assertEqual([media.media_id for media in chain[0].media], ["media-host:a:1", "media-host:b:1"])
+        self.assertEqual([media.media_id for media in chain[1].media], ["media-host:a:1"])
+        self.assertEqual([media.media_id for media in chain[2].media], ["media-host:c:1", "media-host:a:1"])
+
+    async def test_media_host_without_batch_endpoint_falls_back_to_bounded_page_requests(self):
+        page_requests: list[str] = []
+        in_flight = 0
+        max_in_flight = 0
+
+        def linked(post_id: str, parent_id: str | None, page_ids: list[str]) -> dict:
+            links = " ".join(f'<a href="http://media.example/m/{page_id}">x</a>' for page_id in page_ids)
+            return _status(post_id, parent_id, text=links)
+
+        async def request_json(method: str, url: str, **kwargs):
+            nonlocal in_flight, max_in_flight
+            if "/context/ancestors" in url:
+                return [
+                    linked("1", None, ["a", "b"]),
+                    linked("2", "1", ["a"]),
+                    linked("3", "2", ["c", "a"]),
+                ]
+            if method == "POST":
+                request = httpx.Request(method, url)
+                raise httpx.HTTPStatusError(
+                    "method not allowed",
+                    request=request,
+                    response=httpx.Response(405, request=request),
+                )
+            page_requests.append(url)
+            in_flight += 1
+            max_in_flight = max(max_in_flight, in_flight)
+            await asyncio.sleep(0.01)
+            in_flight -= 1
+            page_id = url.rsplit("/", 1)[-1]
+            return {"items": [{"kind": "image", "mime_type": "image/png", "url": f"http://media.example/media/{page_id}/1.png"}]}
+
+        proxy = MagicMock()
+        proxy.request_json = AsyncMock(side_effect=request_json)
+
+        with patch.dict(
+            "os.environ",
+            {"MEDIA_HOST_API_URL": "http://media.example", "MEDIA_HOST_RESOLVE_CONCURRENCY": "2"},
+            clear=False,
+        ):
+            client = TruthSocialClient(proxy)
+        target = type("Target", (), {"post_id": "4", "parent_post_id": "3"})()
+        chain = await client.fetch_ancestor_chain(target)
+        client._status_cache.clear()
+        client._ancestor_cache.clear()
+        await client.fetch_ancestor_chain(target)
+
+        self.assertEqual(sorted(page_requests), [f"http://media.example/api/pages/{page_id}" for page_id in "abc"])
+        self.assertEqual(max_in_flight, 2)
+        posts = [call for call in proxy.request_json.await_args_list if call.args[0] == "POST"]
+        self.assertEqual(len(posts), 1)
+        self.assertEqual([media.media_id for media in chain[0].media], ["media-host:a:1", "media-host:b:1"])
+        self.assertEqual([media.media_id for media in chain[2].media], ["media-host:c:1", "media-host:a:1"])
+
+    async def test_media_host_pages_resolve_through_proxy_http_client(self):
+        for batch_supported in (True, False):
+            with self.subTest(batch_supported=batch_supported):
+                requests: list[tuple[str, str, bytes]] = []
+
+                def handler(request: httpx.Request) -> httpx.Response:
+                    requests.append((request.method, request.url.path, request.content))
+                    if request.url.path == "/api/v1/statuses/1":
+                        return httpx.Response(200, json=_status("1", text='<a href="http://media.example/m/abc">x</a>'))
+                    page = {"items": [{"kind": "image", "mime_type": "image/png", "url": "http://media.example/media/abc/1.png"}]}
+                    if request.url.path == "/api/pages/batch":
+                        if not batch_supported:
+                            return httpx.Response(405)
+                        return httpx.Response(200, json={"pages": {"abc": page}, "missing": []})
+                    self.assertEqual(request.url.path, "/api/pages/abc")
+                    return httpx.Response(200, json=page)
+
+                proxy = ProxyHttpClient("http://proxy.test")
+                proxy._client = httpx.AsyncClient(base_url="http://proxy.test", transport=httpx.MockTransport(handler))
+                try:
+                    with patch.dict("os.environ", {"MEDIA_HOST_API_URL": "http://media.example"}, clear=False):
+                        client = TruthSocialClient(proxy)
+                    post = await client.fetch_status("1")
+                finally:
+                    await proxy.aclose()
+
+                self.assertEqual([media.media_id for media in post.media], ["media-host:abc:1"])
+                self.assertEqual(requests[1], ("POST", "/api/pages/batch", b'{"page_ids":["abc"]}'))
+                self.assertEqual(len(requests), 2 if batch_supported else 3)
+
 
 if __name__ == "__main__":
     unittest.main()
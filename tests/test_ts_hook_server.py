@@ -1,10 +1,523 @@
+import asyncio
+from contextlib import nullcontext
+from http.server import ThreadingHTTPServer
+import importlib.util
+from pathlib import Path
+import threading
+import time
+from types import SimpleNamespace
 import unittest
-from unittest.mock import MagicMock, patch
+from unittest.mock import AsyncMock, MagicMock, patch
 
-from ts_hook_server import BrowserProxy
+from ts_hook_server import (
+    _COLLECT_JOBS_SCRIPT,
+    _COLLECT_STREAM_SCRIPT,
+    _OPEN_STREAM_SCRIPT,
+    _START_JOB_SCRIPT,
+    BrowserProxy,
+    NotificationBroadcaster,
+    RotatingBrowserProxy,
+    WorkerPage,
+    _notification_events,
+    proxy,
+)
 from timeline_agent import AccessPathFilter
 
 
+class FakeWorkerPage:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started: dict[str, dict] = {}
+        self._finished: dict[str, dict] = {}
+
+    def evaluate(self, script, arg):
+        with self._lock:
+            if script == _START_JOB_SCRIPT:
+                self.started[arg["jobId"]] = arg["request"]
+                return True
+            if script == _COLLECT_JOBS_SCRIPT:
+                return {job_id: self._finished.pop(job_id) for job_id in arg if job_id in self._finished}
+        raise AssertionError("unexpected script")
+
+    def finish(self, url: str, outcome: dict):
+        with self._lock:
+            for job_id, request in list(self.started.items()):
+                if request["url"] == url:
+                    del self.started[job_id]
+                    self._finished[job_id] = outcome
+                    return
+        raise AssertionError(f"no started job for {url}")
+
+    def wait_for_load_state(self, state):
+        return None
+
+    def close(self):
+        return None
+
+
+class BrowserProxyPoolTests(unittest.IsolatedAsyncioTestCase):
+    async def _start_proxy(self, pages: list[FakeWorkerPage], *, mock_prepare: bool = True) -> BrowserProxy:
+        proxy = BrowserProxy(page_pool_size=len(pages))
+        proxy._worker_pages = [WorkerPage(page=page) for page in pages]
+        if mock_prepare:
+            proxy._prepare_fetch = MagicMock()
+        else:
+            proxy._normalize = MagicMock()
+            proxy._login = MagicMock()
+        proxy._start_browser_thread()
+        self.addAsyncCleanup(self._stop_proxy, proxy)
+        return proxy
+
+    @staticmethod
+    async def _stop_proxy(proxy: BrowserProxy):
+        proxy._worker_pages = []
+        await proxy.close()
+
+    @staticmethod
+    async def _wait_until(predicate):
+        for _ in range(200):
+            if predicate():
+                return
+            await asyncio.sleep(0.005)
+        raise AssertionError("condition was not met")
+
+    async def test_slow_request_does_not_block_other_pages(self):
+        slow_page, fast_page = FakeWorkerPage(), FakeWorkerPage()
+        proxy = await self._start_proxy([slow_page, fast_page])
+
+        slow = asyncio.create_task(proxy.fetch_url("POST", "https://truthsocial.com/api/v1/media", b"video"))
+        await self._wait_until(lambda: slow_page.started)
+        fast = asyncio.create_task(proxy.fetch_url("GET", "https://truthsocial.com/api/v1/alerts"))
+        await self._wait_until(lambda: fast_page.started)
+
+        fast_page.finish("https://truthsocial.com/api/v1/alerts", {"result": {"status": 200}})
+        self.assertEqual(await fast, {"status": 200})
+        self.assertFalse(slow.done())
+
+        slow_page.finish("https://truthsocial.com/api/v1/media", {"result": {"status": 201}})
+        self.assertEqual(await slow, {"status": 201})
+
+    async def test_requests_queue_for_a_free_page(self):
+        page = FakeWorkerPage()
+        proxy = await self._start_proxy([page])
+
+        first = asyncio.create_task(proxy.fetch_url("GET", "https://truthsocial.com/a"))
+        second = asyncio.create_task(proxy.fetch_url("GET", "https://truthsocial.com/b"))
+        await self._wait_until(lambda: page.started)
+        await asyncio.sleep(0.03)
+        self.assertEqual([request["url"] for request in page.started.values()], ["https://truthsocial.com/a"])
+
+        page.finish("https://truthsocial.com/a", {"result": {"status": 200}})
+        await first
+        await self._wait_until(lambda: page.started)
+        page.finish("https://truthsocial.com/b", {"result": {"status": 204}})
+        self.assertEqual(await second, {"status": 204})
+
+    async def test_page_job_error_is_raised_to_caller(self):
+        page = FakeWorkerPage()
+        proxy = await self._start_proxy([page])
+
+        request = asyncio.create_task(proxy.fetch_url("GET", "https://truthsocial.com/a"))
+        await self._wait_until(lambda: page.started)
+        page.finish("https://truthsocial.com/a", {"error": "TypeError: Failed to fetch"})
+
+        with self.assertRaisesRegex(RuntimeError, "Failed to fetch"):
+            await request
+
+    async def test_fetch_skips_session_checks_while_session_is_fresh(self):
+        page = FakeWorkerPage()
+        proxy = await self._start_proxy([page], mock_prepare=False)
+
+        for path in ("a", "b"):
+            request = asyncio.create_task(proxy.fetch_url("GET", f"https://truthsocial.com/{path}"))
+            await self._wait_until(lambda: page.started)
+            page.finish(f"https://truthsocial.com/{path}", {"result": {"status": 200, "headers": {}}})
+            await request
+
+        proxy._normalize.assert_not_called()
+        proxy._login.assert_not_called()
+
+    async def test_unauthorized_response_refreshes_session_and_retries_once(self):
+        page = FakeWorkerPage()
+        proxy = await self._start_proxy([page], mock_prepare=False)
+
+        request = asyncio.create_task(proxy.fetch_url("GET", "https://truthsocial.com/a"))
+        await self._wait_until(lambda: page.started)
+        page.finish("https://truthsocial.com/a", {"result": {"status": 401, "headers": {}}})
+        await self._wait_until(lambda: page.started)
+        page.finish("https://truthsocial.com/a", {"result": {"status": 200, "headers": {}}})
+
+        self.assertEqual((await request)["status"], 200)
+        proxy._normalize.assert_called_once_with()
+        proxy._login.assert_called_once_with()
+
+    async def test_challenge_response_requests_standby_without_inline_refresh(self):
+        page = FakeWorkerPage()
+        proxy = await self._start_proxy([page], mock_prepare=False)
+        replaced = threading.Event()
+        proxy.set_session_listener(replaced.set)
+
+        request = asyncio.create_task(proxy.fetch_url("GET", "https://truthsocial.com/a"))
+        await self._wait_until(lambda: page.started)
+        page.finish("https://truthsocial.com/a", {"result": {"status": 403, "headers": {"cf-mitigated": "challenge"}}})
+
+        self.assertEqual((await request)["status"], 403)
+        self.assertTrue(replaced.is_set())
+        self.assertFalse(proxy._session_stale)
+        proxy._normalize.assert_not_called()
+        proxy._login.assert_not_called()
+
+
+class BrowserProxyBinaryTransferTests(unittest.IsolatedAsyncioTestCase):
+    async def _start_proxy(self, page: FakeWorkerPage) -> BrowserProxy:
+        proxy = BrowserProxy(page_pool_size=1)
+        proxy._binary_transfer = True
+        proxy._worker_pages = [WorkerPage(page=page)]
+        proxy._prepare_fetch = MagicMock()
+        proxy._start_browser_thread()
+        self.addAsyncCleanup(BrowserProxyPoolTests._stop_proxy, proxy)
+        return proxy
+
+    async def test_upload_bytes_are_sent_through_route_without_base64(self):
+        page = FakeWorkerPage()
+        proxy = await self._start_proxy(page)
+
+        request = asyncio.create_task(proxy.fetch_url("POST", "https://truthsocial.com/api/v1/media", b"\x00video"))
+        await BrowserProxyPoolTests._wait_until(lambda: page.started)
+        job_id, payload = next(iter(page.started.items()))
+        self.assertIsNone(payload["bodyBase64"])
+        self.assertEqual(payload["jobId"], job_id)
+
+        route = MagicMock()
+        browser_request = MagicMock()
+        browser_request.headers = {"x-ts-proxy-job": job_id, "content-type": "multipart/form-data"}
+        proxy._route_job_request(route, browser_request)
+        route.continue_.assert_called_once_with(headers={"content-type": "multipart/form-data"}, post_data=b"\x00video")
+
+        browser_request.response.return_value.body.return_value = b"\x89PNG"
+        page.finish(
+            "https://truthsocial.com/api/v1/media",
+            {"result": {"status": 200, "headers": {"content-type": "image/png"}, "bodyFromNetwork": True}},
+        )
+        result = await request
+        self.assertEqual(result["body"], b"\x89PNG")
+        self.assertNotIn("bodyFromNetwork", result)
+
+    async def test_json_response_text_is_returned_as_bytes(self):
+        page = FakeWorkerPage()
+        proxy = await self._start_proxy(page)
+
+        request = asyncio.create_task(proxy.fetch_url("GET", "https://truthsocial.com/api/v1/alerts"))
+        await BrowserProxyPoolTests._wait_until(lambda: page.started)
+        page.finish(
+            "https://truthsocial.com/api/v1/alerts",
+            {"result": {"status": 200, "headers": {"content-type": "application/json"}, "bodyText": "[\"\u00e9\"]"}},
+        )
+
+        self.assertEqual((await request)["body"], '["\u00e9"]'.encode("utf-8"))
+
+    def test_open_worker_pages_routes_through_session_context(self):
+        proxy = BrowserProxy(page_pool_size=1)
+        proxy._binary_transfer = True
+        proxy._stream_enabled = False
+        proxy._session = SimpleNamespace(context=MagicMock())
+        proxy._new_worker_page = MagicMock(return_value=FakeWorkerPage())
+
+        proxy._open_worker_pages()
+
+        proxy._session.context.route.assert_called_once_with("https://truthsocial.com/**", proxy._route_job_request)
+        self.assertTrue(proxy._binary_transfer)
+
+    def test_open_worker_pages_falls_back_to_base64_without_context(self):
+        proxy = BrowserProxy(page_pool_size=1)
+        proxy._binary_transfer = True
+        proxy._stream_enabled = False
+        proxy._new_worker_page = MagicMock(return_value=FakeWorkerPage())
+
+        with self.assertLogs("ts_hook_server", level="WARNING"):
+            proxy._open_worker_pages()
+
+        self.assertFalse(proxy._binary_transfer)
+        self.assertEqual(len(proxy._worker_pages), 1)
+
+    async def test_browser_pool_benchmark_proxy_serves_stand_in_requests(self):
+        path = Path(__file__).resolve().parents[1] / "scripts" / "benchmark_browser_pool.py"
+        spec = importlib.util.spec_from_file_location("benchmark_browser_pool", path)
+        benchmark = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(benchmark)
+        server = ThreadingHTTPServer(("127.0.0.1", 0), benchmark.StandInHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        origin = f"http://127.0.0.1:{server.server_address[1]}"
+
+        for binary_transfer in (False, True):
+            with self.subTest(binary_transfer=binary_transfer):
+                proxy = benchmark.BenchmarkProxy(2, origin, None)
+                proxy._binary_transfer = binary_transfer
+                with self.assertLogs("ts_hook_server", level="WARNING") if binary_transfer else nullcontext():
+                    await proxy.start()
+                try:
+                    results = await asyncio.gather(
+                        *(proxy.fetch_url("GET", f"{origin}/api/v1/alerts?latency_ms=0") for _ in range(3))
+                    )
+                finally:
+                    await proxy.close()
+
+                self.assertEqual([result["status"] for result in results], [200, 200, 200])
+                self.assertFalse(proxy._binary_transfer)
+
+    def test_route_passes_through_requests_without_job_marker(self):
+        proxy = BrowserProxy()
+        route = MagicMock()
+        browser_request = MagicMock()
+        browser_request.headers = {"accept": "text/html"}
+
+        proxy._route_job_request(route, browser_request)
+
+        route.continue_.assert_called_once_with()
+
+    def test_legacy_base64_body_is_decoded(self):
+        job = MagicMock()
+        result = BrowserProxy._attach_response_body(job, {"status": 200, "bodyBase64": "AAE="})
+
+        self.assertEqual(result, {"status": 200, "body": b"\x00\x01"})
+
+
+class FakeSessionProxy:
+    def __init__(self, token, fail_start=False, status=200):
+        self.token = token or "token"
+        self.fail_start = fail_start
+        self.status = status
+        self.started = False
+        self.drained = False
+        self.closed = False
+        self.drain_release = asyncio.Event()
+        self.drain_release.set()
+        self.listener = None
+        self.session_listener = None
+
+    def set_notification_listener(self, listener):
+        self.listener = listener
+
+    def set_session_listener(self, listener):
+        self.session_listener = listener
+
+    async def start(self):
+        if self.fail_start:
+            raise RuntimeError("cloudflare challenge failed")
+        self.started = True
+        return self
+
+    async def drain(self, timeout):
+        await self.drain_release.wait()
+        self.drained = True
+
+    async def close(self):
+        self.closed = True
+
+    async def fetch_url(self, method, url, **kwargs):
+        return {"served_by": self, "status": self.status, "headers": {}}
+
+
+class RotatingBrowserProxyTests(unittest.IsolatedAsyncioTestCase):
+    def _rotating(self, proxies):
+        created = []
+
+        def factory(token):
+            proxy = proxies.pop(0)
+            proxy.received_token = token
+            created.append(proxy)
+            return proxy
+
+        return RotatingBrowserProxy(rotate_seconds=0, proxy_factory=factory), created
+
+    async def test_rotate_swaps_in_standby_and_retires_previous_after_drain(self):
+        first, second = FakeSessionProxy("first-token"), FakeSessionProxy(None)
+        rotating, _ = self._rotating([first, second])
+        await rotating.start()
+        first.drain_release.clear()
+
+        await rotating.rotate()
+        result = await rotating.fetch_url("GET", "https://truthsocial.com/api/v1/alerts")
+
+        self.assertIs(result["served_by"], second)
+        self.assertEqual(second.received_token, "first-token")
+        self.assertFalse(first.closed)
+        first.drain_release.set()
+        await rotating.close()
+        self.assertTrue(first.drained)
+        self.assertTrue(first.closed)
+        self.assertTrue(second.closed)
+
+    async def test_rotate_moves_notification_listener_to_standby(self):
+        first, second = FakeSessionProxy("token"), FakeSessionProxy("token")
+        rotating, _ = self._rotating([first, second])
+        await rotating.start()
+        self.assertIsNotNone(first.listener)
+
+        await rotating.rotate()
+
+        self.assertIsNone(first.listener)
+        self.assertEqual(second.listener, rotating.notifications.publish_threadsafe)
+        await rotating.close()
+
+    async def test_failed_standby_keeps_active_session(self):
+        first, broken = FakeSessionProxy("token"), FakeSessionProxy("token", fail_start=True)
+        rotating, _ = self._rotating([first, broken])
+        await rotating.start()
+
+        with self.assertRaises(RuntimeError):
+            await rotating.rotate()
+
+        self.assertIs(rotating.active, first)
+        self.assertTrue(broken.closed)
+        await rotating.close()
+
+    async def test_failed_session_check_swaps_in_standby_once(self):
+        first, second = FakeSessionProxy("token"), FakeSessionProxy("token")
+        rotating, created = self._rotating([first, second])
+        await rotating.start()
+
+        report = first.session_listener
+        threads = [threading.Thread(target=report) for _ in range(3)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        for _ in range(100):
+            if rotating.active is second:
+                break
+            await asyncio.sleep(0.01)
+        await asyncio.gather(rotating._replacement_task)
+        report()
+        await asyncio.sleep(0.01)
+
+        self.assertIs(rotating.active, second)
+        self.assertEqual(created, [first, second])
+        self.assertIsNone(first.session_listener)
+        self.assertIsNotNone(second.session_listener)
+        await rotating.close()
+
+    async def test_unauthorized_response_is_resent_on_standby_session(self):
+        first, second = FakeSessionProxy("token", status=401), FakeSessionProxy("token")
+        rotating, created = self._rotating([first, second])
+        await rotating.start()
+
+        results = await asyncio.gather(
+            rotating.fetch_url("GET", "https://truthsocial.com/api/v1/alerts"),
+            rotating.fetch_url("GET", "https://truthsocial.com/api/v1/alerts"),
+        )
+
+        self.assertEqual([(result["served_by"], result["status"]) for result in results], [(second, 200)] * 2)
+        self.assertEqual(created, [first, second])
+        await rotating.close()
+
+    async def test_failed_standby_returns_original_unauthorized_response(self):
+        first, broken = FakeSessionProxy("token", status=401), FakeSessionProxy("token", fail_start=True)
+        rotating, _ = self._rotating([first, broken])
+        await rotating.start()
+
+        with self.assertLogs("ts_hook_server", level="WARNING"):
+            result = await rotating.fetch_url("GET", "https://truthsocial.com/api/v1/alerts")
+
+        self.assertEqual((result["served_by"], result["status"]), (first, 401))
+        self.assertIs(rotating.active, first)
+        await rotating.close()
+
+    async def test_background_rotation_runs_before_expiry(self):
+        first, second = FakeSessionProxy("token"), FakeSessionProxy("token")
+        rotating, created = self._rotating([first, second])
+        rotating._rotate_seconds = 0.01
+        await rotating.start()
+
+        for _ in range(100):
+            if rotating.active is second:
+                break
+            await asyncio.sleep(0.01)
+
+        self.assertIs(rotating.active, second)
+        await rotating.close()
+        self.assertTrue(first.closed)
+
+
+class BrowserProxySessionTests(unittest.TestCase):
+    def _probed_proxy(self, login_state):
+        proxy = BrowserProxy()
+        proxy._session = MagicMock()
+        proxy._page = MagicMock()
+        proxy._page.evaluate.side_effect = login_state if isinstance(login_state, Exception) else [login_state]
+        proxy._refresh_session = MagicMock()
+        proxy._session_check_seconds = 120
+        proxy._session_checked_at = 1000
+        proxy._last_cf_reset = 1000
+        return proxy
+
+    def test_session_check_probes_without_reload_only_after_interval(self):
+        proxy = self._probed_proxy("{}")
+
+        with patch("ts_hook_server.time.time", return_value=1100):
+            proxy._check_session_if_due()
+        proxy._page.evaluate.assert_not_called()
+
+        with patch("ts_hook_server.time.time", return_value=1121), patch("ts_hook_server.time.sleep") as sleep:
+            proxy._check_session_if_due()
+        proxy._page.evaluate.assert_called_once()
+        proxy._page.reload.assert_not_called()
+        sleep.assert_not_called()
+        proxy._refresh_session.assert_not_called()
+        self.assertFalse(proxy._session_stale)
+        self.assertEqual(proxy._session_checked_at, 1121)
+
+    def test_failed_probe_requests_standby_instead_of_refreshing(self):
+        proxy = self._probed_proxy('{"error_code": "USER_UNAUTHENTICATED"}')
+        listener = MagicMock()
+        proxy.set_session_listener(listener)
+
+        with patch("ts_hook_server.time.time", return_value=1121):
+            proxy._check_session_if_due()
+
+        listener.assert_called_once_with()
+        proxy._refresh_session.assert_not_called()
+        self.assertFalse(proxy._session_stale)
+
+    def test_failed_probe_without_standby_marks_session_stale(self):
+        proxy = self._probed_proxy(RuntimeError("page crashed"))
+
+        with patch("ts_hook_server.time.time", return_value=1121), self.assertLogs("ts_hook_server", level="WARNING"):
+            proxy._check_session_if_due()
+
+        self.assertTrue(proxy._session_stale)
+        proxy._refresh_session.assert_not_called()
+
+    def test_expired_cloudflare_clearance_fails_probe_without_fetching(self):
+        proxy = self._probed_proxy("{}")
+
+        with patch("ts_hook_server.time.time", return_value=1000 + 1741):
+            self.assertFalse(proxy._probe_session())
+        proxy._page.evaluate.assert_not_called()
+
+    def test_drain_waits_until_worker_pages_are_idle(self):
+        proxy = BrowserProxy()
+        worker = WorkerPage(FakeWorkerPage(), job=MagicMock())
+        proxy._worker_pages = [worker]
+
+        async def call(func, *args):
+            idle = func(*args)
+            worker.job = None
+            return idle
+
+        with patch.object(proxy, "_call", side_effect=call) as call_mock, patch("ts_hook_server._DRAIN_POLL_SECONDS", 0):
+            asyncio.run(proxy.drain(1.0))
+
+        self.assertEqual(call_mock.call_count, 2)
+
+    def test_cloudflare_challenge_response_needs_session_refresh(self):
+        self.assertTrue(BrowserProxy._needs_session_refresh({"status": 403, "headers": {}}))
+        self.assertTrue(BrowserProxy._needs_session_refresh({"status": 200, "headers": {"cf-mitigated": "challenge"}}))
+        self.assertFalse(BrowserProxy._needs_session_refresh({"status": 404, "headers": {}}))
+
+
 class BrowserProxyTests(unittest.TestCase):
     def test_normalize_waits_after_goto(self):
         proxy = BrowserProxy()
@@ -72,5 +585,104 @@ class BrowserProxyTests(unittest.TestCase):
         self.assertFalse(filter_.filter(suppressed))
 
 
+class FakeStreamPage:
+    def __init__(self, collected):
+        self.collected = list(collected)
+        self.opened = []
+
+    def evaluate(self, script, arg=None):
+        if script == _COLLECT_STREAM_SCRIPT:
+            return self.collected.pop(0)
+        if script == _OPEN_STREAM_SCRIPT:
+            self.opened.append(arg)
+            return True
+        raise AssertionError("unexpected script")
+
+
+class NotificationStreamTests(unittest.IsolatedAsyncioTestCase):
+    def test_pump_opens_stream_and_forwards_events(self):
+        page = FakeStreamPage(
+            [
+                {"events": [], "readyState": -1, "error": None},
+                {"events": [{"id": "1", "type": "mention"}], "readyState": 1, "error": None},
+                {"events": [], "readyState": 3, "error": "websocket closed (1006)"},
+            ]
+        )
+        proxy_ = BrowserProxy(token="secret")
+        proxy_._stream_page = page
+        received = []
+        proxy_.set_notification_listener(received.append)
+
+        proxy_._pump_notification_stream()
+        self.assertEqual(len(page.opened), 1)
+        self.assertIn("stream=user%3Anotification", page.opened[0]["url"])
+        self.assertIn("access_token=secret", page.opened[0]["url"])
+        self.assertEqual(page.opened[0]["types"], ["mention"])
+
+        proxy_._pump_notification_stream()
+        self.assertEqual(received, [{"id": "1", "type": "mention"}])
+        self.assertTrue(proxy_._stream_open)
+
+        proxy_._stream_retry_at = time.time() + 60
+        proxy_._pump_notification_stream()
+        self.assertFalse(proxy_._stream_open)
+        self.assertEqual(len(page.opened), 1)
+
+        page.collected.append({"events": [], "readyState": 3, "error": "websocket closed (1006)"})
+        proxy_._stream_retry_at = 0.0
+        proxy_._pump_notification_stream()
+        self.assertEqual(len(page.opened), 2)
+
+    async def test_sse_events_are_formatted_for_subscribers(self):
+        broadcaster = NotificationBroadcaster(max_queued=2)
+        events = _notification_events(broadcaster)
+
+        self.assertEqual(await anext(events), ": connected\n\n")
+        self.assertEqual(broadcaster.subscriber_count, 1)
+        broadcaster.publish({"id": "7", "type": "mention"})
+
+        self.assertEqual(
+            await anext(events),
+            'id: 7\nevent: notification\ndata: {"id":"7","type":"mention"}\n\n',
+        )
+        await events.aclose()
+        self.assertEqual(broadcaster.subscriber_count, 0)
+
+    async def test_lagging_subscriber_drops_oldest_event(self):
+        broadcaster = NotificationBroadcaster(max_queued=2)
+        async with broadcaster.subscribe() as subscriber:
+            for notification_id in ("1", "2", "3"):
+                broadcaster.publish({"id": notification_id})
+
+            self.assertEqual([subscriber.get_nowait()["id"] for _ in range(2)], ["2", "3"])
+
+
+class ProxyRouteTests(unittest.IsolatedAsyncioTestCase):
+    async def test_proxy_forwards_rate_limit_headers(self):
+        browser = MagicMock()
+        browser.fetch = AsyncMock(
+            return_value={
+                "status": 429,
+                "headers": {
+                    "Content-Type": "application/json",
+                    "Retry-After": "30",
+                    "X-RateLimit-Remaining": "0",
+                    "X-RateLimit-Reset": "2026-01-01T00:00:00.000Z",
+                    "Set-Cookie": "secret=1",
+                },
+                "body": b"{}",
+            }
+        )
+        request = SimpleNamespace(app=SimpleNamespace(state=SimpleNamespace(browser=browser)))
+
+        response = await proxy(request, "api/v1/notifications")
+
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response.headers["retry-after"], "30")
+        self.assertEqual(response.headers["x-ratelimit-remaining"], "0")
+        self.assertEqual(response.headers["x-ratelimit-reset"], "2026-01-01T00:00:00.000Z")
+        self.assertNotIn("set-cookie", response.headers)
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -1,17 +1,26 @@
 import asyncio
 import base64
+from collections import deque
+from collections.abc import Callable
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
 import json
 import logging
-import time
-from concurrent.futures import ThreadPoolExecutor
-from contextlib import asynccontextmanager
 from os import environ
+import queue
+import secrets
+import threading
+import time
+from typing import Any
+from urllib.parse import urlencode
 
 from dotenv import find_dotenv, load_dotenv
 from fastapi import FastAPI, HTTPException, Request, Response
+from fastapi.responses import StreamingResponse
 from scrapling.fetchers import StealthySession
 
 load_dotenv(find_dotenv())
+logger = logging.getLogger(__name__)
 SUPPRESSED_ACCESS_PATH = "/api/v1/alerts?category=mentions&follow_mentions=false"
 
 
@@ -37,20 +46,269 @@ def configure_access_log_filters() -> None:
 configure_access_log_filters()
 
 
+_FETCH_SCRIPT = """
+async ({url, method, headers, bodyBase64, jsonBody, returnMetadata, jobId}) => {
+    const cleanHeaders = Object.fromEntries(
+        Object.entries(headers).filter(([, value]) => value !== "")
+    );
+    if (jobId) {
+        cleanHeaders["x-ts-proxy-job"] = jobId;
+    }
+    const decodeBase64 = (value) => {
+        const binary = atob(value);
+        const bytes = new Uint8Array(binary.length);
+        for (let i = 0; i < binary.length; i += 1) {
+            bytes[i] = binary.charCodeAt(i);
+        }
+        return bytes;
+    };
+    const encodeBase64 = (bytes) => {
+        let binary = "";
+        for (let i = 0; i < bytes.length; i += 0x8000) {
+            binary += String.fromCharCode(...bytes.subarray(i, i + 0x8000));
+        }
+        return btoa(binary);
+    };
+
+    let body;
+    if (bodyBase64 !== null) {
+        body = new Blob([decodeBase64(bodyBase64)]);
+    } else if (jsonBody !== null) {
+        body = JSON.stringify(jsonBody);
+    }
+
+    const response = await fetch(url, {
+        method,
+        headers: cleanHeaders,
+        body,
+    });
+
+    if (!returnMetadata) {
+        return await response.text();
+    }
+
+    if (jobId) {
+        const metadata = {
+            status: response.status,
+            headers: Object.fromEntries(response.headers.entries()),
+        };
+        if ((response.headers.get("content-type") || "").startsWith("application/json")) {
+            return { ...metadata, bodyText: await response.text() };
+        }
+        await response.arrayBuffer();
+        return { ...metadata, bodyFromNetwork: true };
+    }
+
+    return {
+        status: response.status,
+        headers: Object.fromEntries(response.headers.entries()),
+        bodyBase64: encodeBase64(new Uint8Array(await response.arrayBuffer())),
+    };
+}
+"""
+
+_START_JOB_SCRIPT = f"""
+({{jobId, request}}) => {{
+    const run = {_FETCH_SCRIPT};
+    const jobs = (window.__tsProxyJobs = window.__tsProxyJobs || {{}});
+    const job = {{ done: false }};
+    jobs[jobId] = job;
+    run(request).then(
+        (result) => {{ job.result = result; job.done = true; }},
+        (error) => {{ job.error = String(error); job.done = true; }},
+    );
+    return true;
+}}
+"""
+
+_COLLECT_JOBS_SCRIPT = """
+(jobIds) => {
+    const jobs = window.__tsProxyJobs || {};
+    const finished = {};
+    for (const jobId of jobIds) {
+        const job = jobs[jobId];
+        if (job === undefined) {
+            finished[jobId] = { error: "browser job was lost (page navigated or reloaded)" };
+            continue;
+        }
+        if (!job.done) {
+            continue;
+        }
+        finished[jobId] = job.error !== undefined ? { error: job.error } : { result: job.result };
+        delete jobs[jobId];
+    }
+    return finished;
+}
+"""
+
+_OPEN_STREAM_SCRIPT = """
+(config) => {
+    const existing = window.__tsNotificationStream;
+    if (existing && existing.socket && existing.socket.readyState <= 1) {
+        return true;
+    }
+    const stream = existing || { events: [] };
+    stream.error = null;
+    const socket = new WebSocket(config.url);
+    stream.socket = socket;
+    socket.onmessage = (message) => {
+        try {
+            const frame = JSON.parse(message.data);
+            if (frame.event !== "notification") {
+                return;
+            }
+            const payload = typeof frame.payload === "string" ? JSON.parse(frame.payload) : frame.payload;
+            if (config.types.length && !config.types.includes(payload.type)) {
+                return;
+            }
+            stream.events.push(payload);
+            if (stream.events.length > config.maxBuffered) {
+                stream.events.splice(0, stream.events.length - config.maxBuffered);
+            }
+        } catch (error) {
+            stream.error = String(error);
+        }
+    };
+    socket.onerror = () => { stream.error = "websocket error"; };
+    socket.onclose = (event) => { stream.error = stream.error || `websocket closed (${event.code})`; };
+    window.__tsNotificationStream = stream;
+    return true;
+}
+"""
+
+_COLLECT_STREAM_SCRIPT = """
+() => {
+    const stream = window.__tsNotificationStream;
+    if (!stream) {
+        return { events: [], readyState: -1, error: null };
+    }
+    const events = stream.events;
+    stream.events = [];
+    return { events, readyState: stream.socket ? stream.socket.readyState : -1, error: stream.error };
+}
+"""
+
+_JOB_POLL_SECONDS = 0.01
+_STREAM_POLL_SECONDS = 0.25
+_STREAM_RETRY_MAX_SECONDS = 60.0
+_SSE_KEEPALIVE_SECONDS = 15.0
+_DRAIN_POLL_SECONDS = 0.1
+_ROTATION_RETRY_SECONDS = 60.0
+_CLOUDFLARE_SESSION_SECONDS = 1740
+_SESSION_REFRESH_STATUSES = {401, 403}
+_JOB_HEADER = "x-ts-proxy-job"
+_FORWARDED_RESPONSE_HEADERS = ("retry-after", "x-ratelimit-limit", "x-ratelimit-remaining", "x-ratelimit-reset")
+_STOP = object()
+
+
+@dataclass(slots=True)
+class BrowserJob:
+    loop: asyncio.AbstractEventLoop
+    future: asyncio.Future
+    method: str = "GET"
+    url: str = ""
+    body_bytes: bytes | None = None
+    headers: dict[str, str] = field(default_factory=dict)
+    call: Callable[..., Any] | None = None
+    args: tuple[Any, ...] = ()
+    job_id: str = field(default_factory=lambda: secrets.token_hex(8))
+    attempts: int = 0
+    request: Any = None
+
+
+@dataclass(slots=True)
+class WorkerPage:
+    page: Any
+    job: BrowserJob | None = None
+
+
+class NotificationBroadcaster:
+    def __init__(self, max_queued: int | None = None):
+        if max_queued is None:
+            max_queued = int(environ.get("TS_HOOK_STREAM_MAX_QUEUED", "256"))
+        self._max_queued = max(1, max_queued)
+        self._subscribers: set[asyncio.Queue[dict[str, Any]]] = set()
+        self._loop: asyncio.AbstractEventLoop | None = None
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    @asynccontextmanager
+    async def subscribe(self):
+        self._loop = asyncio.get_running_loop()
+        subscriber: asyncio.Queue[dict[str, Any]] = asyncio.Queue(maxsize=self._max_queued)
+        self._subscribers.add(subscriber)
+        try:
+            yield subscriber
+        finally:
+            self._subscribers.discard(subscriber)
+
+    def publish_threadsafe(self, payload: dict[str, Any]):
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            return
+        try:
+            loop.call_soon_threadsafe(self.publish, payload)
+        except RuntimeError:
+            pass
+
+    def publish(self, payload: dict[str, Any]):
+        for subscriber in self._subscribers:
+            if subscriber.full():
+                subscriber.get_nowait()
+                logger.warning("notification stream subscriber is lagging; dropped oldest event")
+            subscriber.put_nowait(payload)
+
+
 class BrowserProxy:
-    def __init__(self, headless: bool = False):
+    def __init__(self, headless: bool = False, page_pool_size: int | None = None, token: str | None = None):
         self._headless = headless
-        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="scrapling-browser")
+        self._origin = "https://truthsocial.com"
+        self._binary_transfer = environ.get("TS_HOOK_BINARY_TRANSFER", "true").lower() not in {"0", "false", "no"}
+        self._routed_jobs: dict[str, BrowserJob] = {}
+        if page_pool_size is None:
+            page_pool_size = int(environ.get("TS_HOOK_PAGE_POOL_SIZE", "4"))
+        self._page_pool_size = max(1, page_pool_size)
+        self._thread: threading.Thread | None = None
+        self._jobs: queue.Queue[Any] = queue.Queue()
+        self._pending_fetches: deque[BrowserJob] = deque()
+        self._worker_pages: list[WorkerPage] = []
         self._session: StealthySession = None
         self._page = None
-        self._token: str | None = None
+        self._token: str | None = token
         self._last_reloaded = 0.0
         self._last_cf_reset = time.time()
+        self._session_check_seconds = float(environ.get("TS_HOOK_SESSION_CHECK_SECONDS", "120"))
+        self._session_checked_at = 0.0
+        self._session_stale = False
+        self._stream_enabled = environ.get("TS_HOOK_NOTIFICATION_STREAM", "true").lower() not in {"0", "false", "no"}
+        self._streaming_url = environ.get("TS_HOOK_STREAMING_URL", "wss://truthsocial.com/api/v1/streaming")
+        self._stream_types = [
+            value.strip() for value in environ.get("TS_HOOK_STREAM_TYPES", "mention").split(",") if value.strip()
+        ]
+        self._stream_page = None
+        self._stream_open = False
+        self._stream_failures = 0
+        self._stream_retry_at = 0.0
+        self._notification_listener: Callable[[dict[str, Any]], None] | None = None
+        self._session_listener: Callable[[], None] | None = None
+
+    def set_notification_listener(self, listener: Callable[[dict[str, Any]], None] | None):
+        self._notification_listener = listener
+
+    def set_session_listener(self, listener: Callable[[], None] | None):
+        self._session_listener = listener
 
     async def start(self):
-        await asyncio.get_running_loop().run_in_executor(self._executor, self._start)
+        self._start_browser_thread()
+        await self._call(self._start)
         return self
 
+    def _start_browser_thread(self):
+        self._thread = threading.Thread(target=self._run_browser_loop, name="scrapling-browser", daemon=True)
+        self._thread.start()
+
     def _start(self):
         self._session = StealthySession(headless=self._headless, humanize=True, solve_cloudflare=True)
         self._session.start()
@@ -59,6 +317,327 @@ class BrowserProxy:
         self._normalize(force_init=True)
         time.sleep(3)
         self._login()
+        self._mark_session_checked()
+        self._open_worker_pages()
+
+    def _open_worker_pages(self):
+        self._close_worker_pages("browser session was replaced")
+        if self._binary_transfer:
+            context = getattr(self._session, "context", None)
+            if context is None:
+                logger.warning("browser session has no context to route; falling back to base64 transfer")
+                self._binary_transfer = False
+            else:
+                context.route(f"{self._origin}/**", self._route_job_request)
+        for _ in range(self._page_pool_size):
+            self._worker_pages.append(WorkerPage(page=self._new_worker_page()))
+        if self._stream_enabled:
+            self._stream_page = self._new_worker_page()
+            self._stream_open = False
+            self._stream_retry_at = 0.0
+
+    def _new_worker_page(self):
+        page = self._session.context.new_page()
+        page.goto("https://truthsocial.com/")
+        page.wait_for_load_state("domcontentloaded")
+        return page
+
+    def _route_job_request(self, route: Any, request: Any):
+        job_id = request.headers.get(_JOB_HEADER)
+        job = self._routed_jobs.get(job_id) if job_id else None
+        if job is None:
+            route.continue_()
+            return
+        job.request = request
+        headers = {key: value for key, value in request.headers.items() if key != _JOB_HEADER}
+        if job.body_bytes is not None:
+            route.continue_(headers=headers, post_data=job.body_bytes)
+        else:
+            route.continue_(headers=headers)
+
+    def _close_worker_pages(self, reason: str):
+        for worker in self._worker_pages:
+            if worker.job is not None:
+                self._routed_jobs.pop(worker.job.job_id, None)
+                self._fail(worker.job, RuntimeError(reason))
+                worker.job = None
+            try:
+                worker.page.close()
+            except Exception:
+                pass
+        self._worker_pages = []
+        self._close_stream_page()
+
+    def _close_stream_page(self):
+        page, self._stream_page = self._stream_page, None
+        self._stream_open = False
+        if page is not None:
+            try:
+                page.close()
+            except Exception:
+                pass
+
+    @property
+    def token(self) -> str | None:
+        return self._token
+
+    async def drain(self, timeout: float):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if await self._call(self._is_idle):
+                return
+            await asyncio.sleep(_DRAIN_POLL_SECONDS)
+        logger.warning("browser proxy drain timed out after %.1fs", timeout)
+
+    def _is_idle(self) -> bool:
+        return not self._pending_fetches and all(worker.job is None for worker in self._worker_pages)
+
+    async def _call(self, func: Callable[..., Any], *args: Any) -> Any:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._jobs.put(BrowserJob(loop=loop, future=future, call=func, args=args))
+        return await future
+
+    def _run_browser_loop(self):
+        while True:
+            busy = any(worker.job is not None for worker in self._worker_pages)
+            timeout = _JOB_POLL_SECONDS if busy else self._seconds_until_session_check()
+            if self._stream_page is not None:
+                timeout = _STREAM_POLL_SECONDS if timeout is None else min(timeout, _STREAM_POLL_SECONDS)
+            try:
+                item = self._jobs.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+            while item is not None:
+                if item is _STOP:
+                    self._close_worker_pages("browser proxy is shutting down")
+                    while self._pending_fetches:
+                        self._fail(self._pending_fetches.popleft(), RuntimeError("browser proxy is shutting down"))
+                    return
+                self._handle_job(item)
+                try:
+                    item = self._jobs.get_nowait()
+                except queue.Empty:
+                    item = None
+            self._collect_finished_fetches()
+            self._pump_notification_stream()
+            self._check_session_if_due()
+            self._dispatch_pending_fetches()
+
+    def _handle_job(self, job: BrowserJob):
+        if job.call is None:
+            self._pending_fetches.append(job)
+            return
+        try:
+            result = job.call(*job.args)
+        except Exception as exc:
+            self._fail(job, exc)
+        else:
+            self._succeed(job, result)
+
+    def _dispatch_pending_fetches(self):
+        while self._pending_fetches and self._free_worker() is not None:
+            job = self._pending_fetches.popleft()
+            if job.future.cancelled():
+                continue
+            try:
+                self._prepare_fetch()
+                worker = self._free_worker()
+                if worker is None:
+                    self._pending_fetches.appendleft(job)
+                    return
+                self._start_page_job(worker, job)
+            except Exception as exc:
+                self._fail(job, exc)
+
+    def _pump_notification_stream(self):
+        page = self._stream_page
+        if page is None:
+            return
+        try:
+            collected = page.evaluate(_COLLECT_STREAM_SCRIPT)
+            listener = self._notification_listener
+            for payload in collected["events"]:
+                if listener is not None:
+                    listener(payload)
+            ready_state = collected["readyState"]
+            if ready_state == 1:
+                if not self._stream_open:
+                    logger.info("notification stream connected")
+                self._stream_open = True
+                self._stream_failures = 0
+                return
+            if ready_state == 0:
+                return
+            if self._stream_open:
+                logger.warning("notification stream disconnected: %s", collected["error"])
+            self._stream_open = False
+            if time.time() >= self._stream_retry_at and self._token:
+                self._stream_failures += 1
+                self._stream_retry_at = time.time() + self._stream_retry_seconds()
+                page.evaluate(_OPEN_STREAM_SCRIPT, self._stream_config())
+        except Exception as exc:
+            logger.warning("notification stream pump failed: %s", exc)
+            self._stream_open = False
+            self._stream_failures += 1
+            self._stream_retry_at = time.time() + self._stream_retry_seconds()
+
+    def _stream_retry_seconds(self) -> float:
+        return min(_STREAM_RETRY_MAX_SECONDS, 2.0 ** min(self._stream_failures - 1, 6))
+
+    def _stream_config(self) -> dict[str, Any]:
+        query = urlencode({"stream": "user:notification", "access_token": self._token or ""})
+        return {"url": f"{self._streaming_url}?{query}", "types": self._stream_types, "maxBuffered": 1000}
+
+    def _free_worker(self) -> WorkerPage | None:
+        for worker in self._worker_pages:
+            if worker.job is None:
+                return worker
+        return None
+
+    def _prepare_fetch(self):
+        if self._session_stale:
+            self._refresh_session()
+
+    def _refresh_session(self):
+        self._normalize()
+        self._login()
+        self._mark_session_checked()
+
+    def _mark_session_checked(self):
+        self._session_checked_at = time.time()
+        self._session_stale = False
+
+    def _seconds_until_session_check(self) -> float | None:
+        if self._session is None or self._session_check_seconds <= 0:
+            return None
+        return max(0.0, self._session_checked_at + self._session_check_seconds - time.time())
+
+    def _check_session_if_due(self):
+        remaining = self._seconds_until_session_check()
+        if remaining is None or remaining > 0:
+            return
+        self._session_checked_at = time.time()
+        try:
+            healthy = self._probe_session()
+        except Exception as exc:
+            logger.warning("browser session probe failed: %s", exc)
+            healthy = False
+        if not healthy:
+            self._request_session_replacement()
+
+    def _probe_session(self) -> bool:
+        # A single in-page fetch on the control page: no reload or sleeps, so worker pages keep running.
+        if self._page is None or time.time() - self._last_cf_reset > _CLOUDFLARE_SESSION_SECONDS:
+            return False
+        payload = self._build_fetch_payload(method="GET", url="https://truthsocial.com/api/v1/truth/policies/pending")
+        return self._page.evaluate(_FETCH_SCRIPT, payload) == "{}"
+
+    def _request_session_replacement(self):
+        listener = self._session_listener
+        if listener is None:
+            self._session_stale = True
+            return
+        logger.info("browser session check failed; requesting a standby session")
+        listener()
+
+    @staticmethod
+    def _needs_session_refresh(result: Any) -> bool:
+        if not isinstance(result, dict):
+            return False
+        if result.get("status") in _SESSION_REFRESH_STATUSES:
+            return True
+        headers = result.get("headers") or {}
+        return headers.get("cf-mitigated") == "challenge"
+
+    def _start_page_job(self, worker: WorkerPage, job: BrowserJob):
+        request = self._build_fetch_payload(
+            method=job.method,
+            url=job.url,
+            body_bytes=job.body_bytes,
+            headers=job.headers,
+            return_metadata=True,
+            job_id=job.job_id if self._binary_transfer else None,
+        )
+        if self._binary_transfer:
+            job.request = None
+            self._routed_jobs[job.job_id] = job
+        for attempt in range(2):
+            try:
+                worker.page.evaluate(_START_JOB_SCRIPT, {"jobId": job.job_id, "request": request})
+                worker.job = job
+                return
+            except Exception:
+                if attempt == 1:
+                    self._routed_jobs.pop(job.job_id, None)
+                    raise
+                worker.page.wait_for_load_state("domcontentloaded")
+                time.sleep(0.25)
+
+    def _collect_finished_fetches(self):
+        for worker in self._worker_pages:
+            job = worker.job
+            if job is None:
+                continue
+            try:
+                finished = worker.page.evaluate(_COLLECT_JOBS_SCRIPT, [job.job_id])
+            except Exception as exc:
+                worker.job = None
+                self._fail(job, exc)
+                continue
+            outcome = finished.get(job.job_id)
+            if outcome is None:
+                continue
+            worker.job = None
+            self._routed_jobs.pop(job.job_id, None)
+            if "error" in outcome:
+                self._fail(job, RuntimeError(outcome["error"]))
+                continue
+            if self._needs_session_refresh(outcome["result"]):
+                if self._session_listener is not None:
+                    # The standby session takes over; RotatingBrowserProxy resends there, not inline here.
+                    self._request_session_replacement()
+                elif job.attempts == 0:
+                    job.attempts += 1
+                    self._session_stale = True
+                    self._pending_fetches.appendleft(job)
+                    continue
+            try:
+                result = self._attach_response_body(job, outcome["result"])
+            except Exception as exc:
+                self._fail(job, exc)
+            else:
+                self._succeed(job, result)
+
+    @staticmethod
+    def _attach_response_body(job: BrowserJob, result: dict[str, Any]) -> dict[str, Any]:
+        if "bodyText" in result:
+            result["body"] = result.pop("bodyText").encode("utf-8")
+        elif result.pop("bodyFromNetwork", False):
+            response = job.request.response() if job.request is not None else None
+            if response is None:
+                raise RuntimeError("browser response body is unavailable")
+            result["body"] = response.body()
+        elif "bodyBase64" in result:
+            encoded = result.pop("bodyBase64")
+            result["body"] = base64.b64decode(encoded) if encoded else b""
+        return result
+
+    @staticmethod
+    def _succeed(job: BrowserJob, result: Any):
+        def resolve():
+            if not job.future.done():
+                job.future.set_result(result)
+
+        job.loop.call_soon_threadsafe(resolve)
+
+    @staticmethod
+    def _fail(job: BrowserJob, exc: BaseException):
+        def reject():
+            if not job.future.done():
+                job.future.set_exception(exc)
+
+        job.loop.call_soon_threadsafe(reject)
 
     def _wait_for_page_ready(self):
         if self._page is None:
@@ -68,11 +647,15 @@ class BrowserProxy:
 
     async def close(self):
         try:
-            await asyncio.get_running_loop().run_in_executor(self._executor, self._close)
+            await self._call(self._close)
         finally:
-            self._executor.shutdown(wait=True)
+            self._jobs.put(_STOP)
+            if self._thread is not None:
+                await asyncio.to_thread(self._thread.join)
+                self._thread = None
 
     def _close(self):
+        self._close_worker_pages("browser proxy is shutting down")
         if self._page is not None:
             self._page.close()
             self._page = None
@@ -82,7 +665,7 @@ class BrowserProxy:
         self._token = None
 
     async def normalize(self):
-        await asyncio.get_running_loop().run_in_executor(self._executor, self._normalize)
+        await self._call(self._normalize)
 
     def _normalize(self, force_init: bool = False):
         if self._page is None or self._session is None:
@@ -106,7 +689,7 @@ class BrowserProxy:
             method="GET",
             url="https://truthsocial.com/api/v1/truth/policies/pending",
         )
-        session_expired = time.time() - self._last_cf_reset > 1740
+        session_expired = time.time() - self._last_cf_reset > _CLOUDFLARE_SESSION_SECONDS
         # noinspection PyProtectedMember
         if not self._session._detect_cloudflare(pending) and not session_expired:
             return
@@ -128,6 +711,8 @@ class BrowserProxy:
         self._last_cf_reset = time.time()
         time.sleep(5)
         self._login()
+        if not force_init:
+            self._open_worker_pages()
 
     def _login(self):
         login_state = self._raw_fetch(
@@ -160,7 +745,7 @@ class BrowserProxy:
             raise RuntimeError("login failed")
 
     async def page_url(self):
-        return await asyncio.get_running_loop().run_in_executor(self._executor, self._page_url)
+        return await self._call(self._page_url)
 
     def _page_url(self):
         return self._page.url if self._page is not None else ""
@@ -180,27 +765,19 @@ class BrowserProxy:
         body_bytes: bytes | None = None,
         headers: dict[str, str] | None = None,
     ):
-        headers = headers or {}
-
-        return await asyncio.get_running_loop().run_in_executor(
-            self._executor,
-            self._fetch,
-            method,
-            url,
-            body_bytes,
-            headers,
-        )
-
-    def _fetch(self, method: str, url: str, body_bytes: bytes | None, headers: dict[str, str]):
-        self._normalize()
-        self._login()
-        return self._raw_fetch(
-            method=method,
-            url=url,
-            body_bytes=body_bytes,
-            headers=headers,
-            return_metadata=True,
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._jobs.put(
+            BrowserJob(
+                loop=loop,
+                future=future,
+                method=method,
+                url=url,
+                body_bytes=body_bytes,
+                headers=headers or {},
+            )
         )
+        return await future
 
     @staticmethod
     def _build_forward_headers(request: Request) -> dict[str, str]:
@@ -215,7 +792,7 @@ class BrowserProxy:
         headers.pop("authorization", None)
         return headers
 
-    def _raw_fetch(
+    def _build_fetch_payload(
         self,
         *,
         method: str,
@@ -224,10 +801,8 @@ class BrowserProxy:
         json_body: dict[str, str] | None = None,
         headers: dict[str, str] | None = None,
         return_metadata: bool = False,
-    ):
-        if self._page is None:
-            raise RuntimeError("browser page is not initialized")
-
+        job_id: str | None = None,
+    ) -> dict[str, Any]:
         merged_headers = {
             "Authorization": f"Bearer {self._token}" if self._token else "",
             "Cache-Control": "no-cache",
@@ -237,64 +812,42 @@ class BrowserProxy:
         if json_body is not None:
             merged_headers.setdefault("Content-Type", "application/json")
 
-        payload = {
+        return {
             "url": url,
             "method": method,
             "headers": merged_headers,
-            "bodyBase64": base64.b64encode(body_bytes).decode("ascii") if body_bytes is not None else None,
+            "bodyBase64": (
+                base64.b64encode(body_bytes).decode("ascii") if body_bytes is not None and job_id is None else None
+            ),
             "jsonBody": json_body,
             "returnMetadata": return_metadata,
+            "jobId": job_id,
         }
+
+    def _raw_fetch(
+        self,
+        *,
+        method: str,
+        url: str,
+        body_bytes: bytes | None = None,
+        json_body: dict[str, str] | None = None,
+        headers: dict[str, str] | None = None,
+        return_metadata: bool = False,
+    ):
+        if self._page is None:
+            raise RuntimeError("browser page is not initialized")
+
+        payload = self._build_fetch_payload(
+            method=method,
+            url=url,
+            body_bytes=body_bytes,
+            json_body=json_body,
+            headers=headers,
+            return_metadata=return_metadata,
+        )
         for attempt in range(2):
             try:
-                return self._page.evaluate(
-                    """
-                    async ({url, method, headers, bodyBase64, jsonBody, returnMetadata}) => {
-                        const cleanHeaders = Object.fromEntries(
-                            Object.entries(headers).filter(([, value]) => value !== "")
-                        );
-                        const decodeBase64 = (value) => {
-                            const binary = atob(value);
-                            const bytes = new Uint8Array(binary.length);
-                            for (let i = 0; i < binary.length; i += 1) {
-                                bytes[i] = binary.charCodeAt(i);
-                            }
-                            return bytes;
-                        };
-                        const encodeBase64 = (bytes) => {
-                            let binary = "";
-                            for (let i = 0; i < bytes.length; i += 0x8000) {
-                                binary += String.fromCharCode(...bytes.subarray(i, i + 0x8000));
-                            }
-                            return btoa(binary);
-                        };
-
-                        let body;
-                        if (bodyBase64 !== null) {
-                            body = new Blob([decodeBase64(bodyBase64)]);
-                        } else if (jsonBody !== null) {
-                            body = JSON.stringify(jsonBody);
-                        }
-
-                        const response = await fetch(url, {
-                            method,
-                            headers: cleanHeaders,
-                            body,
-                        });
-
-                        if (!returnMetadata) {
-                            return await response.text();
-                        }
-
-                        return {
-                            status: response.status,
-                            headers: Object.fromEntries(response.headers.entries()),
-                            bodyBase64: encodeBase64(new Uint8Array(await response.arrayBuffer())),
-                        };
-                    }
-                    """,
-                    payload,
-                )
+                return self._page.evaluate(_FETCH_SCRIPT, payload)
             except Exception:
                 if attempt == 1:
                     raise
@@ -302,9 +855,152 @@ class BrowserProxy:
                 time.sleep(0.25)
 
 
+class RotatingBrowserProxy:
+    def __init__(
+        self,
+        headless: bool = False,
+        rotate_seconds: float | None = None,
+        proxy_factory: Callable[[str | None], BrowserProxy] | None = None,
+    ):
+        if rotate_seconds is None:
+            rotate_seconds = float(environ.get("TS_HOOK_SESSION_ROTATE_SECONDS", "1500"))
+        self._rotate_seconds = rotate_seconds
+        self._drain_seconds = float(environ.get("TS_HOOK_SESSION_DRAIN_SECONDS", "300"))
+        self._proxy_factory = proxy_factory or (lambda token: BrowserProxy(headless=headless, token=token))
+        self._active: BrowserProxy | None = None
+        self._active_since = 0.0
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._rotation_lock = asyncio.Lock()
+        self._rotation_task: asyncio.Task[None] | None = None
+        self._replacement_task: asyncio.Task[None] | None = None
+        self._retiring_tasks: set[asyncio.Task[None]] = set()
+        self.notifications = NotificationBroadcaster()
+
+    @property
+    def active(self) -> BrowserProxy:
+        if self._active is None:
+            raise RuntimeError("browser proxy is not started")
+        return self._active
+
+    async def start(self):
+        self._loop = asyncio.get_running_loop()
+        proxy = self._proxy_factory(None)
+        self._attach(proxy)
+        self._active = await proxy.start()
+        self._active_since = time.monotonic()
+        if self._rotate_seconds > 0:
+            self._rotation_task = asyncio.create_task(self._rotate_forever(), name="browser-session-rotation")
+        return self
+
+    async def close(self):
+        for task in (self._rotation_task, self._replacement_task):
+            if task is not None:
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+        self._rotation_task = None
+        self._replacement_task = None
+        if self._retiring_tasks:
+            await asyncio.gather(*self._retiring_tasks, return_exceptions=True)
+        if self._active is not None:
+            await self._active.close()
+            self._active = None
+
+    def _attach(self, proxy: BrowserProxy):
+        proxy.set_notification_listener(self.notifications.publish_threadsafe)
+        proxy.set_session_listener(lambda: self._replace_threadsafe(proxy))
+
+    async def rotate(self):
+        async with self._rotation_lock:
+            await self._swap()
+
+    async def replace(self, proxy: BrowserProxy):
+        async with self._rotation_lock:
+            if self._active is not proxy:
+                return
+            try:
+                await self._swap()
+            except Exception as exc:
+                logger.warning("failed to replace stale browser session: %s", exc)
+
+    def _replace_threadsafe(self, proxy: BrowserProxy):
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            return
+        try:
+            loop.call_soon_threadsafe(self._schedule_replacement, proxy)
+        except RuntimeError:
+            pass
+
+    def _schedule_replacement(self, proxy: BrowserProxy):
+        if self._active is not proxy or (self._replacement_task is not None and not self._replacement_task.done()):
+            return
+        self._replacement_task = asyncio.create_task(self.replace(proxy), name="browser-session-replace")
+
+    async def _swap(self):
+        previous = self.active
+        standby = self._proxy_factory(previous.token)
+        self._attach(standby)
+        try:
+            await standby.start()
+        except BaseException:
+            await standby.close()
+            raise
+        previous.set_notification_listener(None)
+        previous.set_session_listener(None)
+        self._active = standby
+        self._active_since = time.monotonic()
+        logger.info("swapped in warmed browser session")
+        task = asyncio.create_task(self._retire(previous), name="browser-session-retire")
+        self._retiring_tasks.add(task)
+        task.add_done_callback(self._retiring_tasks.discard)
+
+    async def _rotate_forever(self):
+        while True:
+            delay = self._active_since + self._rotate_seconds - time.monotonic()
+            if delay > 0:
+                # A stale session may have been replaced meanwhile; re-read the deadline after waking.
+                await asyncio.sleep(delay)
+                continue
+            try:
+                await self.rotate()
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                logger.warning("failed to warm standby browser session: %s", exc)
+                await asyncio.sleep(_ROTATION_RETRY_SECONDS)
+
+    async def _retire(self, proxy: BrowserProxy):
+        try:
+            await proxy.drain(self._drain_seconds)
+        finally:
+            await proxy.close()
+
+    async def fetch(self, request: Request, path: str):
+        return await self._fetch_with_standby(lambda proxy: proxy.fetch(request, path))
+
+    async def fetch_url(self, *args: Any, **kwargs: Any):
+        return await self._fetch_with_standby(lambda proxy: proxy.fetch_url(*args, **kwargs))
+
+    async def _fetch_with_standby(self, send: Callable[[BrowserProxy], Any]):
+        proxy = self.active
+        result = await send(proxy)
+        if not BrowserProxy._needs_session_refresh(result):
+            return result
+        await self.replace(proxy)
+        if self._active is None or self._active is proxy:
+            return result
+        return await send(self._active)
+
+    async def normalize(self):
+        await self.active.normalize()
+
+    async def page_url(self):
+        return await self.active.page_url()
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    app.state.browser = await BrowserProxy().start()
+    app.state.browser = await RotatingBrowserProxy().start()
     try:
         yield
     finally:
@@ -323,6 +1019,28 @@ async def health(request: Request):
         raise HTTPException(status_code=503, detail=str(exc)) from exc
 
 
+@app.get("/stream/notifications")
+async def notification_stream(request: Request):
+    return StreamingResponse(
+        _notification_events(request.app.state.browser.notifications),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+async def _notification_events(broadcaster: NotificationBroadcaster):
+    async with broadcaster.subscribe() as subscriber:
+        yield ": connected\n\n"
+        while True:
+            try:
+                payload = await asyncio.wait_for(subscriber.get(), timeout=_SSE_KEEPALIVE_SECONDS)
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+            data = json.dumps(payload, ensure_ascii=False, separators=(",", ":"))
+            yield f"id: {payload.get('id', '')}\nevent: notification\ndata: {data}\n\n"
+
+
 @app.api_route("/", methods=["GET", "POST", "PUT", "DELETE", "PATCH", "HEAD", "OPTIONS"])
 @app.api_route("/{path:path}", methods=["GET", "POST", "PUT", "DELETE", "PATCH", "HEAD", "OPTIONS"])
 async def proxy(request: Request, path: str = ""):
@@ -330,8 +1048,10 @@ async def proxy(request: Request, path: str = ""):
         response = await request.app.state.browser.fetch(request, path)
     except Exception as exc:
         return Response(content=f"Browser proxy error: {exc}", status_code=502)
+    upstream_headers = {name.lower(): value for name, value in response["headers"].items()}
     return Response(
-        content=base64.b64decode(response["bodyBase64"]) if response["bodyBase64"] else b"",
+        content=response.get("body", b""),
         status_code=response["status"],
-        media_type=response["headers"].get("content-type"),
+        headers={name: upstream_headers[name] for name in _FORWARDED_RESPONSE_HEADERS if name in upstream_headers},
+        media_type=upstream_headers.get("content-type"),
     )